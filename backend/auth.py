@@ -0,0 +1,184 @@
+import asyncio
+import collections
+import hashlib
+import time
+from fastapi import HTTPException, Request, status
+from config import settings
+
+# Shared request authentication: Clerk session JWTs verified against a locally cached
+# JWKS. Nothing here touches the network on the request path:
+# - the JWKS is fetched at startup and refreshed in the background (and early when a
+#   token names a key id we don't have, e.g. right after a key rotation)
+# - verified claims are kept in a small LRU keyed by the token's hash until the token
+#   expires or CLERK_CLAIMS_TTL_SECONDS pass, so a session's polls skip the RSA check
+# Without CLERK_ISSUER every request is the development stub user.
+
+# Minimum spacing of the early refreshes triggered by unknown key ids
+UNKNOWN_KID_REFRESH_SECONDS = 30
+# Tolerated clock difference between Clerk and this host
+LEEWAY_SECONDS = 5
+# Clerk signs session tokens with RS256. The accepted algorithm is fixed here, never
+# read from the token header, so a token cannot pick how its signature is checked
+SIGNING_ALGORITHM = "RS256"
+
+class JWKSCache:
+    """
+    Signing keys by kid, built into verification keys once per refresh.
+    """
+    def __init__(self, url: str, refresh_seconds: float):
+        self.url = url
+        self.refresh_seconds = refresh_seconds
+        self.keys = {}
+        self.loaded_at = None
+        self._last_early_refresh = 0.0
+        self._task = None
+        self._refreshing = None
+
+    async def refresh(self):
+        import httpx
+        from jose import jwk
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.get(self.url)
+            response.raise_for_status()
+        keys = {}
+        for key in response.json().get("keys", []):
+            if key.get("use", "sig") != "sig" or "kid" not in key or key.get("alg", SIGNING_ALGORITHM) != SIGNING_ALGORITHM:
+                continue
+            keys[key["kid"]] = jwk.construct(key, SIGNING_ALGORITHM)
+        self.keys = keys
+        self.loaded_at = time.monotonic()
+        print(f"Loaded {len(keys)} Clerk signing keys")
+
+    async def _refresh_quietly(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            print(f"Clerk JWKS refresh failed, keeping {len(self.keys)} cached keys: {e}")
+
+    async def _run(self):
+        while True:
+            await self._refresh_quietly()
+            # Retry sooner while nothing could be loaded yet
+            await asyncio.sleep(self.refresh_seconds if self.keys else 5)
+
+    def start(self):
+        """
+        Starts the background refresh loop (call from the running event loop).
+        """
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def refresh_soon(self):
+        """
+        Schedules an early refresh for an unknown kid, at most every UNKNOWN_KID_REFRESH_SECONDS.
+        """
+        now = time.monotonic()
+        if now - self._last_early_refresh < UNKNOWN_KID_REFRESH_SECONDS:
+            return
+        self._last_early_refresh = now
+        self._refreshing = asyncio.get_running_loop().create_task(self._refresh_quietly())
+
+class ClaimsCache:
+    """
+    LRU of verified claims by token hash. Entries expire with the token (exp) or
+    after ttl seconds, whichever comes first.
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, key: bytes):
+        entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: bytes, claims: dict):
+        expires_at = min(time.time() + self.ttl, claims.get("exp", float("inf")))
+        self.entries[key] = (claims, expires_at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+jwks_cache = JWKSCache(
+    settings.CLERK_JWKS_URL or (f"{settings.CLERK_ISSUER.rstrip('/')}/.well-known/jwks.json" if settings.CLERK_ISSUER else ""),
+    settings.CLERK_JWKS_REFRESH_SECONDS
+)
+claims_cache = ClaimsCache(settings.CLERK_CLAIMS_CACHE_SIZE, settings.CLERK_CLAIMS_TTL_SECONDS)
+
+def auth_enabled() -> bool:
+    return bool(settings.CLERK_ISSUER)
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+def verify_token(token: str) -> dict:
+    """
+    Verifies a Clerk session token against the cached keys and returns its claims.
+    Raises HTTPException (401, or 503 before the first JWKS load).
+    """
+    key = claims_cache.key(token)
+    claims = claims_cache.get(key)
+    if claims is not None:
+        return claims
+
+    from jose import jwt, JWTError
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise _unauthorized("Malformed token")
+    signing_key = jwks_cache.keys.get(header.get("kid"))
+    if signing_key is None:
+        if not jwks_cache.keys:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Authentication keys not loaded yet", headers={"Retry-After": "5"})
+        jwks_cache.refresh_soon()
+        raise _unauthorized("Unknown signing key")
+
+    try:
+        claims = jwt.decode(
+            token, signing_key, algorithms=[SIGNING_ALGORITHM], issuer=settings.CLERK_ISSUER,
+            options={"verify_aud": False, "leeway": LEEWAY_SECONDS}
+        )
+    except JWTError as e:
+        raise _unauthorized(f"Invalid token: {e}")
+
+    # Clerk puts the requesting origin in azp; restrict it when origins are configured
+    parties = [party.strip() for party in (settings.CLERK_AUTHORIZED_PARTIES or "").split(",") if party.strip()]
+    if parties and claims.get("azp") and claims["azp"] not in parties:
+        raise _unauthorized("Token issued for another origin")
+    if not claims.get("sub"):
+        raise _unauthorized("Token has no subject")
+
+    claims_cache.put(key, claims)
+    return claims
+
+async def get_current_user(request: Request) -> str:
+    """
+    The Clerk user id of the request (the token's sub), from the Authorization
+    bearer token. Shared dependency of every router.
+    """
+    if not auth_enabled():
+        return settings.AUTH_STUB_USER_ID
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise _unauthorized("Missing bearer token")
+    return verify_token(token)["sub"]
+
+def start_auth():
+    """
+    Startup hook: begins loading the JWKS in the background without delaying boot.
+    """
+    if auth_enabled():
+        jwks_cache.start()
@@ -0,0 +1,108 @@
+"""
+Per-request cost of the shared auth dependency (auth.get_current_user).
+
+    python -m benchmarks.auth_overhead [--requests 20000] [--sessions 200]
+
+Signs Clerk-like RS256 session tokens with a throwaway key, installs its JWKS in the
+cache directly (no network) and times the dependency for:
+- stub:      CLERK_ISSUER unset (development)
+- verify:    every token new to the claims cache (full RSA signature check)
+- cached:    --sessions sessions polling with the same token (claims LRU hits)
+Needs python-jose[cryptography] and fastapi.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+ISSUER = "https://clerk.bench.local"
+
+def make_signer():
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk, jwt
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public = jwk.construct(pem, "RS256").public_key().to_dict()
+    public.update(kid="bench", use="sig", alg="RS256")
+
+    def sign(subject: str) -> str:
+        now = int(time.time())
+        claims = {"sub": subject, "iss": ISSUER, "iat": now, "nbf": now, "exp": now + 300, "azp": "http://localhost:3000"}
+        return jwt.encode(claims, pem, algorithm="RS256", headers={"kid": "bench"})
+
+    return public, sign
+
+def request_with(token: str = None):
+    from starlette.requests import Request
+    headers = [(b"authorization", f"Bearer {token}".encode())] if token else []
+    return Request({"type": "http", "method": "GET", "path": "/api/projects", "headers": headers})
+
+def time_calls(requests: list) -> list:
+    import auth
+
+    async def run():
+        timings = []
+        for request in requests:
+            started = time.perf_counter()
+            await auth.get_current_user(request)
+            timings.append(time.perf_counter() - started)
+        return timings
+
+    return asyncio.run(run())
+
+def summarize(timings: list) -> dict:
+    timings = sorted(timings)
+    return {
+        "calls": len(timings),
+        "mean_us": round(statistics.fmean(timings) * 1e6, 1),
+        "p50_us": round(timings[len(timings) // 2] * 1e6, 1),
+        "p99_us": round(timings[int(0.99 * (len(timings) - 1))] * 1e6, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--verify-requests", type=int, default=500, help="Uncached verifications to time")
+    args = parser.parse_args()
+
+    import auth
+    from config import settings
+    from jose import jwk
+
+    public, sign = make_signer()
+    results = {}
+
+    settings.CLERK_ISSUER = None
+    results["stub"] = summarize(time_calls([request_with() for _ in range(args.requests)]))
+
+    settings.CLERK_ISSUER = ISSUER
+    auth.jwks_cache.keys = {"bench": jwk.construct(public, "RS256")}
+
+    # Distinct tokens: each call misses the claims cache
+    tokens = [sign(f"user_{i}") for i in range(args.verify_requests)]
+    results["verify"] = summarize(time_calls([request_with(token) for token in tokens]))
+
+    # Dashboard polling: a few hundred sessions, each reusing its token
+    auth.claims_cache.entries.clear()
+    session_tokens = [sign(f"session_{i}") for i in range(args.sessions)]
+    time_calls([request_with(token) for token in session_tokens])
+    auth.claims_cache.hits = auth.claims_cache.misses = 0
+    polls = [request_with(session_tokens[i % args.sessions]) for i in range(args.requests)]
+    results["cached"] = summarize(time_calls(polls))
+    results["cached"]["hit_rate"] = round(auth.claims_cache.hits / max(1, auth.claims_cache.hits + auth.claims_cache.misses), 3)
+
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
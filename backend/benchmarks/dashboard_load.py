@@ -0,0 +1,152 @@
+"""
+Dashboard polling load test for GET /api/projects.
+
+    python -m benchmarks.dashboard_load --dashboards 100 --duration 30 --compare
+
+Runs the FastAPI app in-process (no network hop) against the configured Postgres
+and Redis, with N concurrent dashboards, each a distinct seeded user polling on an
+interval. Reports latency percentiles, DB queries per poll, cache hit ratio and
+bytes on the wire. --compare runs once with the read model disabled, then enabled.
+R2 signing uses the local stand-in, so no credentials are needed.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.standins import LocalS3Client
+
+BENCH_USER_PREFIX = "bench-dashboard-"
+
+async def seed(session_factory, dashboards: int, projects_per_user: int, clips_per_project: int):
+    from sqlalchemy import delete, select
+    from models import User, Project, Clip, ProjectStatus
+    from benchmarks.media import synthetic_srt
+
+    transcript = synthetic_srt(45)
+    async with session_factory() as db:
+        existing = await db.execute(select(User.clerk_id).where(User.clerk_id.like(f"{BENCH_USER_PREFIX}%")))
+        ids = [row[0] for row in existing]
+        if ids:
+            await db.execute(delete(Project).where(Project.user_id.in_(ids)))
+            await db.execute(delete(User).where(User.clerk_id.in_(ids)))
+            await db.commit()
+
+        for i in range(dashboards):
+            user_id = f"{BENCH_USER_PREFIX}{i}"
+            db.add(User(clerk_id=user_id, email=f"{user_id}@example.com"))
+            for p in range(projects_per_user):
+                project = Project(user_id=user_id, source_url=f"uploads/{user_id}-{p}.mp4", status=ProjectStatus.COMPLETED.value)
+                db.add(project)
+                await db.flush()
+                for c in range(clips_per_project):
+                    base = f"https://example.r2.dev/clips/{project.id}-{c}"
+                    db.add(Clip(
+                        project_id=project.id, s3_url=f"{base}.mp4", preview_url=f"{base}_preview.mp4",
+                        poster_url=f"{base}_poster.jpg", virality_score=80, transcript=transcript,
+                        start_time=c * 45.0, end_time=c * 45.0 + 45.0
+                    ))
+        await db.commit()
+
+async def run_load(app, dashboards: int, duration: float, interval: float, invalidate_every: float) -> dict:
+    import httpx
+    from sqlalchemy import event
+    from database import engine
+    from services.read_model import invalidate_dashboard_async
+
+    queries = 0
+    def count_query(*args):
+        nonlocal queries
+        queries += 1
+    event.listen(engine.sync_engine, "before_cursor_execute", count_query)
+
+    latencies, wire_bytes, hits = [], [], 0
+    deadline = time.monotonic() + duration
+
+    async def dashboard(client, index: int):
+        nonlocal hits
+        # Stagger start so polls don't arrive in lockstep
+        await asyncio.sleep(random.uniform(0, interval))
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await client.get("/api/projects", headers={
+                "X-Bench-User": f"{BENCH_USER_PREFIX}{index}", "Accept-Encoding": "br, gzip"
+            })
+            latencies.append(time.perf_counter() - started)
+            response.raise_for_status()
+            wire_bytes.append(int(response.headers.get("content-length", len(response.content))))
+            hits += response.headers.get("x-dashboard-cache") == "HIT"
+            await asyncio.sleep(interval)
+
+    async def writer():
+        # Stands in for worker progress / edits invalidating random dashboards
+        while invalidate_every and time.monotonic() < deadline:
+            await asyncio.sleep(invalidate_every)
+            await invalidate_dashboard_async(f"{BENCH_USER_PREFIX}{random.randrange(dashboards)}")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(writer(), *(dashboard(client, i) for i in range(dashboards)))
+
+    event.remove(engine.sync_engine, "before_cursor_execute", count_query)
+    latencies.sort()
+    return {
+        "polls": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "queries_per_poll": queries / max(1, len(latencies)),
+        "hit_ratio": hits / max(1, len(latencies)),
+        "avg_kb": statistics.mean(wire_bytes) / 1024,
+    }
+
+def report(label: str, result: dict):
+    print(
+        f"{label:<10} polls={result['polls']:<6} p50={result['p50_ms']:.1f}ms p95={result['p95_ms']:.1f}ms "
+        f"p99={result['p99_ms']:.1f}ms db_queries/poll={result['queries_per_poll']:.2f} "
+        f"hit_ratio={result['hit_ratio']:.0%} avg_body={result['avg_kb']:.1f}KB"
+    )
+
+async def main_async(args):
+    from fastapi import Request
+    from config import settings
+    from database import AsyncSessionLocal
+    from main import app
+    from routers import projects
+    from services.r2 import r2_service
+
+    r2_service.s3_client = LocalS3Client(os.path.join(os.path.dirname(__file__), ".cache", "s3"))
+
+    async def bench_user(request: Request):
+        return request.headers["X-Bench-User"]
+    app.dependency_overrides[projects.get_current_user] = bench_user
+
+    if not args.no_seed:
+        print(f"Seeding {args.dashboards} users x {args.projects} projects x {args.clips} clips...")
+        await seed(AsyncSessionLocal, args.dashboards, args.projects, args.clips)
+
+    modes = [False, True] if args.compare else [settings.ENABLE_DASHBOARD_CACHE]
+    for enabled in modes:
+        settings.ENABLE_DASHBOARD_CACHE = enabled
+        result = await run_load(app, args.dashboards, args.duration, args.interval, args.invalidate_every)
+        report("cached" if enabled else "uncached", result)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dashboards", type=int, default=100, help="Concurrent dashboards (distinct users)")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per run")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between polls per dashboard")
+    parser.add_argument("--invalidate-every", type=float, default=1.0, help="Seconds between simulated writes (0 = none)")
+    parser.add_argument("--projects", type=int, default=10, help="Projects per seeded user")
+    parser.add_argument("--clips", type=int, default=3, help="Clips per seeded project")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse previously seeded users")
+    parser.add_argument("--compare", action="store_true", help="Run uncached, then cached")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
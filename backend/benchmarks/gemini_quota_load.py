@@ -0,0 +1,210 @@
+"""
+Gemini quota saturation test: many workers against a local stand-in server that
+enforces per-window request and token limits the way the Gemini API does (429 once
+a window's budget is spent).
+
+    python -m benchmarks.gemini_quota_load --workers 16 --jobs 200 --window 10
+
+Time is compressed: the server's quota window is --window seconds instead of a
+minute, and the scheduler's per-minute budgets are scaled to match. Two runs:
+- direct:    every worker calls the server as soon as it has a job; a 429 fails the
+             job (what process_video did before the scheduler)
+- scheduled: calls go through GeminiQuota (shared Redis buckets, priority lanes,
+             429 backoff with a cluster-wide cooldown)
+Reports completed/failed jobs, 429s received, throughput relative to the quota,
+and queue wait per lane. Needs the configured Redis.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class TooManyRequests(Exception):
+    """
+    Named like the SDK's 429 error, so gemini_quota.is_rate_limited recognizes it.
+    """
+
+class QuotaServer:
+    """
+    Stand-in Gemini endpoint on localhost. POST {"tokens": n} is accepted if the
+    current fixed window still has one request and n tokens left, else 429.
+    """
+    def __init__(self, requests_per_window: int, tokens_per_window: int, window: float, latency: float):
+        self.requests_per_window = requests_per_window
+        self.tokens_per_window = tokens_per_window
+        self.window = window
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used_requests = 0
+        self.used_tokens = 0
+        self.accepted = 0
+        self.accepted_tokens = 0
+        self.rejected = 0
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status = 200 if server.admit(body["tokens"]) else 429
+                if status == 200:
+                    time.sleep(random.uniform(0.5, 1.5) * server.latency)
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/generate"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def admit(self, tokens: int) -> bool:
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.window_start += (now - self.window_start) // self.window * self.window
+                self.used_requests = 0
+                self.used_tokens = 0
+            if self.used_requests + 1 > self.requests_per_window or self.used_tokens + tokens > self.tokens_per_window:
+                self.rejected += 1
+                return False
+            self.used_requests += 1
+            self.used_tokens += tokens
+            self.accepted += 1
+            self.accepted_tokens += tokens
+            return True
+
+    def reset(self):
+        with self.lock:
+            self.window_start = time.monotonic()
+            self.used_requests = self.used_tokens = 0
+            self.accepted = self.accepted_tokens = self.rejected = 0
+
+    def call(self, tokens: int):
+        request = urllib.request.Request(self.url, data=json.dumps({"tokens": tokens}).encode(), method="POST")
+        try:
+            urllib.request.urlopen(request, timeout=30).close()
+        except urllib.error.HTTPError as e:
+            if e.code == 429:
+                raise TooManyRequests("429 RESOURCE_EXHAUSTED") from None
+            raise
+
+def make_jobs(rng, count: int, mean_tokens: int) -> list:
+    jobs = []
+    for _ in range(count):
+        lane = "interactive" if rng.random() < 0.25 else "batch"
+        tokens = max(100, int(rng.lognormvariate(0, 0.6) * mean_tokens))
+        # The scheduler only knows an estimate; reconcile charges the difference afterwards
+        jobs.append({"lane": lane, "tokens": tokens, "estimate": int(tokens * rng.uniform(0.7, 1.3))})
+    return jobs
+
+def run(server: QuotaServer, jobs: list, workers: int, quota=None) -> dict:
+    pending = list(jobs)
+    lock = threading.Lock()
+    results = []
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                job = pending.pop(0)
+            started = time.monotonic()
+            outcome = {"lane": job["lane"], "ok": False, "wait": 0.0}
+            try:
+                if quota:
+                    def call():
+                        outcome.setdefault("granted", time.monotonic())
+                        server.call(job["tokens"])
+                    quota.call(call, "generate", job["lane"], job["estimate"])
+                    quota.reconcile(job["estimate"], job["tokens"])
+                    outcome["wait"] = outcome["granted"] - started
+                else:
+                    server.call(job["tokens"])
+                outcome["ok"] = True
+            except Exception as e:
+                outcome["error"] = type(e).__name__
+            with lock:
+                results.append(outcome)
+
+    server.reset()
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    windows = elapsed / server.window
+    report = {
+        "completed": sum(r["ok"] for r in results),
+        "failed": sum(not r["ok"] for r in results),
+        "rejected_429": server.rejected,
+        "elapsed_s": round(elapsed, 1),
+        "requests_per_window": round(server.accepted / windows, 1),
+        "request_quota_used": f"{100 * server.accepted / (windows * server.requests_per_window):.0f}%",
+        "token_quota_used": f"{100 * server.accepted_tokens / (windows * server.tokens_per_window):.0f}%",
+    }
+    for lane in ("interactive", "batch"):
+        waits = sorted(r["wait"] for r in results if r["lane"] == lane and r["ok"])
+        if waits:
+            report[f"{lane}_wait_p50_s"] = round(statistics.median(waits), 2)
+            report[f"{lane}_wait_p95_s"] = round(waits[int(0.95 * (len(waits) - 1))], 2)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--window", type=float, default=10.0, help="Seconds per quota window (a minute in production)")
+    parser.add_argument("--requests", type=int, default=20, help="Requests allowed per window")
+    parser.add_argument("--tokens", type=int, default=200_000, help="Tokens allowed per window")
+    parser.add_argument("--mean-tokens", type=int, default=8_000)
+    parser.add_argument("--latency", type=float, default=0.3, help="Mean server latency per accepted call")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from config import settings
+    from services.gemini_quota import GeminiQuota
+    from services.redis_client import get_redis
+
+    # Backoff and queue limits scaled to the compressed window
+    scale = args.window / 60.0
+    settings.GEMINI_BACKOFF_BASE_SECONDS = max(0.05, settings.GEMINI_BACKOFF_BASE_SECONDS * scale)
+    settings.GEMINI_BACKOFF_MAX_SECONDS = max(0.5, settings.GEMINI_BACKOFF_MAX_SECONDS * scale)
+    settings.GEMINI_MAX_QUEUE_SECONDS = 3600
+    quota = GeminiQuota(
+        requests_per_minute=args.requests / scale,
+        tokens_per_minute=args.tokens / scale,
+        uploads_per_minute=args.requests / scale,
+        burst_fraction=settings.GEMINI_BURST_FRACTION
+    )
+    client = get_redis()
+    for key in client.scan_iter("gemini:*"):
+        client.delete(key)
+    for bucket in ("gemini-requests", "gemini-tokens", "gemini-uploads"):
+        client.delete(f"ratelimit:{bucket}:global")
+
+    server = QuotaServer(args.requests, args.tokens, args.window, args.latency)
+    jobs = make_jobs(random.Random(args.seed), args.jobs, args.mean_tokens)
+    demand = len(jobs) / args.requests * args.window
+    print(f"{len(jobs)} jobs, {args.workers} workers, quota {args.requests} req / {args.tokens} tokens per {args.window:.0f}s "
+          f"(request budget alone needs ~{demand:.0f}s)")
+
+    print(json.dumps({"direct": run(server, jobs, args.workers)}, indent=2))
+    print(json.dumps({"scheduled": run(server, jobs, args.workers, quota)}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import subprocess
+
+# Deterministic synthetic sources: (name, width, height, duration seconds)
+SOURCES = [
+    ("720p_20s", 1280, 720, 20),
+    ("1080p_60s", 1920, 1080, 60),
+    ("1080p_180s", 1920, 1080, 180),
+]
+
+QUICK_SOURCES = ["720p_20s"]
+
+def generate_source(cache_dir: str, name: str, width: int, height: int, duration: int) -> str:
+    """
+    Renders a testsrc2 + sine source with ffmpeg's lavfi inputs.
+    Files are cached by name, so repeated runs measure the pipeline, not generation.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{name}.mp4")
+    if os.path.exists(path):
+        return path
+
+    subprocess.run(
+        [
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'lavfi', '-i', f'testsrc2=size={width}x{height}:rate=30:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+            '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-threads', '1',
+            '-c:a', 'aac', '-shortest', path
+        ],
+        check=True
+    )
+    return path
+
+def synthetic_srt(duration: float, cue_seconds: float = 2.0) -> str:
+    """
+    Builds a well-formed SRT covering `duration` seconds with short cues.
+    """
+    from services.timecode import format_srt_time
+
+    blocks = []
+    t = 0.0
+    index = 1
+    while t < duration:
+        end = min(duration, t + cue_seconds)
+        blocks.append(f"{index}\n{format_srt_time(int(t * 1000))} --> {format_srt_time(int(end * 1000))}\nBenchmark caption number {index}\n")
+        t = end
+        index += 1
+    return "\n".join(blocks)
@@ -0,0 +1,271 @@
+"""
+Render-path benchmarks on deterministic synthetic media.
+
+    python -m benchmarks.run                     # full matrix, compare against baselines
+    python -m benchmarks.run --quick             # smallest source only
+    python -m benchmarks.run --only render,r2    # subset of stages
+    python -m benchmarks.run --update-baseline   # store the current numbers as the baseline
+
+Stages:
+- render: FFmpegProcessor.process_segment for every caption style
+- r2:     R2Service upload/download against a local S3 stand-in
+- e2e:    process_video_logic end-to-end (local S3, replayed Gemini, SQLite)
+
+Exits non-zero when a stage regresses past the tolerance.
+Requires ffmpeg on PATH and aiosqlite for the e2e stage.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+import uuid
+
+BENCH_ROOT = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BENCH_ROOT, ".cache")
+BASELINE_PATH = os.path.join(BENCH_ROOT, "baselines.json")
+GEMINI_RECORDING = os.path.join(BENCH_ROOT, "fixtures", "gemini_segments.json")
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(CACHE_DIR, 'bench.db')}")
+sys.path.insert(0, os.path.dirname(BENCH_ROOT))
+
+from benchmarks.media import SOURCES, QUICK_SOURCES, generate_source, synthetic_srt
+from benchmarks.standins import LocalS3Client, ReplayGemini, record_gemini_response
+
+class Measurement:
+    """
+    Captures wall time, CPU time (this process + ffmpeg children), the peak RSS
+    high-water mark and bytes moved for one benchmark stage.
+    """
+    def __init__(self, stage: str, case: str):
+        self.stage = stage
+        self.case = case
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @staticmethod
+    def _cpu() -> float:
+        self_usage = resource.getrusage(resource.RUSAGE_SELF)
+        child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return self_usage.ru_utime + self_usage.ru_stime + child_usage.ru_utime + child_usage.ru_stime
+
+    @staticmethod
+    def _peak_rss_mb() -> float:
+        # ru_maxrss is in KB on Linux; children are reported as the largest single child
+        self_peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        child_peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        return round(max(self_peak, child_peak) / 1024, 1)
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu_start = self._cpu()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = round(time.perf_counter() - self._wall, 3)
+        self.cpu_s = round(self._cpu() - self._cpu_start, 3)
+        self.peak_rss_mb = self._peak_rss_mb()
+        return False
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "case": self.case,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "peak_rss_mb": self.peak_rss_mb,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+        }
+
+def bench_render(sources: dict, work_dir: str) -> list:
+    from services.ffmpeg_processor import ffmpeg_processor
+    from services.processor import rendition_paths, remove_renditions
+
+    results = []
+    for name, path in sources.items():
+        segment_seconds = 15
+        srt = synthetic_srt(segment_seconds)
+        for style_name in ffmpeg_processor.STYLES:
+            output_paths = rendition_paths(os.path.join(work_dir, f"{name}_{style_name}.mp4"))
+            with Measurement("render", f"{name}/{style_name}") as m:
+                renditions = ffmpeg_processor.process_segment(
+                    input_path=path,
+                    start_time="00:02",
+                    end_time=f"00:{2 + segment_seconds:02d}",
+                    srt_content=srt,
+                    style_name=style_name,
+                    **output_paths
+                )
+            m.bytes_in = os.path.getsize(path)
+            m.bytes_out = sum(os.path.getsize(p) for p in renditions.values() if os.path.isfile(p))
+            remove_renditions(renditions)
+            results.append(m.as_dict())
+    return results
+
+def bench_r2(sources: dict, s3: LocalS3Client, work_dir: str) -> list:
+    from services.r2 import r2_service
+
+    results = []
+    for name, path in sources.items():
+        key = f"bench/{name}.mp4"
+        s3.reset_counters()
+        with Measurement("r2", f"{name}/upload") as m:
+            with open(path, "rb") as f:
+                asyncio.run(r2_service.upload_file(f, key, "video/mp4"))
+        m.bytes_out = s3.bytes_uploaded
+        results.append(m.as_dict())
+
+        s3.reset_counters()
+        local_path = os.path.join(work_dir, f"{name}_download.mp4")
+        with Measurement("r2", f"{name}/download") as m:
+            asyncio.run(r2_service.download_file(key, local_path))
+        m.bytes_in = s3.bytes_downloaded
+        os.remove(local_path)
+        results.append(m.as_dict())
+    return results
+
+def bench_e2e(sources: dict, s3: LocalS3Client, replay_latency: bool) -> list:
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from models import User, Project, ProjectStatus
+    from services.r2 import r2_service
+    import services.processor as processor
+
+    engine = create_async_engine(os.environ["DATABASE_URL"])
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    gemini = ReplayGemini(GEMINI_RECORDING, replay_latency=replay_latency)
+    processor.AsyncSessionLocal = session_factory
+    processor.gemini_service = gemini
+
+    async def setup() -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        async with session_factory() as db:
+            db.add(User(clerk_id="bench-user", email="bench@example.com"))
+            await db.commit()
+
+    async def create_project(source_key: str) -> str:
+        async with session_factory() as db:
+            project = Project(user_id="bench-user", source_url=source_key, status=ProjectStatus.PENDING.value)
+            db.add(project)
+            await db.commit()
+            return str(project.id)
+
+    async def project_status(project_id: str) -> tuple:
+        async with session_factory() as db:
+            project = await db.get(Project, uuid.UUID(project_id))
+            return project.status, project.error_message
+
+    asyncio.run(setup())
+    results = []
+    for name, path in sources.items():
+        source_key = f"uploads/{name}.mp4"
+        with open(path, "rb") as f:
+            asyncio.run(r2_service.upload_file(f, source_key, "video/mp4"))
+        project_id = asyncio.run(create_project(source_key))
+
+        s3.reset_counters()
+        with Measurement("e2e", name) as m:
+            asyncio.run(processor.process_video_logic(project_id))
+        m.bytes_in = s3.bytes_downloaded
+        m.bytes_out = s3.bytes_uploaded
+
+        status, error = asyncio.run(project_status(project_id))
+        if status != "COMPLETED":
+            raise RuntimeError(f"End-to-end run for {name} ended as {status}: {error}")
+        results.append(m.as_dict())
+    return results
+
+def compare(results: list, baseline: dict, tolerance: float) -> list:
+    """
+    Returns human-readable regressions: wall or CPU time above baseline * (1 + tolerance).
+    """
+    regressions = []
+    for result in results:
+        reference = baseline.get(f"{result['stage']}|{result['case']}")
+        if not reference:
+            continue
+        for metric in ("wall_s", "cpu_s"):
+            limit = reference[metric] * (1 + tolerance)
+            # Ignore sub-100ms noise on tiny stages
+            if result[metric] > limit and result[metric] - reference[metric] > 0.1:
+                regressions.append(
+                    f"{result['stage']} {result['case']}: {metric} {result[metric]:.2f} > {reference[metric]:.2f} (+{tolerance:.0%})"
+                )
+    return regressions
+
+def print_table(results: list):
+    print(f"{'stage':<8} {'case':<28} {'wall s':>8} {'cpu s':>8} {'rss MB':>8} {'in MB':>8} {'out MB':>8}")
+    for r in results:
+        print(
+            f"{r['stage']:<8} {r['case']:<28} {r['wall_s']:>8.2f} {r['cpu_s']:>8.2f} {r['peak_rss_mb']:>8.1f} "
+            f"{r['bytes_in'] / 1e6:>8.1f} {r['bytes_out'] / 1e6:>8.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="Only benchmark the smallest source")
+    parser.add_argument("--only", default="render,r2,e2e", help="Comma-separated stages to run")
+    parser.add_argument("--update-baseline", action="store_true", help="Store results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before failing (0.25 = 25%%)")
+    parser.add_argument("--no-gemini-latency", action="store_true", help="Do not replay recorded Gemini latency")
+    parser.add_argument("--json", help="Also write raw results to this file")
+    parser.add_argument("--record-gemini", metavar="VIDEO", help="Re-record the Gemini fixture from a real video and exit")
+    args = parser.parse_args()
+
+    if args.record_gemini:
+        record_gemini_response(args.record_gemini, GEMINI_RECORDING)
+        print(f"Recorded Gemini response to {GEMINI_RECORDING}")
+        return
+
+    stages = set(args.only.split(","))
+    selected = [s for s in SOURCES if not args.quick or s[0] in QUICK_SOURCES]
+    sources = {name: generate_source(CACHE_DIR, name, w, h, d) for name, w, h, d in selected}
+
+    from services.r2 import r2_service
+    work_dir = os.path.join(CACHE_DIR, "work")
+    os.makedirs(work_dir, exist_ok=True)
+    s3 = LocalS3Client(os.path.join(CACHE_DIR, "s3"))
+    r2_service.s3_client = s3
+
+    results = []
+    if "render" in stages:
+        results += bench_render(sources, work_dir)
+    if "r2" in stages:
+        results += bench_r2(sources, s3, work_dir)
+    if "e2e" in stages:
+        results += bench_e2e(sources, s3, replay_latency=not args.no_gemini_latency)
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        baseline.update({f"{r['stage']}|{r['case']}": r for r in results})
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Baseline updated: {BASELINE_PATH}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions against baseline." if baseline else "\nNo baseline yet; run with --update-baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Discrete-event simulation of process-video scheduling: FIFO (plain Celery) vs the
+fair, cost-aware FairQueue policy in services/scheduling.py.
+
+    python -m benchmarks.scheduling_sim [--workers 4] [--seed 7]
+
+Workloads (all times in seconds):
+- burst:   one user submits 40 long videos at t=0; 20 users each submit one short
+           video over the next 10 minutes
+- mixed:   Poisson arrivals from 30 users with a long-tailed duration mix
+- uniform: every job the same size (fair queuing should cost nothing here)
+
+Reports p50/p95 completion time (submit -> finished) for all jobs and for short
+jobs only. Job run times are drawn around the cost model's prediction, so the
+scheduler works with an estimate, not the true cost.
+"""
+import argparse
+import heapq
+import json
+import os
+import random
+import statistics
+
+SCHEDULING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "services", "scheduling.py")
+
+def _load_policy():
+    """
+    Loads CostModel and FairQueue from services/scheduling.py without importing
+    settings or Redis, which the simulation needs neither of.
+    """
+    with open(SCHEDULING_PATH) as f:
+        source = f.read()
+    policy = source[source.index("MAX_TIMING_SAMPLES"):source.index("FAIR_ENQUEUE_LUA")]
+    namespace = {"json": json}
+    exec(compile(policy, SCHEDULING_PATH, "exec"), namespace)
+    return namespace["CostModel"], namespace["FairQueue"]
+
+CostModel, FairQueue = _load_policy()
+
+SHORT_JOB_SECONDS = 60
+
+class FifoQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def enqueue(self, job_id, user_id, cost, weight=1.0, payload=None):
+        self.jobs.append({"id": job_id, "user": user_id, "cost": cost, "payload": payload})
+
+    def dispatch(self):
+        return self.jobs.pop(0) if self.jobs else None
+
+    def __len__(self):
+        return len(self.jobs)
+
+def make_job(rng, model, user, submit, duration, height):
+    width = height * 16 // 9
+    expected = model.predict(duration, width, height)
+    # Real run time scatters around the estimate (the model is never exact)
+    actual = max(5.0, expected * rng.lognormvariate(0, 0.3))
+    return {"user": user, "submit": submit, "duration": duration, "expected": expected, "actual": actual}
+
+def workload_burst(rng, model):
+    jobs = [make_job(rng, model, "heavy", 0.0, rng.uniform(600, 1800), 1080) for _ in range(40)]
+    jobs += [make_job(rng, model, f"light{i}", rng.uniform(0, 600), rng.uniform(15, 45), 1080) for i in range(20)]
+    return jobs
+
+def workload_mixed(rng, model):
+    jobs, t = [], 0.0
+    for _ in range(200):
+        t += rng.expovariate(1 / 20)
+        duration = min(3600, rng.paretovariate(1.2) * 30)
+        jobs.append(make_job(rng, model, f"user{rng.randrange(30)}", t, duration, rng.choice([720, 1080, 2160])))
+    return jobs
+
+def workload_uniform(rng, model):
+    return [make_job(rng, model, f"user{i % 10}", i * 15.0, 300, 1080) for i in range(100)]
+
+def simulate(jobs, queue, workers: int) -> list:
+    """
+    Runs jobs through `queue` with `workers` parallel slots and returns jobs
+    annotated with their finish time.
+    """
+    events = [(job["submit"], 0, i) for i, job in enumerate(jobs)]  # (time, kind 0=arrive 1=finish, job)
+    heapq.heapify(events)
+    free = workers
+    while events:
+        now, kind, index = heapq.heappop(events)
+        if kind == 0:
+            job = jobs[index]
+            queue.enqueue(str(index), job["user"], job["expected"], payload={"index": index})
+        else:
+            jobs[index]["finish"] = now
+            free += 1
+        while free and len(queue):
+            picked = queue.dispatch()
+            free -= 1
+            heapq.heappush(events, (now + jobs[picked["payload"]["index"]]["actual"], 1, picked["payload"]["index"]))
+    return jobs
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return float("nan"), float("nan")
+    return statistics.median(values), values[max(0, int(len(values) * 0.95) - 1)]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--slack", type=float, default=300.0, help="SCHEDULER_FAIRNESS_SLACK_SECONDS")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    model = CostModel()
+    print(f"{'workload':<9} {'policy':<6} {'p50 all':>9} {'p95 all':>9} {'p50 short':>10} {'p95 short':>10}")
+    for name, workload in (("burst", workload_burst), ("mixed", workload_mixed), ("uniform", workload_uniform)):
+        for policy, queue in (("fifo", FifoQueue()), ("fair", FairQueue(args.slack))):
+            jobs = simulate(workload(random.Random(args.seed), model), queue, args.workers)
+            turnaround = [job["finish"] - job["submit"] for job in jobs]
+            short = [job["finish"] - job["submit"] for job in jobs if job["duration"] <= SHORT_JOB_SECONDS]
+            p50, p95 = percentiles(turnaround)
+            s50, s95 = percentiles(short)
+            short_cols = f"{s50:>9.0f}s {s95:>9.0f}s" if short else f"{'-':>10} {'-':>10}"
+            print(f"{name:<9} {policy:<6} {p50:>8.0f}s {p95:>8.0f}s {short_cols}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+
+class LocalS3Client:
+    """
+    Minimal stand-in for the boto3 S3 client used by R2Service, backed by a local
+    directory. Counts bytes moved in each direction so stages can report I/O.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, bucket: str, key: str) -> str:
+        path = os.path.join(self.root, bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def reset_counters(self):
+        self.bytes_uploaded = 0
+        self.bytes_downloaded = 0
+
+    def upload_file(self, Filename, Bucket, Key, ExtraArgs=None):
+        shutil.copyfile(Filename, self._path(Bucket, Key))
+        self.bytes_uploaded += os.path.getsize(Filename)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None):
+        with open(self._path(Bucket, Key), "wb") as f:
+            shutil.copyfileobj(Fileobj, f)
+            self.bytes_uploaded += f.tell()
+
+    def download_file(self, Bucket, Key, Filename):
+        source = self._path(Bucket, Key)
+        shutil.copyfile(source, Filename)
+        self.bytes_downloaded += os.path.getsize(source)
+
+    def head_object(self, Bucket, Key):
+        return {"ContentLength": os.path.getsize(self._path(Bucket, Key))}
+
+    def get_object(self, Bucket, Key, Range=None):
+        path = self._path(Bucket, Key)
+        with open(path, "rb") as f:
+            if Range:
+                start, end = Range.replace("bytes=", "").split("-")
+                f.seek(int(start))
+                data = f.read(int(end) - int(start) + 1)
+            else:
+                data = f.read()
+        self.bytes_downloaded += len(data)
+        return {"Body": _Body(data), "ContentLength": len(data)}
+
+    def delete_object(self, Bucket, Key):
+        path = self._path(Bucket, Key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def generate_presigned_url(self, operation, Params=None, ExpiresIn=3600):
+        return f"file://{self._path(Params['Bucket'], Params['Key'])}"
+
+class _Body:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    def read(self, amt=None):
+        data, self._data = (self._data, b"") if amt is None else (self._data[:amt], self._data[amt:])
+        return data
+
+class ReplayGemini:
+    """
+    Stand-in for GeminiService that replays a recorded analysis response.
+    Segment times are clamped to the source so any recording fits any synthetic video;
+    the recorded latency is replayed so end-to-end timings stay realistic.
+    """
+    def __init__(self, recording_path: str, replay_latency: bool = True):
+        with open(recording_path) as f:
+            self.recording = json.load(f)
+        self.replay_latency = replay_latency
+        self.calls = 0
+
+    async def analyze_video(self, video_path: str, duration_preference: str = "auto", **kwargs) -> list:
+        self.calls += 1
+        if self.replay_latency:
+            await asyncio.sleep(self.recording.get("latency_seconds", 0))
+        return json.loads(json.dumps(self.recording["segments"]))
+
+    async def analyze_video_stream(self, video_path: str, duration_preference: str = "auto", **kwargs):
+        """
+        Streams the recorded segments, spreading the recorded latency evenly
+        across them the way a streamed generation delivers them.
+        """
+        self.calls += 1
+        segments = json.loads(json.dumps(self.recording["segments"]))
+        for segment in segments:
+            if self.replay_latency:
+                await asyncio.sleep(self.recording.get("latency_seconds", 0) / len(segments))
+            yield segment
+
+def record_gemini_response(video_path: str, recording_path: str):
+    """
+    Calls the real Gemini service once and saves the response for replay.
+    """
+    from services.gemini import gemini_service
+
+    started = time.perf_counter()
+    segments = asyncio.run(gemini_service.analyze_video(video_path))
+    with open(recording_path, "w") as f:
+        json.dump({"latency_seconds": round(time.perf_counter() - started, 2), "segments": segments}, f, indent=2)
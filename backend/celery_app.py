@@ -1,5 +1,6 @@
 from celery import Celery
 from config import settings
+from services.tracing import instrument_celery
 
 celery_app = Celery(
     "tandavai_worker",
@@ -13,4 +14,11 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
+    task_routes={
+        "services.processor.schedule_project_task": {"queue": settings.FAST_QUEUE_NAME},
+        "services.processor.dispatch_jobs_task": {"queue": settings.FAST_QUEUE_NAME},
+    },
 )
+
+# Trace context rides in the task headers (no-op unless ENABLE_TRACING)
+instrument_celery()
@@ -1,4 +1,6 @@
+from celery import signals
 from celery_app import celery_app
+from config import settings
 
 def health_check_task():
     return {"status": "ok"}
@@ -14,12 +16,90 @@ def cleanup_raw_videos():
     print(f"Cleanup complete. Deleted {count} files.")
     return {"status": "cleanup_done", "deleted_count": count}
 
+@celery_app.task(name="reap_multipart_uploads")
+def reap_multipart_uploads():
+    """
+    Aborts multipart uploads abandoned for longer than MULTIPART_UPLOAD_TTL_HOURS.
+    """
+    import asyncio
+    from services.uploads import reap_stale_uploads
+    result = asyncio.run(reap_stale_uploads())
+    print(f"Multipart reaper: {result}")
+    return result
+
+@celery_app.task(name="export_project")
+def export_project(project_id: str):
+    """
+    Writes a project's ZIP export to R2 (see services/export.py).
+    """
+    import asyncio
+    from services.export import export_project_to_r2
+    asyncio.run(export_project_to_r2(project_id))
+
 celery_app.conf.beat_schedule = {
     "cleanup-every-24-hours": {
         "task": "cleanup_raw_videos",
         "schedule": 86400.0, # 24 hours
     },
+    "reap-multipart-uploads-hourly": {
+        "task": "reap_multipart_uploads",
+        "schedule": 3600.0,
+    },
+    "dispatch-scheduled-jobs": {
+        "task": "services.processor.dispatch_jobs_task",
+        "schedule": 15.0,
+    },
+    "prerender-styles-when-idle": {
+        "task": "services.processor.prerender_styles_task",
+        "schedule": settings.PRERENDER_INTERVAL_SECONDS,
+    },
 }
 
+@signals.task_postrun.connect
+def release_scheduled_job(sender=None, args=None, **kwargs):
+    """
+    Frees a fair-queue slot when a process-video job ends (success or failure)
+    and immediately dispatches the next job.
+    """
+    if sender is None or sender.name != "services.processor.process_video_task" or not args:
+        return
+    from services.scheduling import fair_queue, dispatch_jobs
+    try:
+        fair_queue.release(str(args[0]))
+    except Exception as e:
+        print(f"Could not release scheduler slot for {args[0]}: {e}")
+    dispatch_jobs()
+
+@signals.task_postrun.connect
+def stop_orphaned_encoders(**kwargs):
+    """
+    Kills ffmpeg process groups a finished task left running, e.g. when a soft time
+    limit interrupted the task while its encode ran on an executor thread.
+    With the prefork pool each child runs one task at a time, so these are the task's own.
+    """
+    from services.ffmpeg_supervisor import ffmpeg_supervisor
+    ffmpeg_supervisor.kill_all()
+
+@signals.worker_init.connect
+@signals.worker_process_init.connect
+def start_tracing(**kwargs):
+    """
+    Installs the tracer provider (no-op unless ENABLE_TRACING). Prefork children
+    inherit it; the span processor restarts its export thread after the fork.
+    """
+    from services.tracing import setup_tracing
+    setup_tracing("tandavai-worker")
+
+@signals.worker_ready.connect
+def reap_scratch_workspaces(**kwargs):
+    """
+    Removes scratch workspaces left behind by workers that crashed or were killed.
+    """
+    from services.workspace import workspace_manager
+    from services.prefetch import source_prefetcher
+    count = workspace_manager.reap_orphans(max_age_seconds=settings.SCRATCH_ORPHAN_MAX_AGE)
+    spooled = source_prefetcher.reap()
+    print(f"Scratch reaper: removed {count} orphaned workspaces and {spooled} stale prefetched sources.")
+
 # Import tasks at the end to avoid circular imports
 from services.processor import process_video_task, delete_files_task, burn_subtitles_task
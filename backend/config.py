@@ -17,6 +17,153 @@ class Settings(BaseSettings):
     
     REDIS_URL: str = "redis://localhost:6379/0"
     
+    # Auth (auth.py): Clerk session JWTs verified against a JWKS cached in-process and refreshed
+    # in the background; verified claims are cached per token. Unset CLERK_ISSUER (development)
+    # makes every request AUTH_STUB_USER_ID. CLERK_AUTHORIZED_PARTIES: comma-separated origins
+    CLERK_ISSUER: Optional[str] = None
+    CLERK_JWKS_URL: Optional[str] = None
+    CLERK_AUTHORIZED_PARTIES: Optional[str] = None
+    CLERK_JWKS_REFRESH_SECONDS: int = 3600
+    CLERK_CLAIMS_CACHE_SIZE: int = 10000
+    CLERK_CLAIMS_TTL_SECONDS: int = 60
+    AUTH_STUB_USER_ID: str = "user_2t..."
+    
+    # Admission control (per user, per endpoint token buckets + queue depth)
+    CELERY_QUEUE_NAME: str = "celery"
+    MAX_QUEUE_DEPTH: int = 200
+    QUEUE_BACKOFF_SECONDS: int = 30
+    PROCESS_VIDEO_BURST: int = 5
+    PROCESS_VIDEO_PER_MINUTE: float = 2
+    BURN_BURST: int = 5
+    BURN_PER_MINUTE: float = 6
+    BATCH_BURST: int = 3
+    BATCH_PER_HOUR: float = 6
+    MAX_BATCH_SIZE: int = 50
+    
+    # Rendition ladder: fMP4/HLS segments are opt-in (extra encode per clip)
+    ENABLE_HLS_RENDITION: bool = False
+    
+    # Project restyle (one job for all clips): clips at most RESTYLE_MAX_GAP_SECONDS apart are
+    # rendered from a shared decode, up to RESTYLE_MAX_CLIPS_PER_RUN clips per ffmpeg run
+    RESTYLE_MAX_GAP_SECONDS: float = 20
+    RESTYLE_MAX_CLIPS_PER_RUN: int = 4
+    
+    # Speculative style renders (services/prerender.py): while the render queues are empty,
+    # clips made in the last PRERENDER_RECENT_HOURS get their PRERENDER_STYLES_PER_CLIP most
+    # switched-to styles rendered ahead, so picking one of them needs no encode. Unadopted
+    # renders are evicted after PRERENDER_MAX_AGE_HOURS or, oldest first, past PRERENDER_MAX_BYTES
+    ENABLE_PRERENDER: bool = False
+    PRERENDER_INTERVAL_SECONDS: float = 120
+    PRERENDER_RECENT_HOURS: float = 6
+    PRERENDER_STYLES_PER_CLIP: int = 2
+    PRERENDER_MAX_CLIPS_PER_RUN: int = 10
+    PRERENDER_MAX_AGE_HOURS: float = 12
+    PRERENDER_MAX_BYTES: int = 5 * 1024 ** 3
+    PRERENDER_LOCK_SECONDS: int = 1800
+    
+    # Captions: "burned" renders them into every encode; "soft" keeps the video clean with
+    # a mov_text track + SRT/WebVTT/ASS sidecars, so style edits are metadata updates and
+    # captions are burned only for the final download
+    CAPTION_MODE: str = "burned"
+    
+    # ffmpeg supervisor (services/ffmpeg_supervisor.py): encodes run niced, optionally pinned
+    # to a CPU list like "0-3", and are killed past these limits (0 disables a limit)
+    FFMPEG_NICE: int = 5
+    FFMPEG_CPU_AFFINITY: Optional[str] = None
+    FFMPEG_MAX_WALL_SECONDS: float = 900
+    FFMPEG_MAX_CPU_SECONDS: float = 0
+    
+    # Edit-modal timeline (thumbnail sprite + VTT + waveform) for the segment +/- TIMELINE_PAD_SECONDS,
+    # produced in the clip's own decode pass
+    ENABLE_TIMELINE_ASSETS: bool = True
+    TIMELINE_PAD_SECONDS: float = 15.0
+    
+    # Local scene/pause/loudness pre-analysis: snaps Gemini boundaries and sends it candidate windows
+    ENABLE_SIGNAL_ANALYSIS: bool = True
+    SIGNAL_CANDIDATE_HINTS: bool = True
+    
+    # Worker scratch space: per-task workspaces under SCRATCH_ROOT (small intermediates on
+    # SCRATCH_TMPFS_ROOT, e.g. /dev/shm, if set), each capped at a quota and admitted only
+    # if SCRATCH_SIZE_FACTOR x source size still leaves SCRATCH_MIN_FREE_MB free
+    SCRATCH_ROOT: str = "/tmp/tandav_scratch"
+    SCRATCH_TMPFS_ROOT: Optional[str] = None
+    SCRATCH_TASK_QUOTA_MB: int = 8192
+    SCRATCH_MIN_FREE_MB: int = 1024
+    SCRATCH_SIZE_FACTOR: float = 3.0
+    SCRATCH_RETRY_SECONDS: int = 60
+    SCRATCH_ORPHAN_MAX_AGE: int = 3600
+    
+    # Dashboard read model: per-user /projects response cached in Redis (pre-compressed).
+    # Must stay below the 3600s presigned URL expiry baked into the cached body
+    ENABLE_DASHBOARD_CACHE: bool = True
+    DASHBOARD_CACHE_TTL_SECONDS: int = 1800
+    
+    # Multipart browser uploads: part size (R2 minimum is 5MB, max 10,000 parts) and
+    # how long an unfinished upload is kept before the reaper aborts it
+    MULTIPART_PART_SIZE_MB: int = 16
+    MULTIPART_MAX_PARTS_PER_REQUEST: int = 100
+    MULTIPART_UPLOAD_TTL_HOURS: int = 24
+    
+    # Project ZIP export: streamed through the API up to this size, larger ones go through
+    # the async export task (written to R2 in MULTIPART_PART_SIZE_MB parts)
+    EXPORT_STREAM_MAX_MB: int = 2048
+    
+    # Fair scheduling of process-video jobs (services/scheduling.py): at most MAX_IN_FLIGHT
+    # dispatched to Celery at once; short jobs may overtake within FAIRNESS_SLACK worker-seconds.
+    # Scheduling tasks run on FAST_QUEUE_NAME so they never wait behind renders
+    ENABLE_FAIR_SCHEDULING: bool = True
+    SCHEDULER_MAX_IN_FLIGHT: int = 4
+    SCHEDULER_FAIRNESS_SLACK_SECONDS: float = 300.0
+    SCHEDULER_STALE_SECONDS: int = 360
+    FAST_QUEUE_NAME: str = "fast"
+    
+    # Batch submissions: while a batch project renders, the worker downloads the sources of
+    # the next BATCH_PREFETCH_DEPTH projects of the same batch into a spool on the scratch volume
+    ENABLE_BATCH_PREFETCH: bool = True
+    BATCH_PREFETCH_DEPTH: int = 1
+    
+    # Cluster-wide Gemini quota (services/gemini_quota.py): every worker shares these per-minute
+    # budgets; buckets burst up to GEMINI_BURST_FRACTION of a minute. Calls wait up to
+    # GEMINI_MAX_QUEUE_SECONDS for budget, then the task is requeued GEMINI_DEFER_SECONDS later
+    ENABLE_GEMINI_QUOTA: bool = True
+    GEMINI_REQUESTS_PER_MINUTE: float = 150
+    GEMINI_TOKENS_PER_MINUTE: float = 1_000_000
+    GEMINI_UPLOADS_PER_MINUTE: float = 60
+    GEMINI_BURST_FRACTION: float = 0.25
+    GEMINI_TOKENS_PER_VIDEO_SECOND: int = 300
+    GEMINI_PROMPT_TOKENS: int = 3000
+    GEMINI_MAX_QUEUE_SECONDS: float = 120
+    GEMINI_DEFER_SECONDS: int = 60
+    GEMINI_MAX_RETRIES: int = 5
+    GEMINI_BACKOFF_BASE_SECONDS: float = 2
+    GEMINI_BACKOFF_MAX_SECONDS: float = 60
+    # Quota waits and 429 backoffs in process_video end this long before the task's soft
+    # time limit (defer instead), leaving time to generate and render once budget is granted
+    GEMINI_TASK_RESERVE_SECONDS: float = 90
+    
+    # Re-analysis reuses a project's Gemini upload (files live ~48h) and, if enabled, an explicit
+    # context cache of the video, while either has GEMINI_HANDLE_MIN_TTL_SECONDS of life left
+    GEMINI_REUSE_FILES: bool = True
+    ENABLE_GEMINI_CONTEXT_CACHE: bool = False
+    GEMINI_CACHE_TTL_SECONDS: int = 3600
+    GEMINI_HANDLE_MIN_TTL_SECONDS: int = 600
+    
+    # Distributed tracing (services/tracing.py, needs the optional opentelemetry-sdk): spans for API
+    # requests, Celery queue wait and runs, SQL, R2, Gemini and ffmpeg. Exported over OTLP/HTTP to
+    # OTEL_EXPORTER_ENDPOINT (needs opentelemetry-exporter-otlp-proto-http), else as JSON lines to TRACE_FILE
+    ENABLE_TRACING: bool = False
+    OTEL_EXPORTER_ENDPOINT: Optional[str] = None
+    TRACE_FILE: str = "/tmp/tandav_traces.jsonl"
+    TRACE_SAMPLE_RATIO: float = 1.0
+    
+    # On-demand profiling (services/profiling.py), behind the X-Admin-Token header: sample the API
+    # process for up to PROFILE_MAX_SECONDS, or arm a project's next worker task. Folded-stack
+    # profiles are stored in R2 under profiles/. The endpoints are disabled while ADMIN_TOKEN is unset
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_SAMPLE_INTERVAL_MS: float = 10
+    PROFILE_MAX_SECONDS: int = 60
+    PROFILE_ARM_TTL_SECONDS: int = 86400
+    
     class Config:
         env_file = ".env"
 
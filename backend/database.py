@@ -1,18 +1,26 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
+from services.tracing import instrument_engine
 
 engine = create_async_engine(settings.ASYNC_DATABASE_URL, echo=True)
+instrument_engine(engine.sync_engine)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
-# Sync Session for Celery or scripts
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-sync_engine = create_engine(settings.DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+# Sync engine/session for Celery or scripts, built on first use (the API never needs it)
+_sync_session_factory = None
+
+def get_sync_session():
+    global _sync_session_factory
+    if _sync_session_factory is None:
+        from sqlalchemy import create_engine
+        sync_engine = create_engine(settings.DATABASE_URL, echo=True)
+        instrument_engine(sync_engine)
+        _sync_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
+    return _sync_session_factory()
 
 Base = declarative_base()
 
@@ -17,21 +17,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Schema changes are applied by migrations.py in the release phase, not at boot
+
+from auth import start_auth
+
 @app.on_event("startup")
-async def startup_event():
-    from database import engine
-    from sqlalchemy import text
-    
-    # Simple migration to add error_message column if it doesn't exist
-    async with engine.connect() as conn:
+async def load_auth_keys():
+    # Background JWKS load: boot does not wait on Clerk
+    start_auth()
+
+from services import tracing
+
+if tracing.setup_tracing("tandavai-api"):
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        """
+        Server span per request, continuing the caller's trace if it sent a traceparent.
+        Work the request enqueues (send_task) carries the context on to the worker.
+        """
+        from opentelemetry import context as otel_context
+        from opentelemetry.propagate import extract
+        token = otel_context.attach(extract(dict(request.headers)))
         try:
-            await conn.execute(text("ALTER TABLE projects ADD COLUMN IF NOT EXISTS error_message TEXT;"))
-            await conn.execute(text("ALTER TABLE clips ADD COLUMN IF NOT EXISTS start_time FLOAT;"))
-            await conn.execute(text("ALTER TABLE clips ADD COLUMN IF NOT EXISTS end_time FLOAT;"))
-            await conn.commit()
-            print("Migration: Verified schema columns (error_message, start_time, end_time).")
-        except Exception as e:
-            print(f"Migration: Column might already exist or error occurred: {e}")
+            with tracing.span(
+                f"{request.method} {request.url.path}", **{"http.method": request.method, "http.target": request.url.path}
+            ) as current:
+                response = await call_next(request)
+                # Low-cardinality name once routing has resolved the path template
+                route = request.scope.get("route")
+                if route is not None:
+                    current.update_name(f"{request.method} {route.path}")
+                current.set_attribute("http.status_code", response.status_code)
+                return response
+        finally:
+            otel_context.detach(token)
 
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse
@@ -52,14 +71,9 @@ async def health_check():
 
 @app.post("/admin/migrate")
 async def run_migration():
-    from database import engine
-    from sqlalchemy import text
-    
-    async with engine.begin() as conn:
-        await conn.execute(text("ALTER TABLE clips ADD COLUMN IF NOT EXISTS start_time FLOAT;"))
-        await conn.execute(text("ALTER TABLE clips ADD COLUMN IF NOT EXISTS end_time FLOAT;"))
-    
-    return {"status": "migration_complete", "message": "Added start_time and end_time columns to clips table."}
+    from migrations import run_migrations
+    applied = await run_migrations()
+    return {"status": "migration_complete", "applied": applied}
 
 @app.get("/debug/celery")
 async def debug_celery():
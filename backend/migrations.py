@@ -0,0 +1,117 @@
+"""
+Versioned schema migrations, run once per deploy instead of on every API boot:
+
+    python migrations.py
+
+(Procfile `release` phase / docker-compose), or via POST /admin/migrate.
+Applied versions are recorded in schema_migrations; each migration runs in its
+own transaction. Add new schema changes as a new entry at the end of MIGRATIONS.
+"""
+import asyncio
+from sqlalchemy import text
+from database import engine
+
+# Arbitrary constant for pg_advisory_xact_lock, so concurrent releases don't race
+MIGRATION_LOCK_ID = 742913
+
+async def _create_tables(conn):
+    # Imported here so the models (and their tables on Base.metadata) are registered
+    import models
+    await conn.run_sync(models.Base.metadata.create_all)
+
+async def _add_batches(conn):
+    await _create_tables(conn)
+    await conn.execute(text(
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS batch_id UUID REFERENCES batches(id) ON DELETE SET NULL;"
+    ))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_projects_batch_id ON projects (batch_id);"))
+
+# (version, description, list of SQL statements or a callable taking the connection)
+MIGRATIONS = [
+    (1, "base tables", _create_tables),
+    (2, "columns previously added at startup", [
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS error_message TEXT;",
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS start_time FLOAT;",
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS end_time FLOAT;",
+    ]),
+    (3, "clip renditions", [
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS preview_url VARCHAR;",
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS poster_url VARCHAR;",
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS hls_url VARCHAR;",
+    ]),
+    (4, "source media metadata", [
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS duration FLOAT;",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS width INTEGER;",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS height INTEGER;",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS fps FLOAT;",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS video_codec VARCHAR;",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS audio_codec VARCHAR;",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS keyframes JSON;",
+    ]),
+    (5, "clip render generation", [
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS render_generation INTEGER NOT NULL DEFAULT 0;",
+    ]),
+    (6, "project signals", [
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS signals JSON;",
+    ]),
+    (7, "multipart uploads", _create_tables),
+    (8, "project batches", _add_batches),
+    (9, "clip edit timeline", [
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS timeline JSON;",
+    ]),
+    (10, "project clip duration and gemini file", [
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS clip_duration VARCHAR NOT NULL DEFAULT 'auto';",
+        "ALTER TABLE projects ADD COLUMN IF NOT EXISTS gemini_file JSON;",
+    ]),
+    (11, "clip soft captions", [
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS captions JSON;",
+    ]),
+    (12, "clip transcript anchor", [
+        "ALTER TABLE clips ADD COLUMN IF NOT EXISTS transcript_start FLOAT;",
+        "UPDATE clips SET transcript_start = start_time WHERE transcript_start IS NULL;",
+    ]),
+    (13, "drop unused keyframe index", [
+        "ALTER TABLE projects DROP COLUMN IF EXISTS keyframes;",
+    ]),
+]
+
+async def run_migrations() -> list[int]:
+    """
+    Applies all pending migrations in order and returns the versions applied.
+    """
+    applied = []
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version INTEGER PRIMARY KEY, description VARCHAR, "
+            "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+
+    for version, description, steps in MIGRATIONS:
+        async with engine.begin() as conn:
+            await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            done = await conn.execute(text("SELECT 1 FROM schema_migrations WHERE version = :v"), {"v": version})
+            if done.first():
+                continue
+
+            print(f"Migration {version}: {description}")
+            if callable(steps):
+                await steps(conn)
+            else:
+                for statement in steps:
+                    await conn.execute(text(statement))
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, description) VALUES (:v, :d)"),
+                {"v": version, "d": description}
+            )
+            applied.append(version)
+
+    print(f"Migrations complete ({len(applied)} applied, schema at version {MIGRATIONS[-1][0]}).")
+    return applied
+
+async def main():
+    await run_migrations()
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,6 +1,6 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, DateTime, Text, Boolean, Enum, Float
+from sqlalchemy import Column, String, Integer, BigInteger, ForeignKey, DateTime, Text, Boolean, Enum, Float, JSON
 from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 import enum
@@ -43,10 +43,25 @@ class Project(Base):
     source_url = Column(String, nullable=False)
     status = Column(String, default=ProjectStatus.PENDING.value)
     error_message = Column(Text, nullable=True)
+    
+    # Source media metadata, probed once at ingest
+    duration = Column(Float, nullable=True) # Seconds
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    fps = Column(Float, nullable=True)
+    video_codec = Column(String, nullable=True)
+    audio_codec = Column(String, nullable=True)
+    # Large JSON only the worker reads: deferred so dashboard/list queries do not load it
+    signals = deferred(Column(JSON, nullable=True)) # Scene cuts, pauses and loudness envelope (services/signals.py)
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("batches.id", ondelete="SET NULL"), nullable=True, index=True)
+    clip_duration = Column(String, default="auto", nullable=False, server_default="auto") # "auto", "30s", "60s"
+    gemini_file = Column(JSON, nullable=True) # Uploaded Gemini file / context cache names and expiries, reused by re-analysis
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="projects")
     clips = relationship("Clip", back_populates="project", cascade="all, delete-orphan")
+    batch = relationship("Batch", back_populates="projects")
 
 class Clip(Base):
     __tablename__ = "clips"
@@ -54,10 +69,55 @@ class Clip(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"))
     s3_url = Column(String, nullable=False)
+    preview_url = Column(String, nullable=True) # Low-bitrate rendition for grid playback
+    poster_url = Column(String, nullable=True)  # JPEG poster frame
+    hls_url = Column(String, nullable=True)     # Optional fMP4/HLS playlist
+    timeline = Column(JSON, nullable=True)      # Edit-modal sprite/VTT/waveform layout and R2 keys
+    captions = Column(JSON, nullable=True)      # Soft-caption sidecar keys and style (None: burned into the video)
     virality_score = Column(Integer, nullable=True)
-    transcript = Column(Text, nullable=True)
+    transcript = Column(Text, nullable=True)   # SRT with cues relative to transcript_start
+    transcript_start = Column(Float, nullable=True) # Seconds; trims retime the cues at render time
     start_time = Column(Float, nullable=True) # Seconds
     end_time = Column(Float, nullable=True)   # Seconds
+    render_generation = Column(Integer, default=0, nullable=False, server_default="0") # Latest committed burn request
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     project = relationship("Project", back_populates="clips")
+
+    @property
+    def current_transcript(self):
+        # The transcript relative to the current trim (what the editor shows)
+        from services.subtitles import clip_transcript
+        return clip_transcript(self)
+
+class UploadStatus(str, enum.Enum):
+    ACTIVE = "ACTIVE"
+    COMPLETED = "COMPLETED"
+    ABORTED = "ABORTED"
+
+class MultipartUpload(Base):
+    __tablename__ = "multipart_uploads"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(String, ForeignKey("users.clerk_id", ondelete="CASCADE"), index=True)
+    upload_id = Column(String, nullable=False) # R2 multipart UploadId
+    s3_key = Column(String, nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    part_size = Column(BigInteger, nullable=False)
+    part_count = Column(Integer, nullable=False)
+    status = Column(String, default=UploadStatus.ACTIVE.value, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+# Projects submitted together through POST /api/batches
+class Batch(Base):
+    __tablename__ = "batches"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(String, ForeignKey("users.clerk_id", ondelete="CASCADE"), index=True)
+    name = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    projects = relationship("Project", back_populates="batch")
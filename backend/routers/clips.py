@@ -1,19 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database import get_db
+from auth import get_current_user
 from models import Clip, Project
-from schemas import ClipResponse, ClipUpdate
+from schemas import ClipResponse, ClipUpdate, ClipTimelineResponse, CaptionStyleUpdate
+from celery_app import celery_app
+from services.burn_jobs import claim_clip_export
+from services.read_model import invalidate_dashboard_async
 import uuid
 
 router = APIRouter()
 
-# Mock User Dependency (Replace with Clerk verification later)
-async def get_current_user():
-    # For MVP, return a hardcoded user ID or extract from header if implemented
-    # In production, verify JWT token from Clerk
-    return "user_2t..." # Example Clerk ID
-
 @router.patch("/clips/{clip_id}", response_model=ClipResponse)
 async def update_clip(
     clip_id: str,
@@ -42,12 +41,33 @@ async def update_clip(
     clip, project = row
     
     # 2. Update fields if provided
+    refresh_track = False
     if clip_in.transcript is not None:
+        from services.subtitles import parse_srt, SubtitleError
+        duration = clip.end_time - clip.start_time if clip.start_time is not None and clip.end_time is not None else None
+        try:
+            parse_srt(clip_in.transcript, duration=duration)
+        except SubtitleError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        # The editor shows cues relative to the current trim, so that is their new anchor
         clip.transcript = clip_in.transcript
+        clip.transcript_start = clip.start_time
+        if clip.captions:
+            # Soft captions: every sidecar follows the new text, the MP4's track in the background
+            from services.processor import rewrite_captions
+            clip.captions = await rewrite_captions(clip, clip.captions["style_name"], clip.captions["karaoke"])
+            refresh_track = True
         
     # 3. Commit changes
     await db.commit()
     await db.refresh(clip)
+    await invalidate_dashboard_async(user_id)
+
+    if refresh_track:
+        try:
+            celery_app.send_task("services.processor.refresh_caption_track_task", args=[str(clip.id)])
+        except Exception as e:
+            print(f"Failed to trigger caption track refresh for clip {clip.id}: {e}")
     
     return clip
 
@@ -76,6 +96,21 @@ async def download_clip(
         raise HTTPException(status_code=404, detail="Clip not found")
     
     clip, project = row
+
+    from services.r2 import r2_service
+    from services.subtitles import caption_signature, clip_transcript
+
+    # Soft-caption clips are stored clean: the download is the captioned export of the
+    # current edit, rendered on first request (the client retries on 202)
+    if clip.captions and clip.transcript:
+        captions = clip.captions
+        burned = captions.get("burned")
+        signature = caption_signature(clip_transcript(clip), clip.start_time, clip.end_time, captions["style_name"], captions["karaoke"])
+        if burned and burned["signature"] == signature:
+            return {"download_url": r2_service.generate_presigned_get_url(burned["key"])}
+        if await claim_clip_export(clip_id):
+            celery_app.send_task("services.processor.export_clip_task", args=[clip_id])
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content={"status": "RENDERING"})
     
     # 2. Extract S3 Key from URL
     # URL format: https://.../clips/...
@@ -90,7 +125,6 @@ async def download_clip(
             s3_key = clip.s3_url.split("/")[-1]
             s3_key = f"clips/{s3_key}"
             
-        from services.r2 import r2_service
         download_url = r2_service.generate_presigned_get_url(s3_key)
         
         return {"download_url": download_url}
@@ -98,3 +132,73 @@ async def download_clip(
     except Exception as e:
         print(f"Error generating download URL: {e}")
         raise HTTPException(status_code=500, detail="Could not generate download link")
+
+@router.get("/clips/{clip_id}/timeline", response_model=ClipTimelineResponse)
+async def get_clip_timeline(
+    clip_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Thumbnail sprite, WebVTT index and peak waveform around the clip, as presigned
+    R2 URLs, so the editor can scrub and trim without loading the video.
+    """
+    result = await db.execute(
+        select(Clip)
+        .join(Project, Clip.project_id == Project.id)
+        .where(
+            Clip.id == clip_id,
+            Project.user_id == user_id
+        )
+    )
+    clip = result.scalar_one_or_none()
+    if not clip or not clip.timeline:
+        raise HTTPException(status_code=404, detail="Timeline not available for this clip")
+
+    from services.r2 import r2_service
+    timeline = dict(clip.timeline)
+    keys = timeline.pop("keys")
+    urls = {f"{kind}_url": r2_service.generate_presigned_get_url(key) for kind, key in keys.items()}
+    return ClipTimelineResponse(**timeline, **urls)
+
+@router.patch("/clips/{clip_id}/captions", response_model=ClipResponse)
+async def update_caption_style(
+    clip_id: str,
+    style_in: CaptionStyleUpdate,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Restyles a soft-caption clip without re-encoding: stores the style and rewrites
+    its caption sidecars. The editor previews styles client-side; the burned-in
+    render happens only when the clip is downloaded.
+    """
+    result = await db.execute(
+        select(Clip)
+        .join(Project, Clip.project_id == Project.id)
+        .where(
+            Clip.id == clip_id,
+            Project.user_id == user_id
+        )
+    )
+    clip = result.scalar_one_or_none()
+    if not clip:
+        raise HTTPException(status_code=404, detail="Clip not found or access denied")
+    if not clip.captions:
+        raise HTTPException(status_code=409, detail="Captions are burned into this clip; re-burn it to change the style")
+
+    from services.ffmpeg_processor import ffmpeg_processor
+    from services.processor import rewrite_captions
+    from services.subtitles import SubtitleError
+
+    if style_in.style_name not in ffmpeg_processor.STYLES:
+        raise HTTPException(status_code=422, detail=f"Unknown caption style '{style_in.style_name}'")
+
+    try:
+        clip.captions = await rewrite_captions(clip, style_in.style_name, style_in.karaoke)
+    except SubtitleError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    await db.commit()
+    await db.refresh(clip)
+    await invalidate_dashboard_async(user_id)
+    return clip
@@ -1,21 +1,99 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
+from celery import group
 from database import get_db
-from models import Project, User, ProjectStatus
-from schemas import ProjectCreate, ProjectResponse, ClipResponse
+from auth import get_current_user
+from models import Project, User, Batch, ProjectStatus
+from schemas import ProjectCreate, ProjectResponse, ClipResponse, BatchCreate, BatchResponse, BatchProjectStatus, ReanalyzeRequest, CaptionStyleUpdate
 from celery_app import celery_app
-import uuid
+from config import settings
+from services.admission import admit
+from services.credits import spend_credits
+from services.burn_jobs import coalesce_burn, next_burn_generation, pending_burn_params, get_burn_stats
+from services.prerender import record_style_request, remember_styles, find_prerender
+from services import tracing
+from services.read_model import (
+    preferred_encoding, get_cached_dashboard, get_dashboard_version, store_dashboard,
+    serialize, invalidate_dashboard_async
+)
+import asyncio
+import hmac
+import json
 
 router = APIRouter()
 
-# Mock User Dependency (Replace with Clerk verification later)
-async def get_current_user():
-    # For MVP, return a hardcoded user ID or extract from header if implemented
-    # In production, verify JWT token from Clerk
-    return "user_2t..." # Example Clerk ID
+def sign_clip_renditions(clip, expiration: int = 3600):
+    """
+    Replaces the preview/poster/HLS playlist URLs of a clip with presigned URLs (in memory only).
+    Soft-caption sidecars become presigned URLs too, plus the captioned download if
+    one was exported for the clip's current edit.
+    """
+    from services.r2 import r2_service
+    from services.subtitles import caption_signature, clip_transcript
+
+    for field in ("preview_url", "poster_url", "hls_url"):
+        url = getattr(clip, field, None)
+        if not url:
+            continue
+        try:
+            setattr(clip, field, r2_service.generate_presigned_get_url(r2_service.get_key_from_url(url), expiration=expiration))
+        except Exception as e:
+            print(f"Error generating presigned {field} for clip {clip.id}: {e}")
+
+    captions = getattr(clip, "captions", None)
+    if captions and "keys" in captions:
+        signed = {"mode": captions["mode"], "style_name": captions["style_name"], "karaoke": captions["karaoke"]}
+        try:
+            for kind in ("vtt", "ass"):
+                if captions["keys"].get(kind):
+                    signed[f"{kind}_url"] = r2_service.generate_presigned_get_url(captions["keys"][kind], expiration=expiration)
+            burned = captions.get("burned")
+            signature = caption_signature(clip_transcript(clip), clip.start_time, clip.end_time, captions["style_name"], captions["karaoke"])
+            if burned and burned["signature"] == signature:
+                signed["burned_url"] = r2_service.generate_presigned_get_url(burned["key"], expiration=expiration)
+        except Exception as e:
+            print(f"Error generating presigned caption URLs for clip {clip.id}: {e}")
+        clip.captions = signed
+
+def processing_task_name() -> str:
+    """
+    Entry task for a new project: through the fair scheduler unless it is disabled.
+    """
+    if settings.ENABLE_FAIR_SCHEDULING:
+        return "services.processor.schedule_project_task"
+    return "services.processor.process_video_task"
+
+def dashboard_response(body: bytes, encoding: str, cache_status: str) -> Response:
+    headers = {"Vary": "Accept-Encoding", "X-Dashboard-Cache": cache_status}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def rendition_keys(clip) -> list[str]:
+    """
+    Returns the R2 keys of a clip's extra renditions.
+    The HLS playlist, edit timeline and caption sidecars are returned as their directory
+    prefix (trailing "/"), which delete_files_task removes recursively.
+    """
+    from services.r2 import r2_service
+
+    keys = []
+    for url in (clip.preview_url, clip.poster_url):
+        if url:
+            keys.append(r2_service.get_key_from_url(url))
+    if clip.hls_url:
+        keys.append(r2_service.get_key_from_url(clip.hls_url).rsplit('/', 1)[0] + '/')
+    if clip.timeline and clip.timeline.get("keys"):
+        keys.append(clip.timeline["keys"]["sprite"].rsplit('/', 1)[0] + '/')
+    if clip.captions and clip.captions.get("keys"):
+        keys.append(clip.captions["keys"]["srt"].rsplit('/', 1)[0] + '/')
+        if clip.captions.get("burned"):
+            keys.append(clip.captions["burned"]["key"])
+    return keys
 
 @router.post("/process-video", response_model=ProjectResponse, status_code=status.HTTP_202_ACCEPTED)
 async def process_video(
@@ -34,18 +112,31 @@ async def process_video(
         db.add(user)
         await db.commit()
     
-    # 1. Create Project in DB
+    if user.credits_remaining is not None and user.credits_remaining <= 0:
+        raise HTTPException(status_code=402, detail="No credits remaining")
+
+    # Reject (429/503 + Retry-After) if the user or the queue is over capacity; after the
+    # credit check, so a user without credits does not use up their rate budget
+    await admit("process-video", user_id)
+    
+    # 1. Create Project in DB (and spend a credit in the same transaction)
+    if not await spend_credits(db, user_id):
+        await db.rollback()
+        raise HTTPException(status_code=402, detail="No credits remaining")
     new_project = Project(
         user_id=user_id,
         source_url=project_in.source_url,
+        clip_duration=project_in.clip_duration,
         status=ProjectStatus.PENDING.value
     )
     db.add(new_project)
     await db.commit()
     await db.refresh(new_project)
+    await invalidate_dashboard_async(user_id)
+    tracing.annotate(**{"tandav.project_id": str(new_project.id)})
 
-    # 2. Trigger Celery Task
-    task = celery_app.send_task("services.processor.process_video_task", args=[str(new_project.id)])
+    # 2. Trigger Celery Task (routed to the fast queue when it is the scheduler)
+    celery_app.send_task(processing_task_name(), args=[str(new_project.id)])
     
     # For now, we just return the project. Task triggering will be uncommented when processor is ready.
     
@@ -57,18 +148,136 @@ async def process_video(
         source_url=new_project.source_url,
         status=new_project.status,
         error_message=new_project.error_message,
+        clip_duration=new_project.clip_duration,
         clips=[], # Explicitly empty
         created_at=new_project.created_at
     )
 
+@router.post("/batches", response_model=BatchResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_batch(
+    batch_in: BatchCreate,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Creates N projects in one transaction and enqueues them as one Celery group.
+    Costs one credit per project; poll GET /batches/{id} for aggregate progress.
+    """
+    count = len(batch_in.projects)
+    if not count:
+        raise HTTPException(status_code=400, detail="A batch needs at least one project")
+    if count > settings.MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"A batch can hold at most {settings.MAX_BATCH_SIZE} projects")
+
+    result = await db.execute(select(User).where(User.clerk_id == user_id))
+    user = result.scalar_one_or_none()
+    if not user:
+        user = User(clerk_id=user_id, email=f"{user_id}@temp.com")  # Placeholder email
+        db.add(user)
+        # Flush so the new user's default credits are known before the check
+        await db.flush()
+
+    remaining = user.credits_remaining
+    if remaining is not None and remaining < count:
+        raise HTTPException(status_code=402, detail=f"Batch needs {count} credits, {remaining} remaining")
+
+    await admit("batch", user_id, jobs=count)
+
+    if not await spend_credits(db, user_id, count):
+        await db.rollback()
+        raise HTTPException(status_code=402, detail=f"Batch needs {count} credits, {remaining} remaining")
+
+    batch = Batch(user_id=user_id, name=batch_in.name)
+    db.add(batch)
+    await db.flush()
+    projects = [
+        Project(
+            user_id=user_id, source_url=item.source_url, clip_duration=item.clip_duration,
+            status=ProjectStatus.PENDING.value, batch_id=batch.id
+        )
+        for item in batch_in.projects
+    ]
+    db.add_all(projects)
+    await db.commit()
+    await db.refresh(batch)
+    await invalidate_dashboard_async(user_id)
+
+    # One broker round trip for the whole batch
+    task_name = processing_task_name()
+    group(celery_app.signature(task_name, args=[str(project.id)]) for project in projects).apply_async()
+
+    return BatchResponse(
+        id=batch.id,
+        name=batch.name,
+        total=count,
+        pending=count,
+        projects=[BatchProjectStatus(id=p.id, source_url=p.source_url, status=p.status) for p in projects],
+        created_at=batch.created_at
+    )
+
+@router.get("/batches/{batch_id}", response_model=BatchResponse)
+async def get_batch(
+    batch_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Aggregate progress of a batch, with the status of each of its projects.
+    """
+    result = await db.execute(select(Batch).where(Batch.id == batch_id, Batch.user_id == user_id))
+    batch = result.scalar_one_or_none()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    result = await db.execute(
+        select(Project.id, Project.source_url, Project.status, Project.error_message)
+        .where(Project.batch_id == batch.id)
+        .order_by(Project.created_at)
+    )
+    projects = [BatchProjectStatus.model_validate(row) for row in result.all()]
+
+    counts = {s.value: 0 for s in ProjectStatus}
+    for project in projects:
+        counts[project.status] = counts.get(project.status, 0) + 1
+    total = len(projects)
+    finished = counts[ProjectStatus.COMPLETED.value] + counts[ProjectStatus.FAILED.value]
+
+    return BatchResponse(
+        id=batch.id,
+        name=batch.name,
+        total=total,
+        pending=counts[ProjectStatus.PENDING.value],
+        processing=counts[ProjectStatus.PROCESSING.value],
+        completed=counts[ProjectStatus.COMPLETED.value],
+        failed=counts[ProjectStatus.FAILED.value],
+        progress=round(finished / total, 4) if total else 0.0,
+        projects=projects,
+        created_at=batch.created_at
+    )
+
 @router.get("/projects", response_model=list[ProjectResponse])
 async def list_projects(
+    request: Request,
     db: AsyncSession = Depends(get_db),
     user_id: str = Depends(get_current_user)
 ):
     """
     List all projects for the current user, including their clips.
+    Served from the per-user read model in Redis when it is current; otherwise
+    rebuilt from Postgres, cached, and returned pre-compressed.
     """
+    accept_encoding = request.headers.get("accept-encoding")
+    cached = await get_cached_dashboard(user_id, accept_encoding)
+    if cached:
+        return dashboard_response(*cached, cache_status="HIT")
+
+    # Read the version before querying: a write landing mid-build bumps it, and the
+    # body built here is then never served from the cache
+    try:
+        version = await get_dashboard_version(user_id)
+    except Exception:
+        version = None
+
     result = await db.execute(
         select(Project)
         .options(selectinload(Project.clips))
@@ -97,8 +306,17 @@ async def list_projects(
                     clip.s3_url = r2_service.generate_presigned_get_url(s3_key, expiration=3600)
                 except Exception:
                     pass
+                sign_clip_renditions(clip, expiration=3600)
+
+    payload = [ProjectResponse.model_validate(project).model_dump(mode="json") for project in projects]
+    bodies = serialize(payload)
+    # The objects now hold presigned URLs; make sure they are never flushed back
+    db.expunge_all()
+    if version is not None:
+        await store_dashboard(user_id, version, bodies)
 
-    return projects
+    encoding = preferred_encoding(accept_encoding)
+    return dashboard_response(bodies[encoding or "identity"], encoding, cache_status="MISS")
 
 @router.get("/projects/{project_id}/clips", response_model=list[ClipResponse])
 async def get_project_clips(
@@ -167,6 +385,7 @@ async def get_project_clips(
             # Since we are returning a list of ClipResponse, we can just modify the object in memory
             # SQLAlchemy objects returned by all() are mutable.
             clip.s3_url = presigned_url
+            sign_clip_renditions(clip)
             response_clips.append(clip)
         except Exception as e:
             print(f"Error generating presigned URL for clip {clip.id}: {e}")
@@ -174,11 +393,207 @@ async def get_project_clips(
             
     return response_clips
 
+async def get_owned_project_with_clips(db: AsyncSession, project_id: str, user_id: str) -> Project:
+    result = await db.execute(
+        select(Project)
+        .options(selectinload(Project.clips))
+        .where(Project.id == project_id, Project.user_id == user_id)
+    )
+    project = result.scalar_one_or_none()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not project.clips:
+        raise HTTPException(status_code=409, detail="Project has no clips to export")
+    return project
+
+@router.get("/projects/{project_id}/export")
+async def export_project(
+    project_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Streams a ZIP of every clip in the project plus SRT captions and a JSON manifest.
+    The archive is assembled on the fly from ranged R2 reads: constant memory, no temp files.
+    Archives over EXPORT_STREAM_MAX_MB must use the async export (POST) instead.
+    """
+    from services.export import project_archive, archive_filename
+
+    project = await get_owned_project_with_clips(db, project_id, user_id)
+    archive = await asyncio.get_running_loop().run_in_executor(None, project_archive, project, project.clips)
+    if archive.size() > settings.EXPORT_STREAM_MAX_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail="Export too large to stream; start an async export instead")
+
+    return StreamingResponse(
+        iter(archive),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f'attachment; filename="{archive_filename(project)}"',
+            "Content-Length": str(archive.size()),
+        }
+    )
+
+@router.post("/projects/{project_id}/export", status_code=status.HTTP_202_ACCEPTED)
+async def start_project_export(
+    project_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Starts an async export: a worker writes the ZIP to R2 with a multipart upload.
+    Poll GET /projects/{id}/export/status for the download link.
+    """
+    from services.export import EXPORT_STATUS_PREFIX, EXPORT_STATUS_TTL_SECONDS
+    from services.redis_client import get_async_redis
+
+    await get_owned_project_with_clips(db, project_id, user_id)
+    await get_async_redis().set(
+        f"{EXPORT_STATUS_PREFIX}{project_id}", json.dumps({"status": "PENDING"}), ex=EXPORT_STATUS_TTL_SECONDS
+    )
+    celery_app.send_task("export_project", args=[project_id])
+    return {"status": "PENDING"}
+
+@router.get("/projects/{project_id}/export/status")
+async def get_project_export_status(
+    project_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Status of the latest async export, with a presigned download URL once it completed.
+    """
+    from services.export import EXPORT_STATUS_PREFIX
+    from services.redis_client import get_async_redis
+    from services.r2 import r2_service
+
+    result = await db.execute(select(Project.id).where(Project.id == project_id, Project.user_id == user_id))
+    if not result.first():
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    raw = await get_async_redis().get(f"{EXPORT_STATUS_PREFIX}{project_id}")
+    if not raw:
+        raise HTTPException(status_code=404, detail="No export found for this project")
+    export = json.loads(raw)
+    if export["status"] == "COMPLETED":
+        export["download_url"] = r2_service.generate_presigned_get_url(export.pop("s3_key"))
+    return export
+
+@router.post("/projects/{project_id}/reanalyze", response_model=ProjectResponse, status_code=status.HTTP_202_ACCEPTED)
+async def reanalyze_project(
+    project_id: str,
+    reanalyze_in: ReanalyzeRequest,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Finds more clips in a finished project, optionally at a different clip duration.
+    Existing clips are kept and their windows excluded; the source's Gemini upload
+    (and context cache) is reused while it is still live, so only the prompt is paid.
+    """
+    result = await db.execute(
+        select(Project).options(selectinload(Project.user)).where(Project.id == project_id, Project.user_id == user_id)
+    )
+    project = result.scalar_one_or_none()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.status in (ProjectStatus.PENDING.value, ProjectStatus.PROCESSING.value):
+        raise HTTPException(status_code=409, detail="Project is already being processed")
+    if project.user.credits_remaining is not None and project.user.credits_remaining <= 0:
+        raise HTTPException(status_code=402, detail="No credits remaining")
+
+    await admit("process-video", user_id)
+
+    if reanalyze_in.clip_duration:
+        project.clip_duration = reanalyze_in.clip_duration
+    if not await spend_credits(db, user_id):
+        await db.rollback()
+        raise HTTPException(status_code=402, detail="No credits remaining")
+    project.status = ProjectStatus.PENDING.value
+    project.error_message = None
+    await db.commit()
+    await invalidate_dashboard_async(user_id)
+
+    celery_app.send_task(processing_task_name(), args=[str(project.id)])
+    return ProjectResponse(
+        id=project.id,
+        user_id=project.user_id,
+        source_url=project.source_url,
+        status=project.status,
+        duration=project.duration,
+        width=project.width,
+        height=project.height,
+        fps=project.fps,
+        batch_id=project.batch_id,
+        clip_duration=project.clip_duration,
+        clips=[], # Fetched through GET /projects/{id}/clips
+        created_at=project.created_at
+    )
+
+@router.post("/projects/{project_id}/restyle", status_code=status.HTTP_202_ACCEPTED)
+async def restyle_project(
+    project_id: str,
+    style_in: CaptionStyleUpdate,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Applies one caption style to every captioned clip of a project as a single job:
+    the source is fetched once, nearby clips share a decode, and all clips switch to
+    their new renditions together. A clip with a queued or running burn (e.g. a trim)
+    is not rendered by the job: that burn is re-queued with the new style instead.
+    """
+    from models import Clip
+    from services.ffmpeg_processor import ffmpeg_processor
+    if style_in.style_name not in ffmpeg_processor.STYLES:
+        raise HTTPException(status_code=422, detail=f"Unknown caption style '{style_in.style_name}'")
+
+    result = await db.execute(select(Project).where(Project.id == project_id, Project.user_id == user_id))
+    project = result.scalar_one_or_none()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.status in (ProjectStatus.PENDING.value, ProjectStatus.PROCESSING.value):
+        raise HTTPException(status_code=409, detail="Project is still being processed")
+
+    clips = (await db.execute(select(Clip).where(Clip.project_id == project.id, Clip.transcript.isnot(None)))).scalars().all()
+    if not clips:
+        raise HTTPException(status_code=409, detail="Project has no captioned clips")
+
+    await admit("burn", user_id)
+
+    # Soft-caption clips are restyled without a render, so their pending burns (e.g. trims) stay valid
+    generations = {}
+    burns = []
+    for clip in clips:
+        clip_id = str(clip.id)
+        if clip.captions:
+            generations[clip_id] = None
+            continue
+        generation = await next_burn_generation(clip_id, clip.render_generation)
+        pending = await pending_burn_params(clip_id)
+        if pending:
+            # Rendering from the stored trim would cancel the pending one: burn its parameters in the new style
+            params = {**pending, "style_name": style_in.style_name, "karaoke": style_in.karaoke, "generation": generation}
+            if await coalesce_burn(clip_id, params):
+                burns.append([clip_id, params["start_time"], params["end_time"], style_in.style_name, style_in.karaoke, generation])
+        else:
+            generations[clip_id] = generation
+    await remember_styles([str(clip.id) for clip in clips if not clip.captions], style_in.style_name, style_in.karaoke)
+
+    try:
+        for args in burns:
+            celery_app.send_task("services.processor.burn_subtitles_task", args=args)
+        celery_app.send_task(
+            "services.processor.restyle_project_task",
+            args=[str(project.id), style_in.style_name, style_in.karaoke, generations]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to trigger restyle task: {e}")
+    return {"message": "Restyling started.", "clips": len(clips)}
+
 @router.post("/projects/{project_id}/archive")
 async def delete_project(project_id: str, db: AsyncSession = Depends(get_db)):
     try:
         # 1. Fetch Project (Try with Clips first, fallback to just Project)
-        from models import Clip
         project = None
         is_corrupted = False
         
@@ -223,6 +638,7 @@ async def delete_project(project_id: str, db: AsyncSession = Depends(get_db)):
                             keys_to_delete.append(s3_key)
                         else:
                             keys_to_delete.append(parts[-1])
+                        keys_to_delete.extend(rendition_keys(clip))
                     except:
                         continue
         except Exception as e:
@@ -240,6 +656,7 @@ async def delete_project(project_id: str, db: AsyncSession = Depends(get_db)):
             await db.delete(project)
             
         await db.commit()
+        await invalidate_dashboard_async(project.user_id)
         
         # 4. Trigger Background Deletion
         if keys_to_delete:
@@ -265,7 +682,6 @@ async def delete_old_projects(
     Bulk delete projects older than X days.
     """
     from datetime import datetime, timedelta, timezone
-    from models import Clip
     
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=older_than_days)
     
@@ -301,6 +717,7 @@ async def delete_old_projects(
                         keys_to_delete.append(s3_key)
                     else:
                         keys_to_delete.append(parts[-1])
+                    keys_to_delete.extend(rendition_keys(clip))
                 except:
                     pass
             
@@ -311,6 +728,7 @@ async def delete_old_projects(
             print(f"Error deleting project {project.id}: {e}")
             
     await db.commit()
+    await invalidate_dashboard_async(user_id)
     
     # Trigger background deletion for all collected keys
     if keys_to_delete:
@@ -325,35 +743,162 @@ class BurnRequest(BaseModel):
     start_time: float = None
     end_time: float = None
     style_name: str = "Hormozi"
+    karaoke: bool = False
 
 @router.post("/clips/{clip_id}/burn")
 async def burn_clip(
     clip_id: str, 
     request: BurnRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
 ):
     """
     Triggers a background task to re-burn subtitles into the clip.
     Can also update start/end times (Trim) and Style.
+    If a speculative render of exactly this edit exists, the clip switches to it at once.
     """
     # Verify clip exists
     from models import Clip
-    result = await db.execute(select(Clip).where(Clip.id == clip_id))
+    from services.media_probe import validate_trim
+    from services.ffmpeg_processor import ffmpeg_processor
+    from services.subtitles import caption_signature, clip_transcript
+    result = await db.execute(
+        select(Clip)
+        .options(selectinload(Clip.project))
+        .join(Project, Clip.project_id == Project.id)
+        .where(Clip.id == clip_id, Project.user_id == user_id)
+    )
     clip = result.scalar_one_or_none()
     
     if not clip:
-        raise HTTPException(status_code=404, detail="Clip not found")
+        raise HTTPException(status_code=404, detail="Clip not found or access denied")
+        
+    # Reject impossible trims against the probed source bounds before queuing any work
+    start_time = request.start_time if request.start_time is not None else clip.start_time
+    end_time = request.end_time if request.end_time is not None else clip.end_time
+    try:
+        validate_trim(start_time, end_time, clip.project.duration if clip.project else None)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if request.style_name in ffmpeg_processor.STYLES:
+        await record_style_request(clip, request.style_name, request.karaoke)
+
+    # Burned clip with a finished prerender of this transcript, trim and style: swap, no encode
+    transcript = clip_transcript(clip, start_time)
+    if transcript and not clip.captions:
+        signature = caption_signature(transcript, start_time, end_time, request.style_name, request.karaoke)
+        manifest = await asyncio.get_running_loop().run_in_executor(None, find_prerender, clip.project_id, clip.id, signature)
+        if manifest:
+            generation = await next_burn_generation(clip_id, clip.render_generation)
+            renditions = manifest["renditions"]
+            values = {
+                "s3_url": renditions["s3_url"],
+                "preview_url": renditions.get("preview_url"),
+                "poster_url": renditions.get("poster_url"),
+                "hls_url": renditions.get("hls_url"),
+                "captions": None,
+                "start_time": start_time,
+                "end_time": end_time,
+            }
+            stmt = update(Clip).where(Clip.id == clip.id)
+            if generation is not None:
+                stmt = stmt.where(Clip.render_generation < generation)
+                values["render_generation"] = generation
+            await db.execute(stmt.values(**values))
+            await db.commit()
+            await invalidate_dashboard_async(clip.project.user_id)
+            return {"message": "Clip updated.", "coalesced": False, "prerendered": True}
         
+    await admit("burn", user_id)
+
+    # A new generation supersedes any burn of this clip that is queued or running
+    generation = await next_burn_generation(clip_id, clip.render_generation)
+
+    # Coalesce: if a burn for this clip is still queued, it will render these parameters instead
+    params = {
+        "start_time": request.start_time,
+        "end_time": request.end_time,
+        "style_name": request.style_name,
+        "karaoke": request.karaoke,
+        "generation": generation,
+    }
+    if not await coalesce_burn(clip_id, params):
+        return {"message": "Burning started. This may take a few moments.", "coalesced": True, "prerendered": False}
+
     # Trigger Task
     try:
         celery_app.send_task(
             "services.processor.burn_subtitles_task", 
-            args=[clip_id, request.start_time, request.end_time, request.style_name]
+            args=[clip_id, request.start_time, request.end_time, request.style_name, request.karaoke, generation]
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to trigger burn task: {e}")
         
-    return {"message": "Burning started. This may take a few moments."}
+    return {"message": "Burning started. This may take a few moments.", "coalesced": False, "prerendered": False}
+
+async def require_admin_token(x_admin_token: str = Header(None)):
+    # Admin endpoints expose internals (profiles, burn counters): only with the configured token
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@router.get("/admin/burn-stats", dependencies=[Depends(require_admin_token)])
+async def burn_stats():
+    """
+    Counters for completed vs. superseded re-burns (count and worker seconds spent),
+    i.e. how much encode time coalescing and cancellation are saving.
+    """
+    try:
+        return await get_burn_stats()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"Burn stats unavailable: {e}")
+
+@router.post("/admin/profile", response_class=PlainTextResponse, dependencies=[Depends(require_admin_token)])
+async def profile_api(seconds: float = 10):
+    """
+    Samples this API process for `seconds` while it keeps serving and returns the
+    profile as folded stacks (flamegraph.pl / speedscope). Also stored in R2 under
+    profiles/api/; the key is in the X-Profile-Key header.
+    """
+    from services.profiling import profile_api as run_profile
+    if not 0 < seconds <= settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=422, detail=f"seconds must be between 0 and {settings.PROFILE_MAX_SECONDS}")
+    key, folded = await run_profile(seconds)
+    return PlainTextResponse(folded, headers={"X-Profile-Key": key})
+
+@router.post("/admin/profile/projects/{project_id}", dependencies=[Depends(require_admin_token)])
+async def arm_project_profile(project_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Profiles the next process-video or re-burn task of a project (one run). The
+    profile is stored in R2 under profiles/<project_id>/.
+    """
+    from services.profiling import arm_project
+    if not await db.get(Project, project_id):
+        raise HTTPException(status_code=404, detail="Project not found")
+    if not await arm_project(project_id):
+        raise HTTPException(status_code=503, detail="Could not arm profiling (Redis unavailable)")
+    return {"armed": True, "expires_in": settings.PROFILE_ARM_TTL_SECONDS}
+
+@router.get("/admin/profile/projects/{project_id}", dependencies=[Depends(require_admin_token)])
+async def list_project_profiles(project_id: str):
+    """
+    Stored task profiles of a project, newest first, with presigned download URLs.
+    """
+    from services.r2 import r2_service
+    from services.profiling import PROFILE_PREFIX
+    response = r2_service.s3_client.list_objects_v2(Bucket=r2_service.bucket_name, Prefix=f"{PROFILE_PREFIX}/{project_id}/")
+    objects = sorted(response.get("Contents", []), key=lambda obj: obj["LastModified"], reverse=True)
+    return [
+        {
+            "key": obj["Key"],
+            "size": obj["Size"],
+            "created_at": obj["LastModified"].isoformat(),
+            "url": r2_service.generate_presigned_get_url(obj["Key"]),
+        }
+        for obj in objects
+    ]
 
 @router.post("/admin/reset-stuck")
 async def reset_stuck_projects(db: AsyncSession = Depends(get_db)):
@@ -374,4 +919,6 @@ async def reset_stuck_projects(db: AsyncSession = Depends(get_db)):
         count += 1
         
     await db.commit()
+    for user_id in {project.user_id for project in projects}:
+        await invalidate_dashboard_async(user_id)
     return {"message": f"Reset {count} stuck projects to FAILED state."}
@@ -1,9 +1,25 @@
 from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from datetime import datetime, timezone
+from database import get_db
+from auth import get_current_user
+from config import settings
+from models import MultipartUpload, UploadStatus, User
 from services.r2 import r2_service
-from schemas import PresignedUrlResponse
+from schemas import (
+    PresignedUrlResponse, MultipartUploadCreate, MultipartUploadResponse,
+    MultipartPartUrlsRequest, MultipartPartUrlsResponse, MultipartCompleteResponse, UploadedPart
+)
+import asyncio
+import math
 
 router = APIRouter()
 
+# R2/S3 multipart limits
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
 @router.get("/upload-url", response_model=PresignedUrlResponse)
 async def get_upload_url(filename: str, content_type: str):
     """
@@ -18,3 +34,149 @@ async def get_upload_url(filename: str, content_type: str):
         return data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+async def get_active_upload(upload_id: str, user_id: str, db: AsyncSession) -> MultipartUpload:
+    result = await db.execute(
+        select(MultipartUpload).where(MultipartUpload.id == upload_id, MultipartUpload.user_id == user_id)
+    )
+    upload = result.scalar_one_or_none()
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if upload.status != UploadStatus.ACTIVE.value:
+        raise HTTPException(status_code=409, detail=f"Upload is {upload.status.lower()}")
+    return upload
+
+@router.post("/uploads/multipart", response_model=MultipartUploadResponse)
+async def create_multipart_upload(
+    upload_in: MultipartUploadCreate,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Starts a resumable multipart upload. The client uploads part_count parts of
+    part_size bytes (the last one may be shorter) to URLs from the /parts endpoint.
+    """
+    if not upload_in.content_type.startswith("video/"):
+        raise HTTPException(status_code=400, detail="Invalid content type. Only video files are allowed.")
+    if upload_in.size <= 0:
+        raise HTTPException(status_code=400, detail="File is empty")
+
+    # The upload row references the user: create it on a first upload, as process_video does
+    result = await db.execute(select(User).where(User.clerk_id == user_id))
+    if not result.scalar_one_or_none():
+        db.add(User(clerk_id=user_id, email=f"{user_id}@temp.com"))  # Placeholder email
+        await db.flush()
+
+    part_size = max(settings.MULTIPART_PART_SIZE_MB * 1024 * 1024, MIN_PART_SIZE, math.ceil(upload_in.size / MAX_PARTS))
+    try:
+        created = await asyncio.to_thread(r2_service.create_multipart_upload, upload_in.filename, upload_in.content_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    upload = MultipartUpload(
+        user_id=user_id,
+        upload_id=created["upload_id"],
+        s3_key=created["s3_key"],
+        filename=upload_in.filename,
+        content_type=upload_in.content_type,
+        size=upload_in.size,
+        part_size=part_size,
+        part_count=math.ceil(upload_in.size / part_size),
+        status=UploadStatus.ACTIVE.value
+    )
+    db.add(upload)
+    await db.commit()
+    await db.refresh(upload)
+    return upload
+
+@router.get("/uploads/multipart/{upload_id}", response_model=MultipartUploadResponse)
+async def get_multipart_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Returns an upload's layout, so a client can check it is still resumable.
+    """
+    return await get_active_upload(upload_id, user_id, db)
+
+@router.post("/uploads/multipart/{upload_id}/parts", response_model=MultipartPartUrlsResponse)
+async def presign_multipart_parts(
+    upload_id: str,
+    request: MultipartPartUrlsRequest,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Presigns a batch of part upload URLs.
+    """
+    upload = await get_active_upload(upload_id, user_id, db)
+    if len(request.part_numbers) > settings.MULTIPART_MAX_PARTS_PER_REQUEST:
+        raise HTTPException(status_code=400, detail=f"At most {settings.MULTIPART_MAX_PARTS_PER_REQUEST} parts per request")
+    if any(n < 1 or n > upload.part_count for n in request.part_numbers):
+        raise HTTPException(status_code=400, detail=f"Part numbers must be between 1 and {upload.part_count}")
+
+    urls = r2_service.presign_upload_parts(upload.s3_key, upload.upload_id, request.part_numbers)
+    return {"urls": urls}
+
+@router.get("/uploads/multipart/{upload_id}/parts", response_model=list[UploadedPart])
+async def list_multipart_parts(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Lists the parts R2 already has, so an interrupted upload resumes where it stopped.
+    """
+    upload = await get_active_upload(upload_id, user_id, db)
+    try:
+        parts = await asyncio.to_thread(r2_service.list_uploaded_parts, upload.s3_key, upload.upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return [{"part_number": p["PartNumber"], "size": p["Size"]} for p in parts]
+
+@router.post("/uploads/multipart/{upload_id}/complete", response_model=MultipartCompleteResponse)
+async def complete_multipart_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Assembles the uploaded parts into the final object.
+    Part ETags are read from R2 rather than the browser, so the bucket's CORS
+    policy does not need to expose the ETag header.
+    """
+    upload = await get_active_upload(upload_id, user_id, db)
+    try:
+        parts = await asyncio.to_thread(r2_service.list_uploaded_parts, upload.s3_key, upload.upload_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    missing = sorted(set(range(1, upload.part_count + 1)) - {p["PartNumber"] for p in parts})
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Missing parts: {missing[:20]}")
+
+    try:
+        await asyncio.to_thread(r2_service.complete_multipart_upload, upload.s3_key, upload.upload_id, parts)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    upload.status = UploadStatus.COMPLETED.value
+    upload.completed_at = datetime.now(timezone.utc)
+    await db.commit()
+    return {"s3_key": upload.s3_key, "filename": upload.filename}
+
+@router.delete("/uploads/multipart/{upload_id}")
+async def abort_multipart_upload(
+    upload_id: str,
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user)
+):
+    """
+    Cancels an upload and frees the parts stored so far.
+    """
+    upload = await get_active_upload(upload_id, user_id, db)
+    await asyncio.to_thread(r2_service.abort_multipart_upload, upload.s3_key, upload.upload_id)
+    upload.status = UploadStatus.ABORTED.value
+    await db.commit()
+    return {"message": "Upload aborted"}
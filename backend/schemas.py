@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, Field, AliasChoices
+from typing import Optional, List, Literal
 from uuid import UUID
 from datetime import datetime
 
@@ -19,12 +19,25 @@ class UserResponse(UserBase):
         from_attributes = True
 
 # Clip Schemas
+class ClipCaptions(BaseModel):
+    mode: str # "soft": the video is clean, captions come from the sidecars
+    style_name: str
+    karaoke: bool = False
+    vtt_url: Optional[str] = None
+    ass_url: Optional[str] = None
+    burned_url: Optional[str] = None # Captioned download of the current edit, once exported
+
 class ClipResponse(BaseModel):
     id: UUID
     project_id: UUID
     s3_url: str
+    preview_url: Optional[str] = None
+    poster_url: Optional[str] = None
+    hls_url: Optional[str] = None
+    captions: Optional[ClipCaptions] = None
     virality_score: Optional[int] = None
-    transcript: Optional[str] = None
+    # Cues relative to start_time (Clip.current_transcript), not the stored anchor
+    transcript: Optional[str] = Field(None, validation_alias=AliasChoices("current_transcript", "transcript"))
     start_time: Optional[float] = None
     end_time: Optional[float] = None
     created_at: datetime
@@ -35,10 +48,30 @@ class ClipResponse(BaseModel):
 class ClipUpdate(BaseModel):
     transcript: Optional[str] = None
 
+class CaptionStyleUpdate(BaseModel):
+    style_name: str
+    karaoke: bool = False
+
+class ClipTimelineResponse(BaseModel):
+    start: float # Source seconds covered by the sprite and waveform
+    end: float
+    interval: float # Seconds per thumbnail
+    count: int
+    columns: int
+    rows: int
+    thumb_width: int
+    thumb_height: int
+    sprite_url: str
+    vtt_url: str
+    waveform_url: Optional[str] = None # uint8 peaks, peaks_per_second of them per second
+    peaks_per_second: Optional[int] = None
+
 # Project Schemas
+ClipDuration = Literal["auto", "30s", "60s"]
+
 class ProjectCreate(BaseModel):
     source_url: str
-    clip_duration: str = "auto" # "auto", "30s", "60s"
+    clip_duration: ClipDuration = "auto"
     # Optional: Add brand kit overrides here if needed
 
 class ProjectResponse(BaseModel):
@@ -47,14 +80,81 @@ class ProjectResponse(BaseModel):
     source_url: str
     status: str
     error_message: Optional[str] = None
+    duration: Optional[float] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    fps: Optional[float] = None
+    batch_id: Optional[UUID] = None
+    clip_duration: str = "auto"
     clips: List[ClipResponse] = []
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class ReanalyzeRequest(BaseModel):
+    # None keeps the project's current preference
+    clip_duration: Optional[ClipDuration] = None
+
+# Batch Schemas
+class BatchCreate(BaseModel):
+    name: Optional[str] = None
+    projects: List[ProjectCreate]
+
+class BatchProjectStatus(BaseModel):
+    id: UUID
+    source_url: str
+    status: str
+    error_message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class BatchResponse(BaseModel):
+    id: UUID
+    name: Optional[str] = None
+    total: int
+    pending: int = 0
+    processing: int = 0
+    completed: int = 0
+    failed: int = 0
+    progress: float = 0.0 # Finished (completed or failed) / total
+    projects: List[BatchProjectStatus] = []
+    created_at: datetime
+
 # Upload Schemas
 class PresignedUrlResponse(BaseModel):
     upload_url: str
     s3_key: str
     filename: str
+
+class MultipartUploadCreate(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
+class MultipartUploadResponse(BaseModel):
+    id: UUID
+    s3_key: str
+    filename: str
+    size: int
+    part_size: int
+    part_count: int
+    status: str
+
+    class Config:
+        from_attributes = True
+
+class MultipartPartUrlsRequest(BaseModel):
+    part_numbers: List[int]
+
+class MultipartPartUrlsResponse(BaseModel):
+    urls: dict[int, str]
+
+class MultipartCompleteResponse(BaseModel):
+    s3_key: str
+    filename: str
+
+class UploadedPart(BaseModel):
+    part_number: int
+    size: int
@@ -0,0 +1,80 @@
+"""
+Text waterfalls from the JSON-lines trace file (ENABLE_TRACING without an OTLP endpoint).
+
+    python scripts/trace_waterfall.py [--file /tmp/tandav_traces.jsonl] [--project <id>] [--last 5]
+
+One block per trace, spans indented under their parent with their offset from the
+trace start and duration, e.g. where a process-video request spent its time between
+the API, the fair queue, Celery and the worker's Gemini/ffmpeg/R2 calls.
+For real use point OTEL_EXPORTER_ENDPOINT at a collector (Jaeger, Tempo, ...) instead.
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+BAR_WIDTH = 40
+
+def parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+def load_traces(path: str) -> dict:
+    traces = collections.defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            span = json.loads(line)
+            span["start"] = parse_time(span["start_time"])
+            span["end"] = parse_time(span["end_time"])
+            traces[span["context"]["trace_id"]].append(span)
+    return traces
+
+def print_trace(spans: list):
+    started = min(span["start"] for span in spans)
+    total = max(span["end"] for span in spans) - started or 1e-9
+    ids = {span["context"]["span_id"] for span in spans}
+    children = collections.defaultdict(list)
+    for span in sorted(spans, key=lambda s: s["start"]):
+        # Parents from another process that did not export (yet) are treated as roots
+        children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+
+    print(f"trace {spans[0]['context']['trace_id']}  {total * 1000:.0f}ms  {len(spans)} spans")
+
+    def walk(parent, depth):
+        for span in children[parent]:
+            offset, duration = span["start"] - started, span["end"] - span["start"]
+            lead = int(offset / total * BAR_WIDTH)
+            bar = " " * lead + "#" * max(1, int(duration / total * BAR_WIDTH))
+            error = "  ERROR" if span["status"]["status_code"] == "ERROR" else ""
+            print(f"  {bar:<{BAR_WIDTH}} {offset * 1000:>9.0f}ms {duration * 1000:>9.0f}ms  {'  ' * depth}{span['name']}{error}")
+            walk(span["context"]["span_id"], depth + 1)
+
+    walk(None, 0)
+    print()
+
+def main():
+    from config import settings
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", default=settings.TRACE_FILE)
+    parser.add_argument("--project", help="Only traces with a span tagged with this project id")
+    parser.add_argument("--last", type=int, default=5, help="Most recent traces to show")
+    args = parser.parse_args()
+
+    traces = list(load_traces(args.file).values())
+    if args.project:
+        traces = [
+            spans for spans in traces
+            if any(args.project in (span["attributes"].get("tandav.project_id"), span["attributes"].get("celery.subject_id")) for span in spans)
+        ]
+    traces.sort(key=lambda spans: min(span["start"] for span in spans))
+    for spans in traces[-args.last:]:
+        print_trace(spans)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import math
+from fastapi import HTTPException
+from config import settings
+from services.rate_limit import TokenBucket
+from services.redis_client import get_async_redis
+from services.scheduling import FAIR_QUEUE_KEY
+
+# Per-user, per-endpoint buckets: burst capacity + sustained refill rate
+BUCKETS = {
+    "process-video": TokenBucket(
+        "process-video",
+        capacity=settings.PROCESS_VIDEO_BURST,
+        refill_per_second=settings.PROCESS_VIDEO_PER_MINUTE / 60.0
+    ),
+    "burn": TokenBucket(
+        "burn",
+        capacity=settings.BURN_BURST,
+        refill_per_second=settings.BURN_PER_MINUTE / 60.0
+    ),
+    "batch": TokenBucket(
+        "batch",
+        capacity=settings.BATCH_BURST,
+        refill_per_second=settings.BATCH_PER_HOUR / 3600.0
+    ),
+}
+
+async def admit(endpoint: str, user_id: str, jobs: int = 1):
+    """
+    Admission control for endpoints that enqueue Celery work.
+    Raises 503 when the work queue cannot take `jobs` more jobs and 429 when the user exceeded
+    their rate for this endpoint, both with a Retry-After header.
+    Fails open if Redis is unavailable, so the API keeps working without it.
+    """
+    try:
+        client = get_async_redis()
+
+        # Backlog = jobs waiting in the fair scheduler + tasks already in the broker
+        depth = await client.llen(settings.CELERY_QUEUE_NAME) + await client.zcard(FAIR_QUEUE_KEY)
+        if depth + jobs > settings.MAX_QUEUE_DEPTH:
+            raise HTTPException(
+                status_code=503,
+                detail="The processing queue is full. Please try again shortly.",
+                headers={"Retry-After": str(settings.QUEUE_BACKOFF_SECONDS)}
+            )
+
+        allowed, retry_after = await BUCKETS[endpoint].consume_async(client, user_id)
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests. Please slow down.",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Admission control unavailable, admitting request: {e}")
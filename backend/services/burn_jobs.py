@@ -0,0 +1,181 @@
+import json
+from services.redis_client import get_async_redis, get_redis
+
+# Per-clip burn coordination:
+# - params/queued: requests arriving while a burn is still queued are merged into it
+# - running: the parameters of burns that have started, by generation, so a project
+#   restyle can fold itself into a pending re-burn instead of cancelling it
+# - generation: every request bumps the clip's generation; a running burn whose
+#   generation is no longer the latest stops (killing ffmpeg) and never commits
+BURN_PARAMS_KEY = "burn:params:{clip_id}"
+BURN_QUEUED_KEY = "burn:queued:{clip_id}"
+BURN_GENERATION_KEY = "burn:generation:{clip_id}"
+BURN_RUNNING_KEY = "burn:running:{clip_id}"
+BURN_STATS_KEY = "burn:stats"
+BURN_PENDING_TTL = 3600
+BURN_GENERATION_TTL = 7 * 24 * 3600
+# Soft-caption clips: one captioned export render at a time, however often download is clicked
+CLIP_EXPORT_CLAIM_KEY = "burn:export:{clip_id}"
+CLIP_EXPORT_CLAIM_TTL = 900
+
+class BurnSuperseded(Exception):
+    """
+    Raised inside a burn when a newer request for the same clip has arrived.
+    """
+
+async def next_burn_generation(clip_id: str, committed_generation: int = 0) -> int:
+    """
+    Allocates the generation number for a new burn request.
+    Never returns a value at or below the generation already committed to the DB,
+    even if Redis lost its state. Returns None if Redis is unavailable.
+    """
+    try:
+        client = get_async_redis()
+        key = BURN_GENERATION_KEY.format(clip_id=clip_id)
+        generation = await client.incr(key)
+        if generation <= (committed_generation or 0):
+            generation = (committed_generation or 0) + 1
+            await client.set(key, generation)
+        await client.expire(key, BURN_GENERATION_TTL)
+        return generation
+    except Exception as e:
+        print(f"Burn generation unavailable for clip {clip_id}: {e}")
+        return None
+
+async def coalesce_burn(clip_id: str, params: dict) -> bool:
+    """
+    Records the latest burn parameters for a clip.
+    Returns True if a burn task has to be enqueued, or False if one is already
+    queued for this clip (it will pick up these parameters when it starts).
+    """
+    try:
+        client = get_async_redis()
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.set(BURN_PARAMS_KEY.format(clip_id=clip_id), json.dumps(params), ex=BURN_PENDING_TTL)
+            pipe.set(BURN_QUEUED_KEY.format(clip_id=clip_id), 1, nx=True, ex=BURN_PENDING_TTL)
+            _, newly_queued = await pipe.execute()
+        return bool(newly_queued)
+    except Exception as e:
+        print(f"Burn coalescing unavailable, enqueueing directly: {e}")
+        return True
+
+def take_burn_params(clip_id: str) -> dict:
+    """
+    Called by the burn task when it starts: returns the latest parameters
+    submitted for the clip (or None) and clears the queued flag, so the next
+    request after this point enqueues a fresh task.
+    """
+    try:
+        client = get_redis()
+        with client.pipeline(transaction=True) as pipe:
+            pipe.get(BURN_PARAMS_KEY.format(clip_id=clip_id))
+            pipe.delete(BURN_PARAMS_KEY.format(clip_id=clip_id))
+            pipe.delete(BURN_QUEUED_KEY.format(clip_id=clip_id))
+            raw, _, _ = pipe.execute()
+        return json.loads(raw) if raw else None
+    except Exception as e:
+        print(f"Could not read pending burn params for clip {clip_id}: {e}")
+        return None
+
+def mark_burn_running(clip_id: str, params: dict):
+    """
+    Records the resolved parameters of a burn that has started (until end_burn).
+    """
+    try:
+        client = get_redis()
+        key = BURN_RUNNING_KEY.format(clip_id=clip_id)
+        with client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, str(params.get("generation")), json.dumps(params))
+            pipe.expire(key, BURN_PENDING_TTL)
+            pipe.execute()
+    except Exception as e:
+        print(f"Could not record running burn of clip {clip_id}: {e}")
+
+def end_burn(clip_id: str, generation: int):
+    try:
+        get_redis().hdel(BURN_RUNNING_KEY.format(clip_id=clip_id), str(generation))
+    except Exception as e:
+        print(f"Could not clear running burn of clip {clip_id}: {e}")
+
+async def pending_burn_params(clip_id: str) -> dict:
+    """
+    Returns the parameters of the newest burn of a clip that is queued or running
+    and has not finished yet, or None if there is none (or Redis is unavailable).
+    """
+    try:
+        client = get_async_redis()
+        queued = await client.get(BURN_PARAMS_KEY.format(clip_id=clip_id))
+        running = await client.hvals(BURN_RUNNING_KEY.format(clip_id=clip_id))
+    except Exception as e:
+        print(f"Could not read pending burns of clip {clip_id}: {e}")
+        return None
+    pending = [json.loads(raw) for raw in ([queued] if queued else []) + list(running)]
+    return max(pending, key=lambda params: params.get("generation") or 0, default=None)
+
+def latest_burn_generation(clip_id: str) -> int:
+    """
+    Returns the newest generation requested for a clip (None if unknown).
+    """
+    try:
+        value = get_redis().get(BURN_GENERATION_KEY.format(clip_id=clip_id))
+        return int(value) if value is not None else None
+    except Exception as e:
+        print(f"Could not read burn generation for clip {clip_id}: {e}")
+        return None
+
+def is_superseded(clip_id: str, generation: int) -> bool:
+    """
+    True if a newer burn than `generation` has been requested for the clip.
+    """
+    if generation is None:
+        return False
+    latest = latest_burn_generation(clip_id)
+    return latest is not None and latest > generation
+
+async def claim_clip_export(clip_id: str) -> bool:
+    """
+    True if no captioned export of this clip is already running (and claims it).
+    """
+    try:
+        return bool(await get_async_redis().set(CLIP_EXPORT_CLAIM_KEY.format(clip_id=clip_id), "1", nx=True, ex=CLIP_EXPORT_CLAIM_TTL))
+    except Exception as e:
+        print(f"Export claim unavailable for clip {clip_id}: {e}")
+        return True
+
+def release_clip_export(clip_id: str):
+    try:
+        get_redis().delete(CLIP_EXPORT_CLAIM_KEY.format(clip_id=clip_id))
+    except Exception as e:
+        print(f"Could not release export claim of clip {clip_id}: {e}")
+
+def record_burn_outcome(outcome: str, seconds: float = 0.0):
+    """
+    Accumulates counters for superseded burns so the worker time saved is measurable:
+    outcome is one of "completed", "skipped" (superseded before any work),
+    "cancelled" (ffmpeg killed mid-render) or "discarded" (finished but not committed).
+    """
+    try:
+        client = get_redis()
+        with client.pipeline(transaction=False) as pipe:
+            pipe.hincrby(BURN_STATS_KEY, f"{outcome}_count", 1)
+            pipe.hincrbyfloat(BURN_STATS_KEY, f"{outcome}_seconds", round(seconds, 3))
+            pipe.execute()
+    except Exception as e:
+        print(f"Could not record burn stats: {e}")
+
+async def get_burn_stats() -> dict:
+    """
+    Returns the burn outcome counters recorded by record_burn_outcome, plus an
+    estimate of the worker time saved by skipping/cancelling superseded burns.
+    """
+    client = get_async_redis()
+    raw = await client.hgetall(BURN_STATS_KEY)
+    stats = {key.decode(): float(value) for key, value in raw.items()}
+
+    # Every skipped/cancelled burn would otherwise have cost about one full render
+    completed = stats.get("completed_count", 0)
+    if completed:
+        average = stats.get("completed_seconds", 0) / completed
+        avoided = stats.get("skipped_count", 0) + stats.get("cancelled_count", 0)
+        stats["estimated_saved_seconds"] = round(avoided * average - stats.get("cancelled_seconds", 0), 1)
+    return stats
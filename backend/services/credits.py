@@ -0,0 +1,29 @@
+from sqlalchemy import update, or_
+from models import User
+
+# Credits are spent with one conditional UPDATE, so parallel requests cannot both
+# take the last credits. credits_remaining NULL means unlimited (NULL - n stays NULL).
+
+async def spend_credits(db, user_id: str, amount: int = 1) -> bool:
+    """
+    Takes `amount` credits in the session's transaction. Returns False (nothing
+    taken) if the user has fewer left.
+    """
+    result = await db.execute(
+        update(User)
+        .where(User.clerk_id == user_id, or_(User.credits_remaining.is_(None), User.credits_remaining >= amount))
+        .values(credits_remaining=User.credits_remaining - amount)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount > 0
+
+async def refund_credits(db, user_id: str, amount: int = 1):
+    """
+    Gives back credits spent on work that failed, in the session's transaction.
+    """
+    await db.execute(
+        update(User)
+        .where(User.clerk_id == user_id)
+        .values(credits_remaining=User.credits_remaining + amount)
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,128 @@
+import json
+import time
+from datetime import datetime, timezone
+from config import settings
+from services.r2 import r2_service
+from services.redis_client import get_redis
+from services.subtitles import parse_srt, clip_transcript, SubtitleError
+from services.zip_stream import ZipStream, ZipMember
+
+EXPORT_STATUS_PREFIX = "export:"
+# Exports land in the bucket like uploads, so the daily R2 cleanup removes them too
+EXPORT_STATUS_TTL_SECONDS = 24 * 3600
+
+def _clip_basename(index: int, clip) -> str:
+    start = int(clip.start_time or 0)
+    return f"clip_{index:02d}_{start // 60:02d}m{start % 60:02d}s"
+
+def project_archive(project, clips: list) -> ZipStream:
+    """
+    ZIP of a project's clips (stored, streamed from R2 with ranged reads), one SRT
+    per captioned clip, and manifest.json describing every segment.
+    Issues one HEAD per clip, so call it off the event loop.
+    """
+    members = []
+    manifest_clips = []
+    for index, clip in enumerate(sorted(clips, key=lambda c: c.start_time or 0), start=1):
+        key = r2_service.get_key_from_url(clip.s3_url)
+        size = r2_service.get_object_size(key)
+        if size is None:
+            print(f"Skipping clip {clip.id} in export of project {project.id}: object {key} unavailable")
+            continue
+        name = _clip_basename(index, clip)
+        members.append(ZipMember(
+            f"{name}.mp4", size,
+            lambda key=key, size=size: r2_service.iter_object(key, size),
+            modified=clip.created_at
+        ))
+
+        captions = None
+        transcript = clip_transcript(clip)
+        if transcript:
+            try:
+                parse_srt(transcript)
+                captions = f"{name}.srt"
+                members.append(ZipMember.from_bytes(captions, transcript.encode("utf-8"), modified=clip.created_at))
+            except SubtitleError:
+                pass  # A plain description, kept in the manifest only
+
+        manifest_clips.append({
+            "file": f"{name}.mp4",
+            "captions": captions,
+            "start_time": clip.start_time,
+            "end_time": clip.end_time,
+            "virality_score": clip.virality_score,
+            "description": None if captions else transcript,
+        })
+
+    manifest = {
+        "project_id": str(project.id),
+        "source": project.source_url,
+        "duration": project.duration,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "clips": manifest_clips,
+    }
+    members.append(ZipMember.from_bytes("manifest.json", json.dumps(manifest, indent=2).encode("utf-8")))
+    return ZipStream(members)
+
+def archive_filename(project) -> str:
+    return f"tandav-{str(project.id)[:8]}.zip"
+
+def set_export_status(project_id: str, status: str, **fields):
+    get_redis().set(
+        f"{EXPORT_STATUS_PREFIX}{project_id}",
+        json.dumps({"status": status, "updated_at": time.time(), **fields}),
+        ex=EXPORT_STATUS_TTL_SECONDS
+    )
+
+def write_archive_to_r2(archive: ZipStream, filename: str) -> str:
+    """
+    Streams an archive into an R2 multipart upload, holding at most one part in
+    memory. Returns the object key; the upload is aborted on failure.
+    """
+    part_size = settings.MULTIPART_PART_SIZE_MB * 1024 * 1024
+    upload = r2_service.create_multipart_upload(filename, "application/zip")
+    s3_key, upload_id = upload["s3_key"], upload["upload_id"]
+    parts = []
+    buffer = bytearray()
+    try:
+        for chunk in archive:
+            buffer += chunk
+            while len(buffer) >= part_size:
+                parts.append(r2_service.upload_part(s3_key, upload_id, len(parts) + 1, bytes(buffer[:part_size])))
+                del buffer[:part_size]
+        # The last part may be smaller than the minimum part size
+        if buffer or not parts:
+            parts.append(r2_service.upload_part(s3_key, upload_id, len(parts) + 1, bytes(buffer)))
+        r2_service.complete_multipart_upload(s3_key, upload_id, parts)
+    except Exception:
+        r2_service.abort_multipart_upload(s3_key, upload_id)
+        raise
+    return s3_key
+
+async def export_project_to_r2(project_id: str):
+    """
+    Async export path for archives too large to stream through the API:
+    writes the ZIP to R2 and records progress under export:<project_id>.
+    """
+    from sqlalchemy import select
+    from sqlalchemy.orm import selectinload
+    from database import AsyncSessionLocal
+    from models import Project
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Project).options(selectinload(Project.clips)).where(Project.id == project_id))
+        project = result.scalar_one_or_none()
+    if not project:
+        return
+
+    set_export_status(project_id, "RUNNING")
+    try:
+        archive = project_archive(project, project.clips)
+        started = time.monotonic()
+        s3_key = write_archive_to_r2(archive, archive_filename(project))
+        set_export_status(project_id, "COMPLETED", s3_key=s3_key, size=archive.size())
+        print(f"Exported project {project_id} ({archive.size() // (1024 * 1024)}MB) to {s3_key} in {time.monotonic() - started:.1f}s")
+    except Exception as e:
+        print(f"Export of project {project_id} failed: {e}")
+        set_export_status(project_id, "FAILED", error=str(e))
@@ -1,88 +1,367 @@
 import ffmpeg
+import json
+import math
 import os
+import numpy as np
+from services.ffmpeg_supervisor import ffmpeg_supervisor, FFmpegFailed, FFmpegCancelled
+from services.subtitles import subtitle_engine
+from services.timecode import parse_time, format_vtt_time
+
+# Rendition ladder settings. "full" is the download master, "preview" is what the
+# dashboard grid streams, so it is kept small (a few hundred KB for a 30s clip).
+FULL_CRF = 20
+PREVIEW_WIDTH = 360
+PREVIEW_VIDEO_BITRATE = '400k'
+HLS_CRF = 23
+HLS_SEGMENT_SECONDS = 4
+
+# Edit-modal timeline assets: a thumbnail sprite sheet (WebVTT-indexed) and a peak
+# waveform covering the segment plus its neighbourhood, so trimming needs no video
+TIMELINE_THUMB_WIDTH = 160
+TIMELINE_THUMB_HEIGHT = 90
+TIMELINE_MAX_THUMBS = 120
+TIMELINE_COLUMNS = 10
+WAVEFORM_SAMPLE_RATE = 8000
+WAVEFORM_PEAKS_PER_SECOND = 50
+
+class RenderCancelled(Exception):
+    """
+    Raised when an encode was killed because its result is no longer wanted.
+    """
 
 class FFmpegProcessor:
+    # FFmpeg force_style strings per caption style
+    STYLES = {
+        "Hormozi": "Fontname=Liberation Sans,FontSize=24,PrimaryColour=&H0000FFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=2,Shadow=0,MarginV=25,Bold=1,Alignment=2",  # Yellow Text, Black Outline
+        "Classic": "Fontname=Liberation Sans,FontSize=24,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1,Shadow=0,MarginV=20,Alignment=2",      # White Text, Black Outline
+        "Minimal": "Fontname=Liberation Sans,FontSize=16,PrimaryColour=&H00DDDDDD,OutlineColour=&H80000000,BorderStyle=1,Outline=0,Shadow=0,MarginV=15,Alignment=2",      # Grey Text, Subtle
+        "Neon":    "Fontname=Liberation Sans,FontSize=26,PrimaryColour=&H00FFFF00,OutlineColour=&H00FF00FF,BorderStyle=1,Outline=2,Shadow=0,MarginV=25,Bold=1,Alignment=2",  # Cyan Text, Pink Outline
+        "Boxed":   "Fontname=Liberation Sans,FontSize=24,PrimaryColour=&H00FFFFFF,BackColour=&H80000000,BorderStyle=3,Outline=0,Shadow=0,MarginV=20,Alignment=2",          # White Text, Black Box
+    }
+
     def get_style_string(self, style_name: str) -> str:
         """
         Returns the FFmpeg force_style string for the given style name.
         Colors are in &HBBGGRR format (Hex).
         """
-        styles = {
-            "Hormozi": "Fontname=Liberation Sans,FontSize=24,PrimaryColour=&H0000FFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=2,Shadow=0,MarginV=25,Bold=1,Alignment=2",  # Yellow Text, Black Outline
-            "Classic": "Fontname=Liberation Sans,FontSize=24,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1,Shadow=0,MarginV=20,Alignment=2",      # White Text, Black Outline
-            "Minimal": "Fontname=Liberation Sans,FontSize=16,PrimaryColour=&H00DDDDDD,OutlineColour=&H80000000,BorderStyle=1,Outline=0,Shadow=0,MarginV=15,Alignment=2",      # Grey Text, Subtle
-            "Neon":    "Fontname=Liberation Sans,FontSize=26,PrimaryColour=&H00FFFF00,OutlineColour=&H00FF00FF,BorderStyle=1,Outline=2,Shadow=0,MarginV=25,Bold=1,Alignment=2",  # Cyan Text, Pink Outline
-            "Boxed":   "Fontname=Liberation Sans,FontSize=24,PrimaryColour=&H00FFFFFF,BackColour=&H80000000,BorderStyle=3,Outline=0,Shadow=0,MarginV=20,Alignment=2",          # White Text, Black Box
-        }
-        return styles.get(style_name, styles["Hormozi"])
+        return self.STYLES.get(style_name, self.STYLES["Hormozi"])
 
-    def process_segment(self, input_path: str, output_path: str, start_time: str, end_time: str, srt_content: str = None, style_name: str = "Hormozi"):
+    def process_segment(self, input_path: str, output_path: str, start_time: str, end_time: str, srt_content: str = None, style_name: str = "Hormozi", karaoke: bool = False, preview_path: str = None, poster_path: str = None, hls_dir: str = None, timeline_dir: str = None, timeline_window: tuple = None, has_audio: bool = True, captions_dir: str = None, should_cancel=None) -> dict:
         """
         Cuts, crops (9:16), and optionally burns subtitles into a video segment.
+        With karaoke=True each caption word is highlighted as it is spoken.
+        The decoded frames are split into a rendition ladder in the same pass:
+        the full-quality download at output_path, plus an optional low-bitrate
+        preview, poster JPEG and fMP4/HLS playlist.
+        With timeline_dir, the pass decodes timeline_window (source seconds, a
+        superset of the segment) instead, trims the clip out of it, and also writes
+        the edit timeline (see write_timeline) for the whole window.
+        With captions_dir (soft-caption mode) the captions are not burned: they are
+        written there as SRT/WebVTT/ASS sidecars and muxed into the full MP4 as a
+        mov_text track, so a style change later needs no re-encode.
+        Returns a dict of rendition name -> local path.
+        should_cancel is polled while ffmpeg runs; if it returns True the encode is
+        killed and RenderCancelled is raised.
         """
         try:
             print(f"Processing segment: {input_path} -> {output_path} ({start_time} to {end_time}) [Style: {style_name}]")
             
-            # Create stream
-            stream = ffmpeg.input(input_path, ss=start_time, to=end_time)
-            
-            # Video processing: Crop to 9:16
-            # Assuming 1080p input (1920x1080), crop to 608x1080 centered
-            # crop=w:h:x:y
-            stream = ffmpeg.filter(stream, 'crop', 'ih*(9/16)', 'ih', '(iw-ow)/2', 0)
+            timeline_video = timeline_audio = None
+            if timeline_dir:
+                # Decode the whole neighbourhood once; the clip is trimmed out of it in the graph
+                window_start, window_end = timeline_window
+                offset = parse_time(start_time) - window_start
+                length = parse_time(end_time) - parse_time(start_time)
+                source = ffmpeg.input(input_path, ss=window_start, to=window_end)
+                video_branches = source.video.split()
+                video = video_branches[0].trim(start=offset, duration=length).setpts('PTS-STARTPTS')
+                timeline_video = video_branches[1]
+                audio = None
+                if has_audio:
+                    # Trimming audio needs a filter, so the track must exist (probed by the caller)
+                    audio_branches = source.audio.asplit()
+                    audio = audio_branches[0].filter('atrim', start=offset, duration=length).filter('asetpts', 'PTS-STARTPTS')
+                    timeline_audio = audio_branches[1]
+            else:
+                # Create stream
+                source = ffmpeg.input(input_path, ss=start_time, to=end_time)
+                video = source.video
+                # Sources without an audio track are valid, so map audio optionally
+                audio = source['a?']
             
-            # Subtitle burning
-            temp_srt_path = None
-            if srt_content:
-                import uuid
-                # Manually create temp file to avoid tempfile.NamedTemporaryFile issues
-                temp_srt_path = f"/tmp/{uuid.uuid4()}.srt"
-                
-                try:
-                    with open(temp_srt_path, "w", encoding="utf-8") as f:
-                        f.write(srt_content)
-                    
-                    # Verify file exists and has content
-                    if not os.path.exists(temp_srt_path):
-                        print(f"ERROR: SRT file was not created at {temp_srt_path}")
-                    else:
-                        print(f"Created SRT file at {temp_srt_path} (Size: {os.path.getsize(temp_srt_path)} bytes)")
-
-                    # Get Style String
-                    style = self.get_style_string(style_name)
-                    
-                    # Escape path for FFmpeg
-                    # On Linux/Docker, forward slashes are standard.
-                    # We just need to escape the colon if it was a Windows absolute path (C:), but in /tmp it's fine.
-                    # However, the filter string syntax might require escaping of the path itself if it contained special chars.
-                    # For a UUID path in /tmp, it is safe.
-                    temp_srt_path_escaped = temp_srt_path.replace('\\', '/').replace(':', '\\:')
-                    
-                    stream = ffmpeg.filter(stream, 'subtitles', temp_srt_path_escaped, force_style=style)
-                except Exception as e:
-                    print(f"Error creating SRT file: {e}")
-                    # If we can't create the SRT, we should probably fail or skip subtitles
-                    # For now, let's re-raise to see the error
-                    raise e
-
-            # Output
-            stream = ffmpeg.output(stream, output_path, vcodec='libx264', acodec='aac', strict='experimental')
+            outputs, renditions = self._segment_outputs(
+                video, audio, start_time, end_time, output_path, srt_content, style_name, karaoke,
+                preview_path, poster_path, hls_dir, captions_dir
+            )
+
+            timeline = None
+            if timeline_dir:
+                os.makedirs(timeline_dir, exist_ok=True)
+                timeline = self._timeline_layout(window_start, window_end)
+                thumbs = (
+                    timeline_video
+                    .filter('fps', fps=f"1/{timeline['interval']}")
+                    .filter('scale', TIMELINE_THUMB_WIDTH, TIMELINE_THUMB_HEIGHT, force_original_aspect_ratio='decrease')
+                    .filter('pad', TIMELINE_THUMB_WIDTH, TIMELINE_THUMB_HEIGHT, '(ow-iw)/2', '(oh-ih)/2')
+                    .filter('tile', f"{timeline['columns']}x{timeline['rows']}")
+                )
+                outputs.append(ffmpeg.output(thumbs, os.path.join(timeline_dir, "sprite.jpg"), vframes=1, **{'q:v': 5}))
+                if timeline_audio is not None:
+                    outputs.append(ffmpeg.output(
+                        timeline_audio, os.path.join(timeline_dir, "audio.pcm"),
+                        format='s16le', acodec='pcm_s16le', ac=1, ar=WAVEFORM_SAMPLE_RATE
+                    ))
+                renditions["timeline"] = timeline_dir
+
+            stream = ffmpeg.merge_outputs(*outputs)
             
             # Run
             print(f"FFmpeg command: {ffmpeg.compile(stream)}")
-            ffmpeg.run(stream, overwrite_output=True, capture_stdout=True, capture_stderr=True)
+            self._run(stream, should_cancel=should_cancel)
+
+            if timeline:
+                self.write_timeline(timeline_dir, timeline)
             
-            # Cleanup temp SRT
-            if temp_srt_path and os.path.exists(temp_srt_path):
-                try:
-                    os.remove(temp_srt_path)
-                except:
-                    pass
+            return renditions
+        except ffmpeg.Error as e:
+            error_msg = e.stderr.decode('utf8') if e.stderr else 'Unknown error'
+            print(f"FFmpeg error: {error_msg}")
+            raise Exception(f"FFmpeg failed: {error_msg}")
+
+    def process_segments(self, input_path: str, segments: list[dict], has_audio: bool = True, should_cancel=None) -> list[dict]:
+        """
+        Renders several clips of one source in a single ffmpeg run: the span from the
+        first clip's start to the last clip's end is decoded once and every clip is
+        trimmed out of it, so keep the clips close together. Each segment holds
+        process_segment arguments (output_path, srt_content, style_name, karaoke and
+        rendition paths) with start_time/end_time in source seconds.
+        Returns each segment's renditions, in order.
+        """
+        try:
+            window_start = min(segment["start_time"] for segment in segments)
+            window_end = max(segment["end_time"] for segment in segments)
+            print(f"Processing {len(segments)} segments of {input_path} in one decode ({window_start:.1f}s to {window_end:.1f}s)")
+
+            source = ffmpeg.input(input_path, ss=window_start, to=window_end)
+            if len(segments) > 1:
+                video_branches = source.video.split()
+                audio_branches = source.audio.asplit() if has_audio else None
+            else:
+                video_branches = [source.video]
+                audio_branches = [source.audio] if has_audio else None
+
+            outputs, results = [], []
+            for i, segment in enumerate(segments):
+                offset = segment["start_time"] - window_start
+                length = segment["end_time"] - segment["start_time"]
+                video = video_branches[i].trim(start=offset, duration=length).setpts('PTS-STARTPTS')
+                audio = None
+                if has_audio:
+                    audio = audio_branches[i].filter('atrim', start=offset, duration=length).filter('asetpts', 'PTS-STARTPTS')
+                segment_outputs, renditions = self._segment_outputs(
+                    video, audio, str(segment["start_time"]), str(segment["end_time"]), segment["output_path"],
+                    segment.get("srt_content"), segment.get("style_name", "Hormozi"), segment.get("karaoke", False),
+                    segment.get("preview_path"), segment.get("poster_path"), segment.get("hls_dir"), segment.get("captions_dir")
+                )
+                outputs += segment_outputs
+                results.append(renditions)
+
+            stream = ffmpeg.merge_outputs(*outputs)
+            print(f"FFmpeg command: {ffmpeg.compile(stream)}")
+            self._run(stream, should_cancel=should_cancel)
+            return results
+        except ffmpeg.Error as e:
+            error_msg = e.stderr.decode('utf8') if e.stderr else 'Unknown error'
+            print(f"FFmpeg error: {error_msg}")
+            raise Exception(f"FFmpeg failed: {error_msg}")
+
+    def _segment_outputs(self, video, audio, start_time: str, end_time: str, output_path: str, srt_content: str = None, style_name: str = "Hormozi", karaoke: bool = False, preview_path: str = None, poster_path: str = None, hls_dir: str = None, captions_dir: str = None) -> tuple[list, dict]:
+        """
+        Builds one clip's part of a graph from its (already trimmed) video and audio:
+        9:16 crop, captions, and an output per rendition. Returns (outputs, renditions).
+        """
+        # Video processing: Crop to 9:16
+        # Assuming 1080p input (1920x1080), crop to 608x1080 centered
+        # crop=w:h:x:y
+        stream = ffmpeg.filter(video, 'crop', 'ih*(9/16)', 'ih', '(iw-ow)/2', 0)
+        
+        # Subtitle burning: the engine validates the transcript and hands back a cached,
+        # pre-styled ASS file, so a broken SRT fails here instead of mid-encode
+        caption_track = None
+        if srt_content and captions_dir:
+            duration = parse_time(end_time) - parse_time(start_time)
+            files = subtitle_engine.write_sidecars(
+                captions_dir, srt_content, style_name, self.get_style_string(style_name),
+                karaoke=karaoke, duration=duration
+            )
+            caption_track = ffmpeg.input(os.path.join(captions_dir, files["srt"]))['s']
+        elif srt_content:
+            duration = parse_time(end_time) - parse_time(start_time)
+            ass_path = subtitle_engine.prepare(
+                srt_content, style_name, self.get_style_string(style_name),
+                karaoke=karaoke, duration=duration
+            )
             
-            return output_path
+            # Escape path for FFmpeg filter syntax
+            ass_path_escaped = ass_path.replace('\\', '/').replace(':', '\\:')
+            stream = ffmpeg.filter(stream, 'ass', ass_path_escaped)
+
+        # Fan the filtered frames out to every requested rendition (one decode, N encodes)
+        renditions = {"full": output_path}
+        if preview_path:
+            renditions["preview"] = preview_path
+        if poster_path:
+            renditions["poster"] = poster_path
+        if hls_dir:
+            os.makedirs(hls_dir, exist_ok=True)
+            renditions["hls"] = os.path.join(hls_dir, "index.m3u8")
+
+        if len(renditions) > 1:
+            branches = stream.split()
+            video_streams = {name: branches[i] for i, name in enumerate(renditions)}
+        else:
+            video_streams = {"full": stream}
+
+        # A filtered (trimmed) audio stream can feed only one output; input streams can feed several
+        audio_outputs = [name for name in renditions if name != "poster"]
+        if audio is not None and len(audio_outputs) > 1 and isinstance(audio.node, ffmpeg.nodes.FilterNode):
+            audio_branches = audio.asplit()
+            audio_streams = {name: audio_branches[i] for i, name in enumerate(audio_outputs)}
+        else:
+            audio_streams = {name: audio for name in audio_outputs}
+
+        def with_audio(video, name):
+            audio_stream = audio_streams[name]
+            return [video] if audio_stream is None else [video, audio_stream]
+
+        outputs = []
+        for name, path in renditions.items():
+            video = video_streams[name]
+            if name == "full":
+                streams = with_audio(video, name)
+                subtitle_args = {}
+                if caption_track is not None:
+                    streams.append(caption_track)
+                    subtitle_args = {'scodec': 'mov_text', 'metadata:s:s:0': 'language=eng'}
+                outputs.append(ffmpeg.output(
+                    *streams, path,
+                    vcodec='libx264', preset='veryfast', crf=FULL_CRF,
+                    acodec='aac', audio_bitrate='128k', movflags='+faststart',
+                    **subtitle_args
+                ))
+            elif name == "preview":
+                video = video.filter('scale', PREVIEW_WIDTH, -2)
+                outputs.append(ffmpeg.output(
+                    *with_audio(video, name), path,
+                    vcodec='libx264', preset='veryfast', video_bitrate=PREVIEW_VIDEO_BITRATE,
+                    maxrate=PREVIEW_VIDEO_BITRATE, bufsize='800k',
+                    acodec='aac', audio_bitrate='64k', movflags='+faststart'
+                ))
+            elif name == "poster":
+                # Pick a representative frame rather than a possibly black first frame
+                video = video.filter('thumbnail', 30).filter('scale', PREVIEW_WIDTH, -2)
+                outputs.append(ffmpeg.output(video, path, vframes=1, **{'q:v': 4}))
+            elif name == "hls":
+                outputs.append(ffmpeg.output(
+                    *with_audio(video, name), path,
+                    format='hls', vcodec='libx264', preset='veryfast', crf=HLS_CRF,
+                    acodec='aac', audio_bitrate='96k',
+                    hls_time=HLS_SEGMENT_SECONDS, hls_playlist_type='vod',
+                    hls_segment_type='fmp4', hls_fmp4_init_filename='init.mp4',
+                    hls_segment_filename=os.path.join(hls_dir, 'seg_%03d.m4s')
+                ))
+
+        if caption_track is not None:
+            renditions["captions"] = captions_dir
+
+        return outputs, renditions
+
+    def _timeline_layout(self, window_start: float, window_end: float) -> dict:
+        """
+        One thumbnail every `interval` seconds (at most TIMELINE_MAX_THUMBS),
+        tiled TIMELINE_COLUMNS wide into a single sprite sheet.
+        """
+        span = max(window_end - window_start, 1.0)
+        interval = max(1, math.ceil(span / TIMELINE_MAX_THUMBS))
+        count = max(1, math.ceil(span / interval))
+        columns = min(TIMELINE_COLUMNS, count)
+        return {
+            "start": window_start,
+            "end": window_end,
+            "interval": interval,
+            "count": count,
+            "columns": columns,
+            "rows": math.ceil(count / columns),
+            "thumb_width": TIMELINE_THUMB_WIDTH,
+            "thumb_height": TIMELINE_THUMB_HEIGHT,
+        }
+
+    def write_timeline(self, timeline_dir: str, timeline: dict):
+        """
+        Completes the timeline next to the rendered sprite.jpg:
+        - thumbnails.vtt: one cue per thumbnail (source seconds) -> sprite.jpg#xywh=...
+        - waveform.bin: peak amplitude per 1/WAVEFORM_PEAKS_PER_SECOND s, one uint8 each
+        - timeline.json: the layout, for the API to hand to the editor
+        """
+        width, height = timeline["thumb_width"], timeline["thumb_height"]
+        cues = ["WEBVTT", ""]
+        for i in range(timeline["count"]):
+            start = timeline["start"] + i * timeline["interval"]
+            end = min(start + timeline["interval"], timeline["end"])
+            x, y = (i % timeline["columns"]) * width, (i // timeline["columns"]) * height
+            cues += [
+                f"{format_vtt_time(start * 1000)} --> {format_vtt_time(end * 1000)}",
+                f"sprite.jpg#xywh={x},{y},{width},{height}",
+                "",
+            ]
+        with open(os.path.join(timeline_dir, "thumbnails.vtt"), "w") as f:
+            f.write("\n".join(cues))
+
+        timeline["files"] = {"sprite": "sprite.jpg", "vtt": "thumbnails.vtt"}
+        pcm_path = os.path.join(timeline_dir, "audio.pcm")
+        if os.path.exists(pcm_path):
+            samples = np.abs(np.fromfile(pcm_path, dtype=np.int16).astype(np.int32))
+            os.remove(pcm_path)
+            bucket = WAVEFORM_SAMPLE_RATE // WAVEFORM_PEAKS_PER_SECOND
+            usable = len(samples) - len(samples) % bucket
+            peaks = samples[:usable].reshape(-1, bucket).max(axis=1) if usable else np.zeros(0, dtype=np.int32)
+            (np.minimum(peaks * 255 // 32767, 255)).astype(np.uint8).tofile(os.path.join(timeline_dir, "waveform.bin"))
+            timeline["files"]["waveform"] = "waveform.bin"
+            timeline["peaks_per_second"] = WAVEFORM_PEAKS_PER_SECOND
+
+        with open(os.path.join(timeline_dir, "timeline.json"), "w") as f:
+            json.dump(timeline, f)
+
+    def replace_caption_track(self, input_path: str, srt_path: str, output_path: str):
+        """
+        Copies a clip's video and audio into output_path with srt_path as its mov_text
+        track (soft-caption mode, after a transcript edit). No re-encode.
+        """
+        try:
+            source = ffmpeg.input(input_path)
+            captions = ffmpeg.input(srt_path)
+            stream = ffmpeg.output(
+                source['v'], source['a?'], captions['s'], output_path,
+                vcodec='copy', acodec='copy', scodec='mov_text', movflags='+faststart',
+                **{'metadata:s:s:0': 'language=eng'}
+            )
+            self._run(stream)
         except ffmpeg.Error as e:
             error_msg = e.stderr.decode('utf8') if e.stderr else 'Unknown error'
             print(f"FFmpeg error: {error_msg}")
             raise Exception(f"FFmpeg failed: {error_msg}")
 
+    def _run(self, stream, should_cancel=None):
+        """
+        Runs an ffmpeg graph under the process supervisor (bounded stderr, limits,
+        process-group kill). Raises ffmpeg.Error on a non-zero exit, like ffmpeg.run,
+        and RenderCancelled if should_cancel() turned True.
+        """
+        try:
+            return ffmpeg_supervisor.run(ffmpeg.compile(stream, overwrite_output=True), should_cancel=should_cancel)
+        except FFmpegCancelled as e:
+            raise RenderCancelled(str(e))
+        except FFmpegFailed as e:
+            raise ffmpeg.Error('ffmpeg', None, e.stderr.encode('utf8'))
+
 ffmpeg_processor = FFmpegProcessor()
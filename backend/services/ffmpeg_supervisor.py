@@ -0,0 +1,264 @@
+import asyncio
+import collections
+import os
+import signal
+import threading
+import time
+from config import settings
+from services import tracing
+
+# Lines of ffmpeg stderr kept for error messages (the rest is discarded as it streams)
+STDERR_TAIL_LINES = 200
+# How often limits, cancellation and memory are checked while ffmpeg runs
+POLL_SECONDS = 0.5
+# SIGTERM lets ffmpeg finalize; after this grace period the group gets SIGKILL
+TERMINATE_GRACE_SECONDS = 3.0
+
+class FFmpegFailed(Exception):
+    """
+    ffmpeg exited non-zero. stderr holds the tail of its log.
+    """
+    def __init__(self, returncode: int, stderr: str):
+        super().__init__(f"ffmpeg exited with {returncode}")
+        self.returncode = returncode
+        self.stderr = stderr
+
+class FFmpegCancelled(Exception):
+    """
+    The encode was stopped because should_cancel() turned True.
+    """
+
+class FFmpegLimitExceeded(Exception):
+    """
+    The encode ran past its wall-clock or CPU-time limit and was killed.
+    """
+
+def _read_proc_status(pid, field: str) -> int:
+    """
+    Reads a kB field (e.g. VmRSS, VmHWM) from /proc/<pid>/status, in bytes. 0 if unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+def _cpu_seconds(pid: int) -> float:
+    """
+    User + system CPU time of a live process (all its threads), from /proc/<pid>/stat.
+    """
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # The command name may contain spaces; fields resume after its closing paren
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+def parse_cpu_list(value: str) -> set[int]:
+    """
+    Parses a CPU list like "0-3,6" into {0, 1, 2, 3, 6}.
+    """
+    cpus = set()
+    for part in filter(None, (p.strip() for p in value.split(","))):
+        if "-" in part:
+            low, high = part.split("-", 1)
+            cpus.update(range(int(low), int(high) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+class FFmpegResult:
+    def __init__(self, returncode: int, stderr_tail: str, progress: dict, wall_seconds: float, cpu_seconds: float, peak_rss: int):
+        self.returncode = returncode
+        self.stderr_tail = stderr_tail
+        self.progress = progress
+        self.wall_seconds = wall_seconds
+        self.cpu_seconds = cpu_seconds
+        self.peak_rss = peak_rss
+
+class FFmpegSupervisor:
+    """
+    Runs ffmpeg as an asyncio subprocess in its own process group:
+    - stdout carries `-progress` key=value blocks, parsed and handed to on_progress
+    - stderr is drained into a bounded ring buffer, so a chatty encode can't grow
+      worker memory; only the tail is kept for error messages
+    - wall-clock and CPU-time limits, and should_cancel(), kill the whole group
+    - niceness and CPU affinity are applied to the child, not the worker
+    Every live process group is tracked, so kill_all() can stop them when a task
+    is torn down (e.g. Celery's soft time limit) without leaking encoders.
+    """
+    def __init__(self, nice: int = 0, cpu_affinity: str = None, max_wall_seconds: float = None, max_cpu_seconds: float = None):
+        self.nice = nice
+        self.cpu_affinity = parse_cpu_list(cpu_affinity) if cpu_affinity else None
+        self.max_wall_seconds = max_wall_seconds
+        self.max_cpu_seconds = max_cpu_seconds
+        self._live = set()
+        self._lock = threading.Lock()
+
+    def _apply_scheduling(self, pid: int):
+        # Set right after spawn, before ffmpeg starts its encoder threads (which inherit both)
+        try:
+            if self.nice:
+                os.setpriority(os.PRIO_PROCESS, pid, self.nice)
+            if self.cpu_affinity and hasattr(os, "sched_setaffinity"):
+                os.sched_setaffinity(pid, self.cpu_affinity)
+        except OSError as e:
+            print(f"Could not apply nice/affinity to ffmpeg {pid}: {e}")
+
+    def _signal_group(self, pid: int, sig: int):
+        try:
+            os.killpg(pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def kill_all(self) -> int:
+        """
+        SIGKILLs every ffmpeg process group started by this supervisor that is still running.
+        """
+        with self._lock:
+            live = list(self._live)
+        for pid in live:
+            self._signal_group(pid, signal.SIGKILL)
+        if live:
+            print(f"Killed {len(live)} running ffmpeg process group(s)")
+        return len(live)
+
+    async def _stop(self, process):
+        self._signal_group(process.pid, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), TERMINATE_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            self._signal_group(process.pid, signal.SIGKILL)
+            await process.wait()
+
+    async def run_async(self, args: list[str], should_cancel=None, on_progress=None, max_wall_seconds: float = None, max_cpu_seconds: float = None) -> FFmpegResult:
+        """
+        Runs an ffmpeg command line (args[0] is the binary). Raises FFmpegFailed,
+        FFmpegCancelled or FFmpegLimitExceeded; returns an FFmpegResult on success.
+        """
+        with tracing.span("ffmpeg", **{"ffmpeg.args": " ".join(args[1:])[:1000]}) as current:
+            result = await self._run_async(args, should_cancel, on_progress, max_wall_seconds, max_cpu_seconds)
+            current.set_attribute("ffmpeg.cpu_seconds", result.cpu_seconds)
+            current.set_attribute("ffmpeg.peak_rss_mb", result.peak_rss // (1024 * 1024))
+            current.set_attribute("ffmpeg.speed", result.progress.get("speed", ""))
+            return result
+
+    async def _run_async(self, args: list[str], should_cancel, on_progress, max_wall_seconds: float, max_cpu_seconds: float) -> FFmpegResult:
+        max_wall_seconds = max_wall_seconds or self.max_wall_seconds
+        max_cpu_seconds = max_cpu_seconds or self.max_cpu_seconds
+        command = [args[0], "-nostats", "-progress", "pipe:1", *args[1:]]
+
+        worker_rss_before = _read_proc_status("self", "VmRSS")
+        started = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True  # Own process group: killpg reaches every child
+        )
+        self._apply_scheduling(process.pid)
+        with self._lock:
+            self._live.add(process.pid)
+
+        stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        progress = {}
+
+        async def read_progress():
+            block = {}
+            async for raw in process.stdout:
+                key, _, value = raw.decode("utf-8", "replace").strip().partition("=")
+                if not key:
+                    continue
+                block[key] = value
+                if key == "progress":
+                    progress.update(block)
+                    block = {}
+                    if on_progress:
+                        try:
+                            on_progress(dict(progress))
+                        except Exception as e:
+                            print(f"ffmpeg progress callback failed: {e}")
+
+        async def read_stderr():
+            async for raw in process.stderr:
+                stderr_tail.append(raw.decode("utf-8", "replace").rstrip())
+
+        readers = asyncio.gather(read_progress(), read_stderr())
+        peak_rss = 0
+        cpu_seconds = 0.0
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(asyncio.shield(process.wait()), POLL_SECONDS)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                # VmHWM is the child's own high-water mark, so sampling can't miss a spike
+                peak_rss = max(peak_rss, _read_proc_status(process.pid, "VmHWM"))
+                cpu_seconds = _cpu_seconds(process.pid) or cpu_seconds
+                if should_cancel and should_cancel():
+                    await self._stop(process)
+                    raise FFmpegCancelled("Render superseded by a newer request")
+                elapsed = time.monotonic() - started
+                if max_wall_seconds and elapsed > max_wall_seconds:
+                    await self._stop(process)
+                    raise FFmpegLimitExceeded(f"ffmpeg exceeded its {max_wall_seconds:.0f}s wall-clock limit")
+                if max_cpu_seconds and cpu_seconds > max_cpu_seconds:
+                    await self._stop(process)
+                    raise FFmpegLimitExceeded(f"ffmpeg exceeded its {max_cpu_seconds:.0f}s CPU-time limit")
+            await readers
+        except BaseException:
+            # Cancellation of this coroutine (or any error above) must not leave the encoder running
+            if process.returncode is None:
+                self._signal_group(process.pid, signal.SIGKILL)
+                await process.wait()
+            readers.cancel()
+            raise
+        finally:
+            with self._lock:
+                self._live.discard(process.pid)
+
+        wall_seconds = time.monotonic() - started
+        print(
+            f"ffmpeg finished in {wall_seconds:.1f}s ({cpu_seconds:.1f}s CPU, speed {progress.get('speed', '?')}), "
+            f"ffmpeg peak RSS {peak_rss // (1024 * 1024)}MB, worker RSS {worker_rss_before // (1024 * 1024)}MB -> "
+            f"{_read_proc_status('self', 'VmRSS') // (1024 * 1024)}MB"
+        )
+        if process.returncode != 0:
+            raise FFmpegFailed(process.returncode, "\n".join(stderr_tail))
+        return FFmpegResult(process.returncode, "\n".join(stderr_tail), progress, wall_seconds, cpu_seconds, peak_rss)
+
+    def run(self, args: list[str], **kwargs) -> FFmpegResult:
+        """
+        Blocking wrapper for sync callers (executor threads, Celery tasks). Runs on a
+        private event loop, in a helper thread if this thread already has a running one.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_async(args, **kwargs))
+
+        outcome = {}
+        def target():
+            try:
+                outcome["result"] = asyncio.run(self.run_async(args, **kwargs))
+            except BaseException as e:
+                outcome["error"] = e
+        thread = threading.Thread(target=tracing.bind(target), daemon=True)
+        thread.start()
+        thread.join()
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+ffmpeg_supervisor = FFmpegSupervisor(
+    nice=settings.FFMPEG_NICE,
+    cpu_affinity=settings.FFMPEG_CPU_AFFINITY,
+    max_wall_seconds=settings.FFMPEG_MAX_WALL_SECONDS,
+    max_cpu_seconds=settings.FFMPEG_MAX_CPU_SECONDS
+)
@@ -1,11 +1,31 @@
-import google.generativeai as genai
 from config import settings
+import asyncio
 import json
+import threading
+import time
 import typing_extensions
+from datetime import datetime, timedelta, timezone
+from services.gemini_quota import gemini_quota, estimate_tokens
+from services import tracing
+from services.timecode import format_mmss
 
-# Configure Gemini
-if settings.GOOGLE_API_KEY:
-    genai.configure(api_key=settings.GOOGLE_API_KEY)
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """
+    Imports and configures the Gemini SDK on first use. The import alone pulls in
+    grpc/protobuf, so processes that never call Gemini should not pay for it.
+    """
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                if settings.GOOGLE_API_KEY:
+                    genai.configure(api_key=settings.GOOGLE_API_KEY)
+                _genai = genai
+    return _genai
 
 class ViralSegment(typing_extensions.TypedDict):
     start_time: str
@@ -13,23 +33,84 @@ class ViralSegment(typing_extensions.TypedDict):
     virality_score: int
     explanation: str
     suggested_caption: str
+    srt_content: str
+
+class SegmentStreamParser:
+    """
+    Incremental parser for a streamed top-level JSON array of objects.
+    feed() returns every object that was completed by the new text, so callers
+    can act on a segment as soon as its closing brace arrives.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.object_start = None
+
+    def feed(self, text: str) -> list[dict]:
+        self.buffer += text
+        completed = []
+        while self.position < len(self.buffer):
+            char = self.buffer[self.position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "[{":
+                self.depth += 1
+                if char == "{" and self.depth == 2:
+                    self.object_start = self.position
+            elif char in "]}":
+                self.depth -= 1
+                if char == "}" and self.depth == 1 and self.object_start is not None:
+                    raw = self.buffer[self.object_start:self.position + 1]
+                    self.object_start = None
+                    try:
+                        completed.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        print(f"Skipping malformed segment in Gemini stream: {raw[:80]}...")
+            self.position += 1
+
+        # Drop consumed text that is not part of an open object
+        keep_from = self.object_start if self.object_start is not None else self.position
+        self.buffer = self.buffer[keep_from:]
+        self.position -= keep_from
+        if self.object_start is not None:
+            self.object_start = 0
+        return completed
 
 class GeminiService:
+    # Use gemini-2.5-flash (confirmed available in API key)
+    MODEL_NAME = 'gemini-2.5-flash'
+
     def __init__(self):
-        # Use gemini-2.5-flash (confirmed available in API key)
-        self.model = genai.GenerativeModel('gemini-2.5-flash')
+        self._model = None
 
-    async def analyze_video(self, video_path: str, duration_preference: str = "auto") -> list[ViralSegment]:
-        """
-        Analyzes a video file and returns a list of viral segments.
-        """
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = get_genai().GenerativeModel(self.MODEL_NAME)
+        return self._model
+
+    def _with_quota(self, fn, kind: str, lane: str, tokens: int = 0, deadline: float = None):
+        if not settings.ENABLE_GEMINI_QUOTA:
+            return fn()
+        return gemini_quota.call(fn, kind, lane, tokens, deadline)
+
+    def _upload(self, video_path: str, lane: str = "default", deadline: float = None):
         print(f"Uploading video to Gemini: {video_path}")
         # Upload the video file
-        video_file = genai.upload_file(path=video_path)
+        genai = get_genai()
+        video_file = self._with_quota(lambda: genai.upload_file(path=video_path), "upload", lane, deadline=deadline)
         
         # Wait for processing
-        # Wait for processing
-        import time
         max_retries = 30 # 60 seconds total
         retries = 0
         
@@ -44,44 +125,188 @@ class GeminiService:
         if video_file.state.name == "FAILED":
             raise ValueError(f"Gemini video processing failed: {video_file.state.name}")
 
-        print(f"Video processing complete. Generating content...")
+        print("Video processing complete. Generating content...")
+        return video_file
+
+    def _live(self, expires_at: str) -> bool:
+        # Reuse a handle only if it outlives an analysis by a comfortable margin
+        if not expires_at:
+            return False
+        expires = datetime.fromisoformat(expires_at)
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        remaining = expires - datetime.now(timezone.utc)
+        return remaining > timedelta(seconds=settings.GEMINI_HANDLE_MIN_TTL_SECONDS)
+
+    def prepare_source(self, video_path: str, handle: dict = None, lane: str = "default", estimated_tokens: int = 0, deadline: float = None) -> tuple:
+        """
+        Returns (model, media parts, handle) for analyzing a source. A still-live file
+        (and context cache) from an earlier analysis is reused, skipping the upload and
+        processing wait; handle is the updated record to persist for the next one.
+        """
+        genai = get_genai()
+        handle = dict(handle or {})
+
+        video_file = None
+        if settings.GEMINI_REUSE_FILES and self._live(handle.get("file_expires_at")):
+            try:
+                video_file = genai.get_file(handle["file_name"])
+                if video_file.state.name != "ACTIVE":
+                    video_file = None
+                else:
+                    print(f"Reusing Gemini file {video_file.name}")
+            except Exception as e:
+                print(f"Stored Gemini file {handle.get('file_name')} unavailable, uploading again: {e}")
+                video_file = None
+        if video_file is None:
+            video_file = self._upload(video_path, lane, deadline)
+            expires = getattr(video_file, "expiration_time", None) or datetime.now(timezone.utc) + timedelta(hours=47)
+            # A new upload invalidates any cache built on the old one
+            handle = {"file_name": video_file.name, "file_uri": video_file.uri, "file_expires_at": expires.isoformat()}
+
+        if not settings.ENABLE_GEMINI_CONTEXT_CACHE:
+            return self.model, [video_file], handle
 
+        caching = genai.caching
+        if self._live(handle.get("cache_expires_at")):
+            try:
+                cache = caching.CachedContent.get(handle["cache_name"])
+                print(f"Reusing Gemini context cache {cache.name}")
+                return genai.GenerativeModel.from_cached_content(cached_content=cache), [], handle
+            except Exception as e:
+                print(f"Stored Gemini context cache {handle.get('cache_name')} unavailable: {e}")
+        try:
+            # Charged once here; later analyses of the source pay only for the prompt
+            cache = self._with_quota(lambda: caching.CachedContent.create(
+                model=f"models/{self.MODEL_NAME}",
+                contents=[video_file],
+                ttl=timedelta(seconds=settings.GEMINI_CACHE_TTL_SECONDS)
+            ), "generate", lane, estimated_tokens, deadline)
+            handle["cache_name"] = cache.name
+            handle["cache_expires_at"] = cache.expire_time.isoformat()
+            return genai.GenerativeModel.from_cached_content(cached_content=cache), [], handle
+        except Exception as e:
+            # Too short to cache, or caching unavailable for the model: send the file inline
+            print(f"Gemini context cache not created, using the file directly: {e}")
+            return self.model, [video_file], handle
+
+    def _prompt(self, duration_preference: str, candidates: list = None, exclude: list = None) -> str:
         duration_prompt = ""
         if duration_preference == "30s":
             duration_prompt = "Identify segments strictly between 15-30 seconds."
         elif duration_preference == "60s":
             duration_prompt = "Identify segments strictly between 45-60 seconds."
 
-        prompt = f"""
+        candidate_prompt = ""
+        if candidates:
+            # Pre-computed from scene cuts and pauses, so Gemini ranks windows instead of searching
+            windows = ", ".join(f"{format_mmss(start)}-{format_mmss(end)}" for start, end in candidates)
+            candidate_prompt = f"Candidate windows that start and end on natural cuts: {windows}. Prefer choosing from these."
+
+        exclude_prompt = ""
+        if exclude:
+            # Re-analysis ("find more clips"): the project already has clips for these windows
+            windows = ", ".join(f"{format_mmss(start)}-{format_mmss(end)}" for start, end in exclude)
+            exclude_prompt = f"These windows already have clips: {windows}. Choose different moments that do not overlap them."
+
+        return f"""
         You are a viral content strategist. Analyze this video. 
         Identify 3 distinct segments that act as standalone viral shorts.
         {duration_prompt}
+        {candidate_prompt}
+        {exclude_prompt}
         
         Trend Match: Extract keywords (e.g., 'Crypto', 'AI') and check if they match high-volume trends.
         
-        Output strictly in JSON format with this schema:
-        [
-            {{
-                "start_time": "MM:SS",
-                "end_time": "MM:SS",
-                "virality_score": 85,
-                "explanation": "Why this is viral...",
-                "suggested_caption": " engaging caption...",
-                "srt_content": "1\\n00:00:00,000 --> 00:00:02,000\\nHello world... (Full SRT content for this segment)"
-            }}
-        ]
+        Output a JSON array of segments, in the order they appear in the video.
+        Times are "MM:SS". srt_content is the full SRT for the segment, timed relative to its start,
+        e.g. "1\\n00:00:00,000 --> 00:00:02,000\\nHello world..."
         """
 
-        response = self.model.generate_content(
-            [video_file, prompt],
-            generation_config={"response_mime_type": "application/json"}
-        )
-        
-        try:
-            segments = json.loads(response.text)
-            return segments
-        except json.JSONDecodeError:
-            print("Failed to decode JSON from Gemini response")
-            return []
+    async def analyze_video_stream(
+        self, video_path: str, duration_preference: str = "auto", candidates: list = None,
+        lane: str = "default", duration: float = None,
+        file_handle: dict = None, on_handle=None, exclude: list = None, deadline: float = None
+    ):
+        """
+        Analyzes a video and yields viral segments one at a time, as soon as each
+        segment's JSON object has been streamed back. The response is schema-constrained,
+        and a broken tail only loses the segments that had not completed yet.
+        Calls wait for the cluster-wide quota in `lane` (GeminiQuotaDeferred if it stays exhausted).
+        file_handle is a stored prepare_source() handle to reuse; on_handle receives a new one.
+        Quota waits end by `deadline` (time.monotonic()), so a task can requeue before its time limit.
+        """
+        loop = asyncio.get_running_loop()
+        estimated_tokens = estimate_tokens(duration)
+        with tracing.span("gemini prepare source", **{"gemini.reused": bool(file_handle)}):
+            model, media, handle = await loop.run_in_executor(
+                None, tracing.bind(self.prepare_source), video_path, file_handle, lane, estimated_tokens, deadline
+            )
+        if on_handle and handle != file_handle:
+            on_handle(handle)
+        prompt = self._prompt(duration_preference, candidates, exclude)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        # Not made current: the caller renders clips while this stream is still open
+        generate_span = tracing.start_span("gemini generate", **{
+            "gemini.model": self.MODEL_NAME, "gemini.lane": lane, "gemini.estimated_tokens": estimated_tokens
+        })
+
+        def produce():
+            # The SDK stream is blocking; read it on a thread and hand chunks to the loop
+            try:
+                # The stream opens (and a 429 surfaces) inside generate_content
+                response = self._with_quota(lambda: model.generate_content(
+                    [*media, prompt],
+                    generation_config=get_genai().GenerationConfig(
+                        response_mime_type="application/json",
+                        response_schema=list[ViralSegment]
+                    ),
+                    stream=True
+                ), "generate", lane, estimated_tokens, deadline)
+                usage = None
+                for chunk in response:
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunks without text parts (e.g. the final finish_reason chunk)
+                        continue
+                    loop.call_soon_threadsafe(queue.put_nowait, text)
+                if usage:
+                    generate_span.set_attribute("gemini.total_tokens", getattr(usage, "total_token_count", 0))
+                if usage and settings.ENABLE_GEMINI_QUOTA:
+                    gemini_quota.reconcile(estimated_tokens, getattr(usage, "total_token_count", 0))
+            except Exception as e:
+                generate_span.record_exception(e)
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                generate_span.end()
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        threading.Thread(target=tracing.bind(produce, generate_span), daemon=True).start()
+
+        parser = SegmentStreamParser()
+        yielded = 0
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                if not yielded:
+                    raise item
+                print(f"Gemini stream failed after {yielded} segments, keeping them: {item}")
+                continue
+            for segment in parser.feed(item):
+                yielded += 1
+                yield segment
+
+    async def analyze_video(self, video_path: str, duration_preference: str = "auto", candidates: list = None, lane: str = "default", duration: float = None) -> list[ViralSegment]:
+        """
+        Analyzes a video file and returns a list of viral segments.
+        """
+        return [segment async for segment in self.analyze_video_stream(video_path, duration_preference, candidates, lane, duration)]
 
 gemini_service = GeminiService()
@@ -0,0 +1,231 @@
+import random
+import time
+import uuid
+from config import settings
+from services import tracing
+from services.rate_limit import TokenBucket
+from services.redis_client import get_redis
+
+# Cluster-wide Gemini budget shared by every worker process:
+# - one request bucket and one token bucket per call kind ("generate", "upload"),
+#   both Redis token buckets in the TokenBucket layout, taken together atomically
+# - callers wait in a Redis priority queue; only the head may take budget, so
+#   lanes are strictly ordered (interactive before default before batch) and FIFO
+#   within a lane, and a big request is never starved by a stream of small ones
+# - a 429 still slips through when other clients share the key: the caller backs
+#   off with full jitter and sets a cluster-wide cooldown so nobody else piles on
+LANES = {"interactive": 0, "default": 1, "batch": 2}
+WAITERS_KEY = "gemini:waiters:{kind}"
+HEARTBEATS_KEY = "gemini:heartbeats"
+COOLDOWN_KEY = "gemini:cooldown"
+# A waiter that has not polled for this long is presumed dead and dropped from the queue
+WAITER_STALE_SECONDS = 30
+MAX_POLL_SECONDS = 1.0
+
+# KEYS: waiters zset, heartbeats hash, request bucket, token bucket, cooldown
+# ARGV: ticket, request capacity, request rate, token capacity, token rate, tokens, stale seconds, score
+# Every poll (re-)enqueues the ticket with its original score and refreshes its heartbeat.
+# Returns {status, seconds}: 1 = granted, 0 = wait `seconds`
+GEMINI_ACQUIRE_LUA = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('HSET', KEYS[2], ARGV[1], tostring(now))
+redis.call('ZADD', KEYS[1], 'NX', ARGV[8], ARGV[1])
+
+local head = redis.call('ZRANGE', KEYS[1], 0, 9)
+for _, ticket in ipairs(head) do
+    local seen = tonumber(redis.call('HGET', KEYS[2], ticket) or '0')
+    if seen < now - tonumber(ARGV[7]) then
+        redis.call('ZREM', KEYS[1], ticket)
+        redis.call('HDEL', KEYS[2], ticket)
+    end
+end
+
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+if not rank then
+    -- Purged as stale above (its last poll was long ago); the next poll re-enqueues it
+    return {0, '0'}
+end
+if rank > 0 then
+    return {0, '0.2'}
+end
+local cooldown = redis.call('PTTL', KEYS[5])
+if cooldown > 0 then
+    return {0, tostring(cooldown / 1000)}
+end
+
+local function refill(key, capacity, rate)
+    local state = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    return math.min(capacity, tokens + math.max(0, now - ts) * rate)
+end
+local request_capacity, request_rate = tonumber(ARGV[2]), tonumber(ARGV[3])
+local token_capacity, token_rate = tonumber(ARGV[4]), tonumber(ARGV[5])
+-- A request larger than the bucket waits for a full bucket; reconcile charges the rest
+local cost = math.min(tonumber(ARGV[6]), token_capacity)
+local requests = refill(KEYS[3], request_capacity, request_rate)
+local tokens = refill(KEYS[4], token_capacity, token_rate)
+
+local granted = requests >= 1 and tokens >= cost
+if granted then
+    requests = requests - 1
+    tokens = tokens - cost
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+end
+redis.call('HSET', KEYS[3], 'tokens', tostring(requests), 'ts', tostring(now))
+redis.call('HSET', KEYS[4], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[3], math.ceil(request_capacity / request_rate) + 60)
+redis.call('EXPIRE', KEYS[4], math.ceil(token_capacity / token_rate) + 60)
+if granted then
+    return {1, '0'}
+end
+local wait = math.max((1 - requests) / request_rate, (cost - tokens) / token_rate)
+return {0, tostring(wait)}
+"""
+
+# Charges tokens unconditionally (may go negative): actual usage above the estimate
+GEMINI_CHARGE_LUA = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate) - tonumber(ARGV[3])
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+return tostring(tokens)
+"""
+
+class GeminiQuotaDeferred(Exception):
+    """
+    Raised when a Gemini call could not get budget within its maximum wait.
+    The caller should requeue its work rather than fail it.
+    """
+
+def is_rate_limited(error: Exception) -> bool:
+    """
+    True for Gemini's 429 / RESOURCE_EXHAUSTED errors (checked by name, so the
+    SDK's exception classes don't have to be imported here).
+    """
+    name = type(error).__name__
+    return name in ("ResourceExhausted", "TooManyRequests") or "429" in str(error)
+
+class GeminiQuota:
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, uploads_per_minute: float, burst_fraction: float):
+        # Buckets hold burst_fraction of a minute's budget and refill at the per-minute rate
+        self.buckets = {
+            "generate": (
+                TokenBucket("gemini-requests", max(1.0, requests_per_minute * burst_fraction), requests_per_minute / 60.0),
+                TokenBucket("gemini-tokens", max(1.0, tokens_per_minute * burst_fraction), tokens_per_minute / 60.0),
+            ),
+            "upload": (
+                TokenBucket("gemini-uploads", max(1.0, uploads_per_minute * burst_fraction), uploads_per_minute / 60.0),
+                # Uploads cost no generation tokens; the bucket only satisfies the script's shape
+                TokenBucket("gemini-tokens", max(1.0, tokens_per_minute * burst_fraction), tokens_per_minute / 60.0),
+            ),
+        }
+
+    def acquire(self, kind: str, lane: str = "default", tokens: int = 0, max_wait: float = None, deadline: float = None):
+        """
+        Blocks until the cluster-wide budget allows one `kind` call costing `tokens`.
+        Raises GeminiQuotaDeferred after max_wait seconds, or sooner if the wait would
+        run past `deadline` (a time.monotonic() value). Fails open if Redis is down.
+        """
+        with tracing.span("gemini quota wait", **{"gemini.kind": kind, "gemini.lane": lane, "gemini.tokens": tokens}):
+            self._acquire(kind, lane, tokens, max_wait, deadline)
+
+    def _acquire(self, kind: str, lane: str, tokens: int, max_wait: float, deadline: float = None):
+        max_wait = settings.GEMINI_MAX_QUEUE_SECONDS if max_wait is None else max_wait
+        if deadline is not None:
+            max_wait = min(max_wait, deadline - time.monotonic())
+        requests, token_bucket = self.buckets[kind]
+        waiters = WAITERS_KEY.format(kind=kind)
+        ticket = uuid.uuid4().hex
+        score = LANES.get(lane, LANES["default"]) * 1e13 + time.time() * 1000
+        started = time.monotonic()
+        try:
+            client = get_redis()
+            while True:
+                status, wait = client.eval(
+                    GEMINI_ACQUIRE_LUA, 5,
+                    waiters, HEARTBEATS_KEY, requests.key("global"), token_bucket.key("global"), COOLDOWN_KEY,
+                    ticket, requests.capacity, requests.refill_per_second,
+                    token_bucket.capacity, token_bucket.refill_per_second, tokens, WAITER_STALE_SECONDS, score
+                )
+                status = int(status)
+                if status == 1:
+                    waited = time.monotonic() - started
+                    if waited > 1:
+                        print(f"Gemini {kind} ({lane}) waited {waited:.1f}s for quota")
+                    return
+                if time.monotonic() - started + float(wait) > max_wait:
+                    client.zrem(waiters, ticket)
+                    client.hdel(HEARTBEATS_KEY, ticket)
+                    raise GeminiQuotaDeferred(f"Gemini {kind} quota unavailable for {max_wait:.0f}s ({lane} lane)")
+                time.sleep(min(float(wait), MAX_POLL_SECONDS) + random.uniform(0, 0.05))
+        except GeminiQuotaDeferred:
+            raise
+        except Exception as e:
+            print(f"Gemini quota scheduler unavailable, calling directly: {e}")
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: int):
+        """
+        Charges tokens actually used beyond the estimate taken at acquire time.
+        """
+        extra = (actual_tokens or 0) - estimated_tokens
+        if extra <= 0:
+            return
+        _, token_bucket = self.buckets["generate"]
+        try:
+            get_redis().eval(GEMINI_CHARGE_LUA, 1, token_bucket.key("global"), token_bucket.capacity, token_bucket.refill_per_second, extra)
+        except Exception as e:
+            print(f"Could not reconcile Gemini token usage: {e}")
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full-jitter exponential backoff after a 429; also pauses the whole cluster
+        for the same time so other workers don't keep hitting the limit.
+        """
+        delay = random.uniform(0, min(settings.GEMINI_BACKOFF_MAX_SECONDS, settings.GEMINI_BACKOFF_BASE_SECONDS * 2 ** attempt))
+        try:
+            # Only extend an existing cooldown, never shorten it
+            client = get_redis()
+            if client.pttl(COOLDOWN_KEY) < delay * 1000:
+                client.set(COOLDOWN_KEY, "1", px=max(1, int(delay * 1000)))
+        except Exception:
+            pass
+        return delay
+
+    def call(self, fn, kind: str, lane: str = "default", tokens: int = 0, deadline: float = None):
+        """
+        Runs fn() under the quota, retrying 429s with backoff up to GEMINI_MAX_RETRIES.
+        Quota waits and backoffs together stay within `deadline`: past it the call is
+        deferred (GeminiQuotaDeferred) so the caller can requeue before its time limit.
+        """
+        for attempt in range(settings.GEMINI_MAX_RETRIES + 1):
+            self.acquire(kind, lane, tokens, deadline=deadline)
+            try:
+                return fn()
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == settings.GEMINI_MAX_RETRIES:
+                    raise
+                delay = self.backoff(attempt)
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise GeminiQuotaDeferred(f"Gemini {kind} still rate limited, no time left to back off ({lane} lane)") from e
+                print(f"Gemini {kind} rate limited (attempt {attempt + 1}), backing off {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+def estimate_tokens(duration: float) -> int:
+    """
+    Expected input + output tokens for analyzing a video of `duration` seconds.
+    """
+    return int((duration or 60.0) * settings.GEMINI_TOKENS_PER_VIDEO_SECOND) + settings.GEMINI_PROMPT_TOKENS
+
+gemini_quota = GeminiQuota(
+    requests_per_minute=settings.GEMINI_REQUESTS_PER_MINUTE,
+    tokens_per_minute=settings.GEMINI_TOKENS_PER_MINUTE,
+    uploads_per_minute=settings.GEMINI_UPLOADS_PER_MINUTE,
+    burst_fraction=settings.GEMINI_BURST_FRACTION
+)
@@ -0,0 +1,62 @@
+import ffmpeg
+
+class MediaProbeError(Exception):
+    """
+    Raised when a source file cannot be probed or has no usable video stream.
+    """
+
+def _parse_rate(rate: str) -> float:
+    try:
+        num, _, den = rate.partition('/')
+        return round(float(num) / float(den or 1), 3)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def probe_media(path: str) -> dict:
+    """
+    Probes a media file once and returns the metadata persisted on Project:
+    duration, resolution and fps, codecs.
+    """
+    try:
+        probe = ffmpeg.probe(path)
+    except ffmpeg.Error as e:
+        raise MediaProbeError(f"Could not read media metadata: {e.stderr.decode('utf8') if e.stderr else str(e)}")
+
+    video = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in probe.get('streams', []) if s.get('codec_type') == 'audio'), None)
+    if not video:
+        raise MediaProbeError("Source has no video stream")
+
+    duration = probe.get('format', {}).get('duration') or video.get('duration')
+    if not duration:
+        raise MediaProbeError("Could not determine source duration")
+
+    info = {
+        "duration": float(duration),
+        "width": int(video.get('width') or 0) or None,
+        "height": int(video.get('height') or 0) or None,
+        "fps": _parse_rate(video.get('avg_frame_rate') or video.get('r_frame_rate') or ''),
+        "video_codec": video.get('codec_name'),
+        "audio_codec": audio.get('codec_name') if audio else None,
+    }
+    return info
+
+def apply_media_info(project, info: dict):
+    """
+    Copies probe results onto a Project row.
+    """
+    for field, value in info.items():
+        setattr(project, field, value)
+
+def validate_trim(start: float, end: float, duration: float = None, tolerance: float = 0.05):
+    """
+    Raises ValueError if a trim range is impossible for a source of the given duration.
+    """
+    if start is None or end is None:
+        raise ValueError("Start and end time are required")
+    if start < 0:
+        raise ValueError("Start time cannot be negative")
+    if end <= start:
+        raise ValueError("End time must be after start time")
+    if duration is not None and end > duration + tolerance:
+        raise ValueError(f"End time {end:.2f}s is past the end of the source ({duration:.2f}s)")
@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from config import settings
+from services.r2 import r2_service
+from services.redis_client import get_redis
+from services.workspace import workspace_manager, InsufficientDisk
+
+PREFETCH_CLAIM_PREFIX = "prefetch:"
+PART_SUFFIX = ".part"
+
+class SourcePrefetcher:
+    """
+    Downloads the sources of upcoming batch projects while the current one renders,
+    so the next job on this host starts without waiting on R2. Files are spooled
+    on the scratch volume; a job picks its source up with take(), or downloads it
+    itself if the prefetch has not finished (or ran on another host).
+    """
+    def __init__(self, directory: str, max_age_seconds: float):
+        self.directory = directory
+        self.max_age_seconds = max_age_seconds
+
+    def _path(self, project_id: str) -> str:
+        return os.path.join(self.directory, f"{project_id}.src")
+
+    def take(self, project_id: str, destination: str) -> bool:
+        """
+        Moves a finished prefetch of the project's source to destination.
+        Returns False if there is none.
+        """
+        try:
+            os.replace(self._path(project_id), destination)
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            print(f"Could not use prefetched source for project {project_id}: {e}")
+            return False
+        print(f"Using prefetched source for project {project_id}")
+        return True
+
+    def prefetch(self, project_id: str, s3_key: str) -> bool:
+        """
+        Starts a background download unless another worker already claimed this
+        project. Returns whether a download was started.
+        """
+        try:
+            claimed = get_redis().set(f"{PREFETCH_CLAIM_PREFIX}{project_id}", "1", nx=True, ex=int(self.max_age_seconds))
+        except Exception as e:
+            print(f"Prefetch claim failed for project {project_id}: {e}")
+            return False
+        if not claimed:
+            return False
+        threading.Thread(target=self._download, args=(project_id, s3_key), daemon=True).start()
+        return True
+
+    def _download(self, project_id: str, s3_key: str):
+        path = self._path(project_id)
+        partial = path + PART_SUFFIX
+        try:
+            # Never let a speculative download eat the space a running job needs
+            size = r2_service.get_object_size(s3_key) or 0
+            workspace_manager.admit(int(size * settings.SCRATCH_SIZE_FACTOR))
+            os.makedirs(self.directory, exist_ok=True)
+            started = time.monotonic()
+            r2_service.s3_client.download_file(r2_service.bucket_name, s3_key, partial)
+            os.replace(partial, path)
+            print(f"Prefetched source for project {project_id} ({size // (1024 * 1024)}MB in {time.monotonic() - started:.1f}s)")
+        except InsufficientDisk as e:
+            print(f"Skipping prefetch for project {project_id}: {e}")
+        except Exception as e:
+            print(f"Prefetch failed for project {project_id}: {e}")
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    def reap(self) -> int:
+        """
+        Removes spooled sources nobody picked up (project failed, deleted, or ran
+        on another host). Returns the count removed.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+        reaped = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                    os.remove(path)
+                    reaped += 1
+            except OSError:
+                pass
+        return reaped
+
+source_prefetcher = SourcePrefetcher(
+    directory=workspace_manager.spool_dir("sources"),
+    max_age_seconds=settings.SCRATCH_ORPHAN_MAX_AGE
+)
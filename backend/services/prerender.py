@@ -0,0 +1,183 @@
+import json
+import time
+from datetime import datetime, timezone
+from config import settings
+from services.redis_client import get_async_redis, get_redis
+from services.scheduling import FAIR_QUEUE_KEY, FAIR_IN_FLIGHT_KEY
+from services.subtitles import DEFAULT_CAPTION_STYLE
+
+# Speculative style renders for burned-caption clips:
+# - every burn request counts a switch from the clip's current style to the requested one
+# - while the render queues are empty, a beat task renders the styles most often switched
+#   to from each recent clip's current style, under a key derived from caption_signature
+# - a burn request whose signature has a finished render adopts it instead of encoding
+# A render set is complete once its manifest exists (uploaded last). Eviction removes the
+# manifest first and the files one run later, so a set adopted in between is kept.
+PRERENDER_PREFIX = "clips/prerenders/"
+MANIFEST_NAME = "manifest.json"
+STYLE_SWITCHES_KEY = "prerender:switches"
+CLIP_STYLE_KEY = "prerender:style:{clip_id}"
+PRERENDER_LOCK_KEY = "prerender:running"
+CLIP_STYLE_TTL = 7 * 24 * 3600
+
+def prerender_prefix(project_id, clip_id, signature: str) -> str:
+    return f"{PRERENDER_PREFIX}{project_id}/{clip_id}/{signature}/"
+
+def _initial_style(clip) -> dict:
+    # A clip never re-burned still has the style process_video rendered it with
+    return {"style_name": DEFAULT_CAPTION_STYLE, "karaoke": False} if not clip.render_generation else None
+
+async def record_style_request(clip, style_name: str, karaoke: bool):
+    """
+    Remembers the style requested for a burned clip and counts the switch from its
+    previous style. Statistics are best effort: failures are only logged.
+    """
+    try:
+        client = get_async_redis()
+        key = CLIP_STYLE_KEY.format(clip_id=clip.id)
+        raw = await client.get(key)
+        previous = json.loads(raw) if raw else _initial_style(clip)
+        async with client.pipeline(transaction=False) as pipe:
+            if previous and previous["style_name"] != style_name:
+                pipe.hincrby(STYLE_SWITCHES_KEY, f"{previous['style_name']}>{style_name}", 1)
+            pipe.set(key, json.dumps({"style_name": style_name, "karaoke": karaoke}), ex=CLIP_STYLE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Could not record style request for clip {clip.id}: {e}")
+
+async def remember_styles(clip_ids: list, style_name: str, karaoke: bool):
+    """
+    Sets the current style of several clips (project restyle) without counting
+    switches: one decision for the whole project is not a per-clip preference.
+    """
+    try:
+        async with get_async_redis().pipeline(transaction=False) as pipe:
+            for clip_id in clip_ids:
+                pipe.set(CLIP_STYLE_KEY.format(clip_id=clip_id), json.dumps({"style_name": style_name, "karaoke": karaoke}), ex=CLIP_STYLE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Could not remember restyled clip styles: {e}")
+
+def current_style(clip) -> dict:
+    """
+    The clip's style as {"style_name", "karaoke"}, or None if unknown.
+    """
+    try:
+        raw = get_redis().get(CLIP_STYLE_KEY.format(clip_id=clip.id))
+        return json.loads(raw) if raw else _initial_style(clip)
+    except Exception as e:
+        print(f"Could not read style of clip {clip.id}: {e}")
+        return None
+
+def popular_alternates(style_name: str, styles, count: int) -> list[str]:
+    """
+    The `count` styles users most often switch to from style_name, ties broken by
+    how often each style is switched to overall. Only observed switches count.
+    """
+    raw = get_redis().hgetall(STYLE_SWITCHES_KEY)
+    direct, overall = {}, {}
+    for field, value in raw.items():
+        source, _, target = field.decode().partition(">")
+        overall[target] = overall.get(target, 0) + int(value)
+        if source == style_name:
+            direct[target] = int(value)
+    ranked = sorted(
+        (target for target in overall if target != style_name and target in styles),
+        key=lambda target: (direct.get(target, 0), overall[target]), reverse=True
+    )
+    return ranked[:count]
+
+def queues_idle() -> bool:
+    """
+    True while nothing waits in the render queue or the fair scheduler and no
+    process-video job is in flight. Unknown (Redis down) counts as busy.
+    """
+    try:
+        with get_redis().pipeline(transaction=False) as pipe:
+            pipe.llen(settings.CELERY_QUEUE_NAME)
+            pipe.zcard(FAIR_QUEUE_KEY)
+            pipe.zcard(FAIR_IN_FLIGHT_KEY)
+            return not any(pipe.execute())
+    except Exception as e:
+        print(f"Could not read queue depth: {e}")
+        return False
+
+def acquire_run_lock() -> bool:
+    try:
+        return bool(get_redis().set(PRERENDER_LOCK_KEY, 1, nx=True, ex=settings.PRERENDER_LOCK_SECONDS))
+    except Exception as e:
+        print(f"Could not take prerender lock: {e}")
+        return False
+
+def release_run_lock():
+    try:
+        get_redis().delete(PRERENDER_LOCK_KEY)
+    except Exception as e:
+        print(f"Could not release prerender lock: {e}")
+
+def find_prerender(project_id, clip_id, signature: str) -> dict:
+    """
+    The manifest of a finished render set for this signature, or None.
+    """
+    from services.r2 import r2_service
+    key = prerender_prefix(project_id, clip_id, signature) + MANIFEST_NAME
+    try:
+        body = r2_service.s3_client.get_object(Bucket=r2_service.bucket_name, Key=key)["Body"].read()
+        return json.loads(body)
+    except r2_service.s3_client.exceptions.NoSuchKey:
+        return None
+    except Exception as e:
+        print(f"Could not read prerender manifest {key}: {e}")
+        return None
+
+def store_manifest(prefix: str, manifest: dict):
+    from services.r2 import r2_service
+    r2_service.s3_client.put_object(
+        Bucket=r2_service.bucket_name, Key=prefix + MANIFEST_NAME,
+        Body=json.dumps({**manifest, "created_at": time.time()}).encode("utf-8"), ContentType="application/json"
+    )
+
+def set_prefix_of(key: str) -> str:
+    """
+    The render set prefix of an object key under PRERENDER_PREFIX.
+    """
+    return "/".join(key.split("/")[:5]) + "/"
+
+def evict_prerenders(referenced: set) -> dict:
+    """
+    Enforces PRERENDER_MAX_AGE_HOURS and PRERENDER_MAX_BYTES on unadopted render sets
+    (referenced: prefixes clips currently play from, which are never touched).
+    Sets already without a manifest (evicted last run, or left incomplete by a
+    crashed run) are deleted; expired sets, then the oldest ones until the rest fit
+    the cap, lose their manifest so they can no longer be adopted.
+    """
+    from services.r2 import r2_service
+    sets = {}
+    paginator = r2_service.s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=r2_service.bucket_name, Prefix=PRERENDER_PREFIX):
+        for obj in page.get('Contents', []):
+            prefix = set_prefix_of(obj['Key'])
+            if prefix in referenced:
+                continue
+            entry = sets.setdefault(prefix, {"bytes": 0, "modified": obj['LastModified'], "manifest": False})
+            entry["bytes"] += obj['Size']
+            entry["modified"] = max(entry["modified"], obj['LastModified'])
+            entry["manifest"] = entry["manifest"] or obj['Key'].endswith("/" + MANIFEST_NAME)
+
+    deleted = retired = 0
+    for prefix, entry in list(sets.items()):
+        if not entry["manifest"]:
+            r2_service.delete_prefix(prefix)
+            deleted += 1
+            del sets[prefix]
+
+    now = datetime.now(timezone.utc)
+    total = sum(entry["bytes"] for entry in sets.values())
+    for prefix, entry in sorted(sets.items(), key=lambda item: item[1]["modified"]):
+        expired = (now - entry["modified"]).total_seconds() > settings.PRERENDER_MAX_AGE_HOURS * 3600
+        if not expired and total <= settings.PRERENDER_MAX_BYTES:
+            break
+        r2_service.delete_file(prefix + MANIFEST_NAME)
+        total -= entry["bytes"]
+        retired += 1
+    return {"deleted": deleted, "retired": retired, "bytes": total}
@@ -1,156 +1,548 @@
 from celery_app import celery_app
 from services.r2 import r2_service
 from services.gemini import gemini_service
-from services.ffmpeg_processor import ffmpeg_processor
+from services.gemini_quota import GeminiQuotaDeferred
+from services.ffmpeg_processor import ffmpeg_processor, RenderCancelled
+from services.subtitles import parse_srt, shift_srt, clip_transcript, build_ass, build_srt, build_vtt, caption_signature, SubtitleError, DEFAULT_CAPTION_STYLE
+from services.signals import analyze_signals, snap_boundary, candidate_windows
+from services.timecode import parse_time
+from services.media_probe import probe_media, apply_media_info, validate_trim, MediaProbeError
+from services.scheduling import fair_queue, dispatch_jobs, load_cost_model, record_job_timing
+from services.workspace import workspace_manager, InsufficientDisk
+from services.prefetch import source_prefetcher
+from services.read_model import invalidate_dashboard
+from services.credits import refund_credits
+from services.burn_jobs import take_burn_params, mark_burn_running, end_burn, is_superseded, record_burn_outcome, release_clip_export, BurnSuperseded
+from services.prerender import (
+    PRERENDER_PREFIX, prerender_prefix, set_prefix_of, current_style, popular_alternates, queues_idle,
+    find_prerender, store_manifest, evict_prerenders, acquire_run_lock, release_run_lock
+)
+from services import tracing
+from services.profiling import TaskProfile
+from config import settings
 from database import AsyncSessionLocal
 from models import Project, Clip, ProjectStatus
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, update
+from sqlalchemy.orm import selectinload, undefer
+from datetime import datetime, timedelta, timezone
 import asyncio
+import io
+import json
 import os
 import uuid
 import shutil
-import ffmpeg
+import time
 
-async def process_video_logic(project_id: str):
+# Sources shorter than this are rendered as a single clip without AI analysis
+SHORT_VIDEO_SECONDS = 30.0
+
+# process_video_task's soft time limit; Gemini quota waits are budgeted against it
+PROCESS_SOFT_TIME_LIMIT = 240
+
+RENDITION_CONTENT_TYPES = {
+    ".mp4": "video/mp4",
+    ".jpg": "image/jpeg",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".m4s": "video/iso.segment",
+    ".vtt": "text/vtt",
+    ".bin": "application/octet-stream",
+    ".srt": "application/x-subrip",
+    ".ass": "text/x-ssa",
+}
+
+def rendition_paths(base_path: str) -> dict:
+    """
+    Local output paths for a clip's rendition ladder, derived from the full-quality path.
+    """
+    root, _ = os.path.splitext(base_path)
+    return {
+        "output_path": base_path,
+        "preview_path": f"{root}_preview.mp4",
+        "poster_path": f"{root}_poster.jpg",
+        "hls_dir": f"{root}_hls" if settings.ENABLE_HLS_RENDITION else None,
+        "captions_dir": f"{root}_captions" if settings.CAPTION_MODE == "soft" else None,
+    }
+
+async def upload_renditions(renditions: dict, key_base: str) -> dict:
+    """
+    Uploads every rendition produced by process_segment and returns their public URLs,
+    keyed by the Clip column they belong to. The edit timeline is returned as its
+    layout with R2 keys (Clip.timeline), since the API presigns each file on request;
+    soft-caption sidecars likewise as {"mode": "soft", "keys": ...} (Clip.captions).
+    """
+    column_for = {"full": "s3_url", "preview": "preview_url", "poster": "poster_url", "hls": "hls_url"}
+    urls = {}
+    for name, local_path in renditions.items():
+        if name == "timeline":
+            with open(os.path.join(local_path, "timeline.json")) as f:
+                timeline = json.load(f)
+            keys = {}
+            for kind, filename in timeline.pop("files").items():
+                keys[kind] = f"{key_base}_timeline/{filename}"
+                with open(os.path.join(local_path, filename), "rb") as f:
+                    await r2_service.upload_file(f, keys[kind], RENDITION_CONTENT_TYPES[os.path.splitext(filename)[1]])
+            urls["timeline"] = {**timeline, "keys": keys}
+            continue
+        if name == "captions":
+            keys = {}
+            for filename in sorted(os.listdir(local_path)):
+                ext = os.path.splitext(filename)[1]
+                keys[ext[1:]] = f"{key_base}_captions/{filename}"
+                with open(os.path.join(local_path, filename), "rb") as f:
+                    await r2_service.upload_file(f, keys[ext[1:]], RENDITION_CONTENT_TYPES[ext])
+            urls["captions"] = {"mode": "soft", "keys": keys}
+            continue
+        if name == "hls":
+            # Upload the playlist with its init segment and media segments
+            hls_dir = os.path.dirname(local_path)
+            for filename in sorted(os.listdir(hls_dir)):
+                ext = os.path.splitext(filename)[1]
+                with open(os.path.join(hls_dir, filename), "rb") as f:
+                    await r2_service.upload_file(f, f"{key_base}_hls/{filename}", RENDITION_CONTENT_TYPES.get(ext, "application/octet-stream"))
+            s3_key = f"{key_base}_hls/{os.path.basename(local_path)}"
+        else:
+            suffix = "" if name == "full" else f"_{name}"
+            ext = os.path.splitext(local_path)[1]
+            s3_key = f"{key_base}{suffix}{ext}"
+            with open(local_path, "rb") as f:
+                await r2_service.upload_file(f, s3_key, RENDITION_CONTENT_TYPES[ext])
+        urls[column_for[name]] = r2_service.get_public_url(s3_key)
+    return urls
+
+def remove_renditions(paths: dict):
+    """
+    Deletes the local files of a rendition ladder. Accepts either the output of
+    process_segment or the kwargs built by rendition_paths.
+    """
+    for local_path in paths.values():
+        if not local_path:
+            continue
+        if local_path.endswith(".m3u8"):
+            local_path = os.path.dirname(local_path)
+        if os.path.isdir(local_path):
+            shutil.rmtree(local_path, ignore_errors=True)
+        elif os.path.exists(local_path):
+            os.remove(local_path)
+
+def stale_rendition_keys(rendition_urls: dict, key_base: str) -> list[str]:
+    """
+    R2 keys (and prefixes) of an uploaded rendition set that will not be committed.
+    """
+    keys = [
+        r2_service.get_key_from_url(rendition_urls[column])
+        for column in ("s3_url", "preview_url", "poster_url") if rendition_urls.get(column)
+    ]
+    if rendition_urls.get("hls_url"):
+        keys.append(r2_service.get_key_from_url(rendition_urls["hls_url"]).rsplit('/', 1)[0] + '/')
+    if rendition_urls.get("captions"):
+        keys.append(f"{key_base}_captions/")
+    return keys
+
+def plan_shared_decodes(clips: list) -> list[list]:
+    """
+    Groups clips (by start time) so that each group is rendered from one decode of
+    the span it covers: a clip joins the previous group if it starts at most
+    RESTYLE_MAX_GAP_SECONDS after that group's end, up to RESTYLE_MAX_CLIPS_PER_RUN
+    clips. Decoding a short gap is cheaper than a second seek-and-decode; decoding
+    a long one is not.
+    """
+    groups = []
+    group_end = None
+    for clip in sorted(clips, key=lambda clip: clip.start_time):
+        if (
+            groups and clip.start_time - group_end <= settings.RESTYLE_MAX_GAP_SECONDS
+            and len(groups[-1]) < settings.RESTYLE_MAX_CLIPS_PER_RUN
+        ):
+            groups[-1].append(clip)
+            group_end = max(group_end, clip.end_time)
+        else:
+            groups.append([clip])
+            group_end = clip.end_time
+    return groups
+
+async def rewrite_captions(clip: Clip, style_name: str, karaoke: bool):
+    """
+    Regenerates every sidecar of a soft-caption clip (SRT, WebVTT, styled ASS) in R2
+    from its current transcript and the given style, and returns the new
+    Clip.captions value. Nothing is re-encoded; the MP4's mov_text track is refreshed
+    separately (refresh_caption_track_task). Raises SubtitleError on a bad transcript.
+    """
+    transcript = clip_transcript(clip)
+    if transcript:
+        cues = parse_srt(transcript, duration=clip.end_time - clip.start_time)
+        documents = {
+            "srt": build_srt(cues),
+            "vtt": build_vtt(cues),
+            "ass": build_ass(cues, ffmpeg_processor.get_style_string(style_name), karaoke=karaoke),
+        }
+        for kind, key in clip.captions["keys"].items():
+            if kind in documents:
+                await r2_service.upload_file(io.BytesIO(documents[kind].encode("utf-8")), key, RENDITION_CONTENT_TYPES[f".{kind}"])
+    return {**clip.captions, "style_name": style_name, "karaoke": karaoke}
+
+async def iterate_segments(segments: list):
+    """
+    Adapts a ready-made segment list to the streamed segment interface.
+    """
+    for segment in segments:
+        yield segment
+
+def timeline_options(segment: dict, project: Project) -> dict:
+    """
+    process_segment kwargs for the edit timeline: the segment padded by
+    TIMELINE_PAD_SECONDS on each side, clamped to the source.
+    """
+    if not settings.ENABLE_TIMELINE_ASSETS:
+        return {}
+    return {
+        "timeline_window": (
+            max(0.0, parse_time(segment['start_time']) - settings.TIMELINE_PAD_SECONDS),
+            min(project.duration, parse_time(segment['end_time']) + settings.TIMELINE_PAD_SECONDS),
+        ),
+        "has_audio": bool(project.audio_codec),
+    }
+
+def prepare_segment(segment: dict, duration: float, signals: dict = None):
+    """
+    Validates a segment before rendering: a broken SRT from Gemini should not
+    surface as an ffmpeg failure, and end times past the source are clamped.
+    With signals, boundaries are snapped to the nearest scene cut or pause.
+    """
+    # Gemini sometimes returns an end time past the end of the source
+    if parse_time(segment['end_time']) > duration:
+        segment['end_time'] = str(duration)
+
+    start = parse_time(segment['start_time'])
+    if signals:
+        end = parse_time(segment['end_time'])
+        snapped_start = snap_boundary(start, signals, "start")
+        snapped_end = min(snap_boundary(end, signals, "end"), duration)
+        if snapped_end - snapped_start >= 1.0:
+            segment['start_time'] = str(round(snapped_start, 3))
+            segment['end_time'] = str(round(snapped_end, 3))
+
+    if not segment.get('srt_content'):
+        return
+    try:
+        # The SRT is relative to the segment start, so it moves with a snapped start
+        srt_content = shift_srt(segment['srt_content'], int(round((start - parse_time(segment['start_time'])) * 1000)))
+        if srt_content:
+            parse_srt(
+                srt_content,
+                duration=parse_time(segment['end_time']) - parse_time(segment['start_time'])
+            )
+        segment['srt_content'] = srt_content or None
+    except SubtitleError as e:
+        print(f"Dropping invalid subtitles for segment {segment['start_time']}-{segment['end_time']}: {e}")
+        segment['srt_content'] = None
+
+async def prefetch_batch_sources(db, project: Project):
+    """
+    Starts downloading the sources of the next pending projects in the same batch,
+    skipping ones another worker is already prefetching.
+    """
+    result = await db.execute(
+        select(Project.id, Project.source_url)
+        .where(
+            Project.batch_id == project.batch_id,
+            Project.status == ProjectStatus.PENDING.value,
+            Project.id != project.id
+        )
+        .order_by(Project.created_at)
+        .limit(settings.BATCH_PREFETCH_DEPTH + settings.SCHEDULER_MAX_IN_FLIGHT)
+    )
+    started = 0
+    for next_id, source_url in result.all():
+        if started >= settings.BATCH_PREFETCH_DEPTH:
+            break
+        if source_prefetcher.prefetch(str(next_id), source_url):
+            started += 1
+
+async def process_video_logic(project_id: str, quota_deadline: float = None):
     async with AsyncSessionLocal() as db:
-        project = await db.get(Project, project_id)
+        project = await db.get(Project, project_id, options=[undefer(Project.signals)])
         if not project:
             return
+        tracing.annotate(**{"tandav.project_id": project_id, "tandav.batch_id": project.batch_id})
+        # Read now: after a rollback the instance is expired and cannot lazy-load
+        user_id = project.user_id
         
-        project.status = ProjectStatus.PROCESSING.value
-        await db.commit()
+        # Admission: refuse to start if the scratch volume cannot hold the source and renders.
+        # InsufficientDisk propagates to the task, which retries later on (possibly) another worker
+        source_size = r2_service.get_object_size(project.source_url) or 0
+        with workspace_manager.workspace("process", int(source_size * settings.SCRATCH_SIZE_FACTOR)) as workspace:
+            project.status = ProjectStatus.PROCESSING.value
+            await db.commit()
+            invalidate_dashboard(project.user_id)
 
-        try:
-            # 1. Download Video from R2
-            local_filename = f"/tmp/{project.source_url.split('/')[-1]}"
-            os.makedirs(os.path.dirname(local_filename), exist_ok=True)
-            
+            try:
+                started_at = time.monotonic()
+                stages = {}
 
-            # Download using S3 API (not public URL)
-            print(f"Downloading {project.source_url} from R2 to {local_filename}")
-            r2_service.s3_client.download_file(r2_service.bucket_name, project.source_url, local_filename)
+                # 1. Download Video from R2
+                local_filename = workspace.path(project.source_url.split('/')[-1])
 
-            # 2. Check Duration & Smart Split
-            if not shutil.which('ffmpeg'):
-                raise Exception("FFmpeg binary not found in system path")
+                # Download using S3 API (not public URL), unless an earlier job of the batch prefetched it
+                if not source_prefetcher.take(str(project.id), local_filename):
+                    print(f"Downloading {project.source_url} from R2 to {local_filename}")
+                    with tracing.span("r2 download", **{"r2.key": project.source_url}):
+                        r2_service.s3_client.download_file(r2_service.bucket_name, project.source_url, local_filename)
+                workspace.check_quota()
+                stages["download"] = time.monotonic() - started_at
 
-            try:
-                probe = ffmpeg.probe(local_filename)
-                duration = float(probe['format']['duration'])
-            except ffmpeg.Error as e:
-                print(f"FFmpeg probe failed: {e.stderr.decode('utf8') if e.stderr else str(e)}")
-                duration = 60.0 
-            except Exception as e:
-                print(f"Generic probe error: {e}")
-                duration = 60.0
-            
-            segments = []
-            
-            # Logic: If video is short (< 30s) OR user requested "auto" and it's short, don't split.
-            if duration < 30.0:
-                print(f"Video is short ({duration}s). Skipping AI splitting.")
-                segments = [{
-                    "start_time": "00:00",
-                    "end_time": f"{int(duration // 60):02d}:{int(duration % 60):02d}",
-                    "virality_score": 80,
-                    "explanation": "Short video processed as-is.",
-                    "suggested_caption": "Original Clip",
-                    "srt_content": None 
-                }]
-            else:
-                # 3. Analyze with Gemini (Long Video)
-                segments = await gemini_service.analyze_video(local_filename, duration_preference="auto")
+                # Overlap the next batch download with this job's analysis and renders
+                if project.batch_id and settings.ENABLE_BATCH_PREFETCH:
+                    try:
+                        await prefetch_batch_sources(db, project)
+                    except Exception as e:
+                        print(f"Batch prefetch failed for project {project_id}: {e}")
+
+                # 2. Check Duration & Smart Split
+                if not shutil.which('ffmpeg'):
+                    raise Exception("FFmpeg binary not found in system path")
+
+                # Probe once at ingest and persist, so re-burns and retries never re-probe
+                if project.duration is None:
+                    apply_media_info(project, probe_media(local_filename))
+                    await db.commit()
+                    print(f"Probed source: {project.duration:.1f}s {project.width}x{project.height} @ {project.fps}fps ({project.video_codec}/{project.audio_codec})")
+                duration = project.duration
             
-            if not segments:
-                raise Exception("No viral segments identified by AI")
-
-            # 3. Process Segments
-            for segment in segments:
-                clip_filename = f"/tmp/{uuid.uuid4()}.mp4"
-                ffmpeg_processor.process_segment(
-                    local_filename, 
-                    clip_filename, 
-                    segment['start_time'], 
-                    segment['end_time'],
-                    srt_content=segment.get('srt_content')
-                )
-                
-                # 4. Upload Clip
-                s3_key = f"clips/{os.path.basename(clip_filename)}"
-                r2_service.s3_client.upload_file(
-                    clip_filename, 
-                    r2_service.bucket_name, 
-                    s3_key,
-                    ExtraArgs={'ContentType': 'video/mp4'}
-                )
+                loop = asyncio.get_running_loop()
+                signals = None
+
+                # Re-analysis keeps the clips already made and asks for different windows
+                existing = await db.execute(select(Clip.start_time, Clip.end_time).where(Clip.project_id == project.id))
+                existing_windows = [(start, end) for start, end in existing if start is not None and end is not None]
+
+                # Logic: If video is short (< 30s) OR user requested "auto" and it's short, don't split.
+                if duration < SHORT_VIDEO_SECONDS and existing_windows:
+                    print(f"Video is short ({duration}s) and already clipped. Nothing to re-analyze.")
+                    segments = iterate_segments([])
+                elif duration < SHORT_VIDEO_SECONDS:
+                    print(f"Video is short ({duration}s). Skipping AI splitting.")
+                    segments = iterate_segments([{
+                        "start_time": "00:00",
+                        "end_time": f"{int(duration // 60):02d}:{int(duration % 60):02d}",
+                        "virality_score": 80,
+                        "explanation": "Short video processed as-is.",
+                        "suggested_caption": "Original Clip",
+                        "srt_content": None 
+                    }])
+                else:
+                    # Local pre-analysis (scene cuts, pauses, loudness), persisted per source
+                    if settings.ENABLE_SIGNAL_ANALYSIS and project.signals is None:
+                        try:
+                            with tracing.span("signal analysis"):
+                                project.signals = await loop.run_in_executor(None, tracing.bind(analyze_signals), local_filename, workspace.fast_root)
+                            await db.commit()
+                            print(f"Signals: {len(project.signals['scene_cuts'])} scene cuts, {len(project.signals['silences'])} pauses")
+                        except Exception as e:
+                            # Signals only refine Gemini's output; never fail the project over them
+                            print(f"Signal analysis failed for project {project_id}: {e}")
+                    signals = project.signals
+
+                    candidates = None
+                    if signals and settings.SIGNAL_CANDIDATE_HINTS:
+                        candidates = candidate_windows(signals, duration)
+
+                    # 3. Analyze with Gemini (Long Video), streamed: each segment is rendered
+                    # as soon as Gemini finishes describing it, overlapping generation and encoding.
+                    # Batch projects queue for Gemini quota behind single submissions.
+                    # Re-analysis reuses the stored Gemini upload and skips windows already clipped
+                    segments = gemini_service.analyze_video_stream(
+                        local_filename, duration_preference=project.clip_duration or "auto", candidates=candidates,
+                        lane="batch" if project.batch_id else "interactive", duration=duration,
+                        file_handle=project.gemini_file,
+                        on_handle=lambda handle: setattr(project, "gemini_file", handle),
+                        exclude=existing_windows, deadline=quota_deadline
+                    )
+
+                stages["prepare"] = time.monotonic() - started_at - stages["download"]
+                clip_count = 0
+                async for segment in segments:
+                    prepare_segment(segment, duration, signals)
+
+                    # 4. Render off the event loop so the Gemini stream keeps draining meanwhile
+                    clip_filename = workspace.path(f"{uuid.uuid4()}.mp4")
+                    output_paths = rendition_paths(clip_filename)
+                    timeline = timeline_options(segment, project)
+                    if timeline:
+                        output_paths["timeline_dir"] = f"{os.path.splitext(clip_filename)[0]}_timeline"
+                    with tracing.span("render clip", **{"clip.start": segment['start_time'], "clip.end": segment['end_time']}):
+                        renditions = await loop.run_in_executor(None, tracing.bind(lambda: ffmpeg_processor.process_segment(
+                            input_path=local_filename, 
+                            start_time=segment['start_time'], 
+                            end_time=segment['end_time'],
+                            srt_content=segment.get('srt_content'),
+                            **output_paths,
+                            **timeline
+                        )))
+                    workspace.check_quota()
                 
-                # 5. Save Clip to DB
-                # Convert time strings "MM:SS" to seconds float if possible, or store as is?
-                # The model expects Float for start_time/end_time.
-                # Gemini returns strings "MM:SS". We need to parse them.
+                    # 5. Upload Clip (full quality + preview/poster/HLS renditions)
+                    s3_key = f"clips/{os.path.splitext(os.path.basename(clip_filename))[0]}"
+                    rendition_urls = await upload_renditions(renditions, s3_key)
+                    if "captions" in rendition_urls:
+                        rendition_urls["captions"].update(style_name=DEFAULT_CAPTION_STYLE, karaoke=False)
                 
-                def parse_time(t_str):
-                    try:
-                        parts = t_str.split(':')
-                        if len(parts) == 2:
-                            return float(parts[0]) * 60 + float(parts[1])
-                        elif len(parts) == 3:
-                            return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
-                        return 0.0
-                    except:
-                        return 0.0
-
-                start_seconds = parse_time(segment['start_time'])
-                end_seconds = parse_time(segment['end_time'])
-
-                new_clip = Clip(
-                    project_id=project.id,
-                    s3_url=r2_service.get_public_url(s3_key),
-                    virality_score=segment.get('virality_score'),
-                    transcript=segment.get('explanation'),
-                    start_time=start_seconds,
-                    end_time=end_seconds
-                )
-                db.add(new_clip)
+                    # 6. Save Clip to DB
+                    # The model expects Float for start_time/end_time.
+                    # Gemini returns strings "MM:SS". We need to parse them.
+                    start_seconds = parse_time(segment['start_time'])
+                    end_seconds = parse_time(segment['end_time'])
+
+                    new_clip = Clip(
+                        project_id=project.id,
+                        **rendition_urls,
+                        virality_score=segment.get('virality_score'),
+                        # Keep the SRT so re-burns can restyle the same captions
+                        transcript=segment.get('srt_content') or segment.get('explanation'),
+                        transcript_start=start_seconds,
+                        start_time=start_seconds,
+                        end_time=end_seconds
+                    )
+                    db.add(new_clip)
+                    # Commit per clip so the first clip is visible while the rest render
+                    await db.commit()
+                    invalidate_dashboard(project.user_id)
+                    clip_count += 1
+                    print(f"Clip {clip_count} ready for project {project_id}")
                 
-                # Cleanup clip
-                if os.path.exists(clip_filename):
-                    os.remove(clip_filename)
+                    # Cleanup clip
+                    remove_renditions(renditions)
 
-            project.status = ProjectStatus.COMPLETED.value
-            await db.commit()
-            
-            # Cleanup source
-            os.remove(local_filename)
+                if not clip_count and not existing_windows:
+                    raise Exception("No viral segments identified by AI")
 
-        except Exception as e:
-            error_msg = str(e)
-            if not error_msg:
-                error_msg = "Unknown error occurred during processing"
+                # Feed the scheduler's cost model with how long this job really took
+                stages["analyze_render"] = time.monotonic() - started_at - stages["download"] - stages["prepare"]
+                record_job_timing({
+                    "duration": project.duration,
+                    "width": project.width,
+                    "height": project.height,
+                    "seconds": round(time.monotonic() - started_at, 2),
+                    "stages": {name: round(seconds, 2) for name, seconds in stages.items()},
+                })
+
+                project.status = ProjectStatus.COMPLETED.value
+                await db.commit()
+                invalidate_dashboard(project.user_id)
+
+            except GeminiQuotaDeferred:
+                # Quota stayed exhausted before any clip was made: back to the queue, not FAILED
+                await db.rollback()
+                project.status = ProjectStatus.PENDING.value
+                await db.commit()
+                invalidate_dashboard(user_id)
+                raise
+
+            except Exception as e:
+                error_msg = str(e)
+                if not error_msg:
+                    error_msg = "Unknown error occurred during processing"
             
-            print(f"Error processing project {project_id}: {error_msg}")
+                print(f"Error processing project {project_id}: {error_msg}")
             
-            # Rollback any failed transaction before trying to save the error status
-            try:
-                await db.rollback()
-            except Exception:
-                pass
+                # Rollback any failed transaction before trying to save the error status
+                try:
+                    await db.rollback()
+                except Exception:
+                    pass
             
-            project.status = ProjectStatus.FAILED.value
-            project.error_message = error_msg
+                project.status = ProjectStatus.FAILED.value
+                project.error_message = error_msg
+                try:
+                    # Failed jobs are not charged: give back the credit taken at submission
+                    await refund_credits(db, user_id)
+                    await db.commit()
+                    invalidate_dashboard(user_id)
+                except Exception as commit_error:
+                    print(f"Failed to save error status: {commit_error}")
+
+async def fail_deferred_project(project_id: str, reason: str):
+    """
+    Gives up on a project whose deferrals ran out. It was put back to PENDING,
+    so without this it would wait forever with the user's credit held.
+    """
+    async with AsyncSessionLocal() as db:
+        project = await db.get(Project, project_id)
+        if not project or project.status != ProjectStatus.PENDING.value:
+            return
+        project.status = ProjectStatus.FAILED.value
+        project.error_message = reason
+        await refund_credits(db, project.user_id)
+        await db.commit()
+        invalidate_dashboard(project.user_id)
+
+def defer_project(task, project_id: str, exc: Exception, countdown: int):
+    """
+    Retries a deferred project later, or fails and refunds it once max_retries is used up.
+    """
+    if task.request.retries >= task.max_retries:
+        print(f"Giving up on project {project_id} after {task.request.retries} deferrals: {exc}")
+        asyncio.run(fail_deferred_project(project_id, f"Could not be scheduled: {exc}"))
+        return
+    print(f"Deferring project {project_id}: {exc}")
+    raise task.retry(exc=exc, countdown=countdown)
+
+@celery_app.task(bind=True, name="services.processor.process_video_task", time_limit=300, soft_time_limit=PROCESS_SOFT_TIME_LIMIT, max_retries=10)
+def process_video_task(self, project_id: str, profile: bool = False):
+    # Run async logic in sync Celery task; profiled if asked to or armed via /admin/profile
+    # Waiting for Gemini quota must not run into the soft time limit: defer instead
+    quota_deadline = time.monotonic() + PROCESS_SOFT_TIME_LIMIT - settings.GEMINI_TASK_RESERVE_SECONDS
+    try:
+        with TaskProfile("process_video", force=profile) as task_profile:
+            task_profile.attach(project_id)
+            asyncio.run(process_video_logic(project_id, quota_deadline))
+    except InsufficientDisk as e:
+        defer_project(self, project_id, e, settings.SCRATCH_RETRY_SECONDS)
+    except GeminiQuotaDeferred as e:
+        defer_project(self, project_id, e, settings.GEMINI_DEFER_SECONDS)
+    except Exception as e:
+        print(f"Critical error in process_video_task wrapper: {e}")
+
+async def schedule_project(project_id: str):
+    """
+    Probes the source remotely (headers only, via a presigned URL) so the job's
+    cost can be estimated, then puts it in the fair queue and dispatches.
+    """
+    async with AsyncSessionLocal() as db:
+        project = await db.get(Project, project_id)
+        if not project:
+            return
+
+        if project.duration is None:
             try:
+                source_url = r2_service.generate_presigned_get_url(project.source_url)
+                apply_media_info(project, probe_media(source_url))
                 await db.commit()
-            except Exception as commit_error:
-                print(f"Failed to save error status: {commit_error}")
+            except MediaProbeError as e:
+                # The worker probes again after download and reports the failure properly
+                print(f"Remote probe failed for project {project_id}: {e}")
+
+        cost = load_cost_model().predict(project.duration, project.width, project.height)
+        user_id = project.user_id
+
+    fair_queue.enqueue(str(project_id), user_id, cost, payload={"project_id": str(project_id), "trace": tracing.carrier()})
+    print(f"Queued project {project_id} for user {user_id} (expected {cost:.0f}s)")
+    dispatch_jobs()
 
-@celery_app.task(name="services.processor.process_video_task", time_limit=300, soft_time_limit=240)
-def process_video_task(project_id: str):
-    # Run async logic in sync Celery task
+@celery_app.task(name="services.processor.schedule_project_task")
+def schedule_project_task(project_id: str):
     try:
-        asyncio.run(process_video_logic(project_id))
+        asyncio.run(schedule_project(project_id))
     except Exception as e:
-        print(f"Critical error in process_video_task wrapper: {e}")
+        # Never strand a project: fall back to plain FIFO dispatch
+        print(f"Scheduling failed for project {project_id}, dispatching directly: {e}")
+        process_video_task.delay(project_id)
+
+@celery_app.task(name="services.processor.dispatch_jobs_task")
+def dispatch_jobs_task():
+    """
+    Periodic safety net: dispatches queued jobs if a completion signal was missed.
+    """
+    return dispatch_jobs()
 
 @celery_app.task(name="services.processor.delete_files_task")
 def delete_files_task(file_keys: list[str]):
@@ -160,19 +552,47 @@ def delete_files_task(file_keys: list[str]):
     print(f"Starting background deletion of {len(file_keys)} files.")
     for key in file_keys:
         try:
+            # Keys ending in "/" are rendition directories (e.g. HLS segments)
+            if key.endswith("/"):
+                r2_service.delete_prefix(key)
+                continue
             r2_service.delete_file(key)
         except Exception as e:
             print(f"Error deleting file {key}: {e}")
     print("Background deletion completed.")
 
-@celery_app.task(name="services.processor.burn_subtitles_task")
-def burn_subtitles_task(clip_id: str, start_time: float = None, end_time: float = None, style_name: str = "Hormozi"):
+@celery_app.task(bind=True, name="services.processor.burn_subtitles_task", max_retries=10)
+def burn_subtitles_task(self, clip_id: str, start_time: float = None, end_time: float = None, style_name: str = "Hormozi", karaoke: bool = False, generation: int = None, profile: bool = False):
     """
     Re-processes a clip:
     1. Downloads source video
-    2. Cuts and burns subtitles (with new style/transcript)
+    2. Cuts and burns subtitles (with new style/transcript); in soft-caption mode the
+       video is cut clean and the captions rewritten as sidecars instead
     3. Uploads back to R2
+    Requests made while this task was queued are coalesced: the latest parameters win.
+    Every request has a generation number; as soon as a newer one exists this task
+    stops (killing ffmpeg if it is running) and only the latest generation commits.
+    With profile=True (or profiling armed for the project) the run is profiled.
     """
+    pending = take_burn_params(clip_id)
+    if pending:
+        start_time = pending.get("start_time")
+        end_time = pending.get("end_time")
+        style_name = pending.get("style_name") or style_name
+        karaoke = pending.get("karaoke", karaoke)
+        generation = pending.get("generation", generation)
+    mark_burn_running(clip_id, {
+        "start_time": start_time, "end_time": end_time,
+        "style_name": style_name, "karaoke": karaoke, "generation": generation,
+    })
+
+    import time
+    started_at = time.monotonic()
+    task_profile = TaskProfile("burn", force=profile)
+
+    def check_superseded():
+        if is_superseded(clip_id, generation):
+            raise BurnSuperseded(f"Burn generation {generation} of clip {clip_id} superseded")
     
     async def run_async():
         async with AsyncSessionLocal() as db:
@@ -187,63 +607,487 @@ def burn_subtitles_task(clip_id: str, start_time: float = None, end_time: float
                 return
 
             project = clip.project
-            print(f"Re-burning clip {clip.id} from project {project.id}")
+            tracing.annotate(**{"tandav.project_id": str(project.id), "tandav.clip_id": clip_id, "tandav.generation": generation})
+            task_profile.attach(project.id)
+            if is_superseded(clip_id, generation):
+                print(f"Skipping burn generation {generation} of clip {clip.id}: a newer request exists")
+                record_burn_outcome("skipped")
+                return
+            print(f"Re-burning clip {clip.id} from project {project.id} (generation {generation})")
 
             # Use provided times or fallback to DB times
             final_start = start_time if start_time is not None else clip.start_time
             final_end = end_time if end_time is not None else clip.end_time
             
-            if final_start is None or final_end is None:
-                print("Missing start/end times for re-burn")
+            try:
+                validate_trim(final_start, final_end, project.duration)
+            except ValueError as e:
+                print(f"Invalid trim for re-burn of clip {clip.id}: {e}")
                 return
 
-            local_source_path = f"temp_source_{project.id}.mp4"
-            local_output_path = f"temp_clip_{clip.id}.mp4"
+            # Cues are rendered relative to the new start; the stored transcript keeps its anchor
+            transcript = clip_transcript(clip, final_start)
+
+            # Validate captions before downloading the source or starting the encode
+            if transcript:
+                try:
+                    parse_srt(transcript, duration=final_end - final_start)
+                except SubtitleError as e:
+                    print(f"Invalid subtitles for clip {clip.id}, skipping re-burn: {e}")
+                    return
+
+            # Admission: don't start a render the scratch volume cannot hold
+            source_size = r2_service.get_object_size(project.source_url) or 0
+            with workspace_manager.workspace("burn", int(source_size * settings.SCRATCH_SIZE_FACTOR)) as workspace:
+                local_source_path = workspace.path(f"source_{project.id}.mp4")
+                local_output_path = workspace.path(f"clip_{clip.id}.mp4")
+                output_paths = rendition_paths(local_output_path)
             
-            try:
-                # 2. Download Source Video (if not exists)
-                if not os.path.exists(local_source_path):
-                    if project.source_url and not project.source_url.startswith("http"):
-                         await r2_service.download_file(project.source_url, local_source_path)
-                    else:
-                        print("Skipping download, assuming local or http input not supported yet")
-                        return
+                try:
+                    # 2. Download Source Video (if not exists)
+                    if not os.path.exists(local_source_path):
+                        if project.source_url and not project.source_url.startswith("http"):
+                             await r2_service.download_file(project.source_url, local_source_path)
+                        else:
+                            print("Skipping download, assuming local or http input not supported yet")
+                            return
+                    check_superseded()
 
-                # 3. Process (Cut + Burn)
-                # Convert float times to string "HH:MM:SS" or seconds string
-                ffmpeg_processor.process_segment(
-                    input_path=local_source_path,
-                    output_path=local_output_path,
-                    start_time=str(final_start),
-                    end_time=str(final_end),
-                    srt_content=clip.transcript,
-                    style_name=style_name
-                )
+                    # 3. Process (Cut + Burn)
+                    # Convert float times to string "HH:MM:SS" or seconds string
+                    renditions = ffmpeg_processor.process_segment(
+                        input_path=local_source_path,
+                        start_time=str(final_start),
+                        end_time=str(final_end),
+                        srt_content=transcript,
+                        style_name=style_name,
+                        karaoke=karaoke,
+                        should_cancel=lambda: is_superseded(clip_id, generation),
+                        **output_paths
+                    )
+                    workspace.check_quota()
+                    check_superseded()
                 
-                # 4. Upload back to R2
-                # Append timestamp to key to bust cache
-                import time
-                timestamp = int(time.time())
-                s3_key = f"clips/{project.id}/{clip.id}_{timestamp}.mp4"
+                    # 4. Upload back to R2
+                    # Append timestamp to key to bust cache
+                    timestamp = int(time.time())
+                    s3_key = f"clips/{project.id}/{clip.id}_{timestamp}"
+                    rendition_urls = await upload_renditions(renditions, s3_key)
+                    captions = rendition_urls.get("captions")
+                    if captions:
+                        captions.update(style_name=style_name, karaoke=karaoke)
                 
-                with open(local_output_path, "rb") as f:
-                    await r2_service.upload_file(f, s3_key, "video/mp4")
+                    # 5. Update DB, but only if no newer generation has committed in the meantime
+                    values = {
+                        "s3_url": rendition_urls["s3_url"],
+                        "preview_url": rendition_urls.get("preview_url"),
+                        "poster_url": rendition_urls.get("poster_url"),
+                        "hls_url": rendition_urls.get("hls_url"),
+                        "captions": captions, # None: the captions are burned into the new video
+                        "start_time": final_start,
+                        "end_time": final_end,
+                    }
+                    stmt = update(Clip).where(Clip.id == clip.id)
+                    if generation is not None:
+                        stmt = stmt.where(Clip.render_generation < generation)
+                        values["render_generation"] = generation
+                    result = await db.execute(stmt.values(**values))
+                    await db.commit()
+                    invalidate_dashboard(project.user_id)
                 
-                # 5. Update DB
-                clip.s3_url = r2_service.get_public_url(s3_key)
-                clip.start_time = final_start
-                clip.end_time = final_end
-                await db.commit()
+                    if result.rowcount == 0:
+                        print(f"Discarding burn generation {generation} of clip {clip.id}: a newer render was committed")
+                        record_burn_outcome("discarded", time.monotonic() - started_at)
+                        delete_files_task.delay(stale_rendition_keys(rendition_urls, s3_key))
+                        return
                 
-                print(f"Clip {clip.id} re-burned and updated successfully.")
+                    record_burn_outcome("completed", time.monotonic() - started_at)
+                    print(f"Clip {clip.id} re-burned and updated successfully.")
 
-            except Exception as e:
-                print(f"Error in burn task: {e}")
-            finally:
-                if os.path.exists(local_output_path):
-                    os.remove(local_output_path)
-                if os.path.exists(local_source_path):
-                    os.remove(local_source_path)
+                except (BurnSuperseded, RenderCancelled) as e:
+                    print(f"Stopped burn of clip {clip.id}: {e}")
+                    record_burn_outcome("cancelled", time.monotonic() - started_at)
+                except Exception as e:
+                    print(f"Error in burn task: {e}")
+                finally:
+                    remove_renditions(output_paths)
 
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(run_async())
+    try:
+        with task_profile:
+            loop.run_until_complete(run_async())
+    except InsufficientDisk as e:
+        # Retry with the resolved parameters: the coalesced ones were already taken
+        print(f"Deferring burn of clip {clip_id}: {e}")
+        raise self.retry(
+            exc=e,
+            countdown=settings.SCRATCH_RETRY_SECONDS,
+            kwargs={
+                "clip_id": clip_id, "start_time": start_time, "end_time": end_time,
+                "style_name": style_name, "karaoke": karaoke, "generation": generation,
+                "profile": profile,
+            }
+        )
+    except Exception:
+        end_burn(clip_id, generation)
+        raise
+    # Not on a disk deferral: the retry is still this burn, pending for restyles to find
+    end_burn(clip_id, generation)
+
+async def export_captioned_clip(clip_id: str):
+    """
+    Final export of a soft-captioned clip: one burned-in render of its current
+    transcript, trim and style, stored beside the clean video. It is recorded only
+    if the clip has not changed meanwhile (see caption_signature).
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Clip).options(selectinload(Clip.project)).where(Clip.id == clip_id))
+        clip = result.scalars().first()
+        if not clip or not clip.project or not clip.captions or not clip.transcript:
+            return
+        project = clip.project
+        tracing.annotate(**{"tandav.project_id": str(project.id), "tandav.clip_id": clip_id})
+        captions = clip.captions
+        transcript = clip_transcript(clip)
+        signature = caption_signature(transcript, clip.start_time, clip.end_time, captions["style_name"], captions["karaoke"])
+        if (captions.get("burned") or {}).get("signature") == signature:
+            return
+
+        started_at = time.monotonic()
+        source_size = r2_service.get_object_size(project.source_url) or 0
+        with workspace_manager.workspace("export", int(source_size * settings.SCRATCH_SIZE_FACTOR)) as workspace:
+            local_source_path = workspace.path(f"source_{project.id}.mp4")
+            local_output_path = workspace.path(f"clip_{clip.id}_burned.mp4")
+            await r2_service.download_file(project.source_url, local_source_path)
+
+            # Only the download file: the grid keeps playing the clean preview with sidecar captions
+            loop = asyncio.get_running_loop()
+            renditions = await loop.run_in_executor(None, tracing.bind(lambda: ffmpeg_processor.process_segment(
+                input_path=local_source_path,
+                output_path=local_output_path,
+                start_time=str(clip.start_time),
+                end_time=str(clip.end_time),
+                srt_content=transcript,
+                style_name=captions["style_name"],
+                karaoke=captions["karaoke"]
+            )))
+            s3_key = f"clips/{project.id}/{clip.id}_burned_{signature[:8]}.mp4"
+            with open(renditions["full"], "rb") as f:
+                await r2_service.upload_file(f, s3_key, RENDITION_CONTENT_TYPES[".mp4"])
+
+        await db.refresh(clip)
+        current = clip.captions
+        if not current or caption_signature(clip_transcript(clip), clip.start_time, clip.end_time, current["style_name"], current["karaoke"]) != signature:
+            print(f"Discarding captioned export of clip {clip.id}: the clip changed while it rendered")
+            delete_files_task.delay([s3_key])
+            return
+        previous = current.get("burned")
+        clip.captions = {**current, "burned": {"key": s3_key, "signature": signature}}
+        await db.commit()
+        if previous and previous["key"] != s3_key:
+            delete_files_task.delay([previous["key"]])
+        invalidate_dashboard(project.user_id)
+        print(f"Captioned export of clip {clip.id} ready in {time.monotonic() - started_at:.1f}s")
+
+@celery_app.task(bind=True, name="services.processor.export_clip_task", max_retries=10)
+def export_clip_task(self, clip_id: str):
+    try:
+        asyncio.run(export_captioned_clip(clip_id))
+    except InsufficientDisk as e:
+        print(f"Deferring captioned export of clip {clip_id}: {e}")
+        raise self.retry(exc=e, countdown=settings.SCRATCH_RETRY_SECONDS)
+    except Exception as e:
+        print(f"Captioned export of clip {clip_id} failed: {e}")
+    finally:
+        release_clip_export(clip_id)
+
+async def refresh_caption_track(clip_id: str):
+    """
+    Remuxes a soft-caption clip's full MP4 with a mov_text track built from its
+    current transcript (stream copy, no re-encode). The new file is recorded only if
+    the clip's video and transcript did not change meanwhile.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Clip).options(selectinload(Clip.project)).where(Clip.id == clip_id))
+        clip = result.scalars().first()
+        if not clip or not clip.project or not clip.captions or not clip.transcript:
+            return
+        project = clip.project
+        tracing.annotate(**{"tandav.project_id": str(project.id), "tandav.clip_id": clip_id})
+        source_url, transcript = clip.s3_url, clip.transcript
+        captions_srt = clip_transcript(clip)
+        if not captions_srt:
+            return
+        cues = parse_srt(captions_srt, duration=clip.end_time - clip.start_time)
+
+        with workspace_manager.workspace("captions", (r2_service.get_object_size(r2_service.get_key_from_url(source_url)) or 0) * 2) as workspace:
+            local_input_path = workspace.path(f"clip_{clip.id}.mp4")
+            local_srt_path = workspace.path("captions.srt")
+            local_output_path = workspace.path(f"clip_{clip.id}_captions.mp4")
+            await r2_service.download_file(source_url, local_input_path)
+            with open(local_srt_path, "w", encoding="utf-8") as f:
+                f.write(build_srt(cues))
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, tracing.bind(lambda: ffmpeg_processor.replace_caption_track(
+                local_input_path, local_srt_path, local_output_path
+            )))
+            s3_key = f"clips/{project.id}/{clip.id}_{int(time.time())}.mp4"
+            with open(local_output_path, "rb") as f:
+                await r2_service.upload_file(f, s3_key, RENDITION_CONTENT_TYPES[".mp4"])
+
+        result = await db.execute(
+            update(Clip)
+            .where(Clip.id == clip.id, Clip.s3_url == source_url, Clip.transcript == transcript)
+            .values(s3_url=r2_service.get_public_url(s3_key))
+        )
+        await db.commit()
+        if result.rowcount == 0:
+            print(f"Discarding caption track of clip {clip.id}: the clip changed meanwhile")
+            delete_files_task.delay([s3_key])
+            return
+        delete_files_task.delay([r2_service.get_key_from_url(source_url)])
+        invalidate_dashboard(project.user_id)
+        print(f"Caption track of clip {clip.id} refreshed")
+
+@celery_app.task(bind=True, name="services.processor.refresh_caption_track_task", max_retries=10)
+def refresh_caption_track_task(self, clip_id: str):
+    try:
+        asyncio.run(refresh_caption_track(clip_id))
+    except InsufficientDisk as e:
+        print(f"Deferring caption track of clip {clip_id}: {e}")
+        raise self.retry(exc=e, countdown=settings.SCRATCH_RETRY_SECONDS)
+    except Exception as e:
+        print(f"Caption track refresh of clip {clip_id} failed: {e}")
+
+async def restyle_project(project_id: str, style_name: str, karaoke: bool, generations: dict):
+    """
+    Applies one caption style to every captioned clip of a project in a single job.
+    The source is downloaded once; clips are rendered in shared-decode groups (see
+    plan_shared_decodes), and soft-caption clips only get their ASS sidecar rewritten.
+    All clips switch to their new renditions in one transaction at the end. A clip
+    that got a newer individual burn meanwhile (see generations) keeps that one.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Project).options(selectinload(Project.clips)).where(Project.id == project_id))
+        project = result.scalars().first()
+        if not project:
+            return
+        tracing.annotate(**{"tandav.project_id": project_id})
+        started_at = time.monotonic()
+
+        clips = [
+            clip for clip in project.clips
+            if str(clip.id) in generations and clip.transcript and clip.start_time is not None and clip.end_time is not None
+        ]
+        soft = [clip for clip in clips if clip.captions]
+        pending = [
+            clip for clip in clips
+            if not clip.captions and not is_superseded(str(clip.id), generations[str(clip.id)])
+        ]
+
+        rendered = []
+        if pending:
+            source_size = r2_service.get_object_size(project.source_url) or 0
+            with workspace_manager.workspace("restyle", int(source_size * settings.SCRATCH_SIZE_FACTOR)) as workspace:
+                local_source_path = workspace.path(f"source_{project.id}.mp4")
+                await r2_service.download_file(project.source_url, local_source_path)
+                if project.duration is None:
+                    apply_media_info(project, probe_media(local_source_path))
+                has_audio = bool(project.audio_codec)
+                loop = asyncio.get_running_loop()
+                timestamp = int(time.time())
+
+                for group in plan_shared_decodes(pending):
+                    live = [clip for clip in group if not is_superseded(str(clip.id), generations[str(clip.id)])]
+                    if not live:
+                        continue
+                    segments = []
+                    for clip in live:
+                        output_path = workspace.path(f"clip_{clip.id}.mp4")
+                        segments.append({
+                            "start_time": clip.start_time, "end_time": clip.end_time,
+                            "srt_content": clip_transcript(clip), "style_name": style_name, "karaoke": karaoke,
+                            "output_path": output_path, **rendition_paths(output_path),
+                        })
+                    try:
+                        # Stop only if every clip of the group was superseded by a newer burn
+                        with tracing.span("render shared decode", **{"restyle.clips": len(live)}):
+                            results = await loop.run_in_executor(None, tracing.bind(lambda: ffmpeg_processor.process_segments(
+                                local_source_path, segments, has_audio=has_audio,
+                                should_cancel=lambda: all(is_superseded(str(clip.id), generations[str(clip.id)]) for clip in live)
+                            )))
+                        workspace.check_quota()
+                        for clip, renditions in zip(live, results):
+                            s3_key = f"clips/{project.id}/{clip.id}_{timestamp}"
+                            rendition_urls = await upload_renditions(renditions, s3_key)
+                            if rendition_urls.get("captions"):
+                                rendition_urls["captions"].update(style_name=style_name, karaoke=karaoke)
+                            rendered.append((clip, rendition_urls, s3_key))
+                    except RenderCancelled as e:
+                        print(f"Stopped restyle of {len(live)} clips of project {project.id}: {e}")
+                    except Exception as e:
+                        print(f"Restyle of {len(live)} clips of project {project.id} failed: {e}")
+                    finally:
+                        for segment in segments:
+                            remove_renditions(segment)
+
+        restyled = {}
+        for clip in soft:
+            try:
+                restyled[clip.id] = await rewrite_captions(clip, style_name, karaoke)
+            except Exception as e:
+                print(f"Could not restyle captions of clip {clip.id}: {e}")
+
+        # One transaction: the dashboard sees every clip switch at once
+        stale_keys = []
+        committed = 0
+        for clip, rendition_urls, s3_key in rendered:
+            generation = generations[str(clip.id)]
+            values = {
+                "s3_url": rendition_urls["s3_url"],
+                "preview_url": rendition_urls.get("preview_url"),
+                "poster_url": rendition_urls.get("poster_url"),
+                "hls_url": rendition_urls.get("hls_url"),
+                "captions": rendition_urls.get("captions"),
+            }
+            stmt = update(Clip).where(Clip.id == clip.id)
+            if generation is not None:
+                stmt = stmt.where(Clip.render_generation < generation)
+                values["render_generation"] = generation
+            result = await db.execute(stmt.values(**values))
+            if result.rowcount == 0:
+                print(f"Discarding restyle of clip {clip.id}: a newer render was committed")
+                stale_keys += stale_rendition_keys(rendition_urls, s3_key)
+            else:
+                committed += 1
+        for clip in soft:
+            if clip.id in restyled:
+                clip.captions = restyled[clip.id]
+        await db.commit()
+        invalidate_dashboard(project.user_id)
+        if stale_keys:
+            delete_files_task.delay(stale_keys)
+        print(
+            f"Restyled project {project.id} to {style_name} in {time.monotonic() - started_at:.1f}s: "
+            f"{committed} clips re-rendered, {len(restyled)} soft-caption clips restyled"
+        )
+
+@celery_app.task(bind=True, name="services.processor.restyle_project_task", max_retries=10)
+def restyle_project_task(self, project_id: str, style_name: str = "Hormozi", karaoke: bool = False, generations: dict = None, profile: bool = False):
+    try:
+        with TaskProfile("restyle", force=profile) as task_profile:
+            task_profile.attach(project_id)
+            asyncio.run(restyle_project(project_id, style_name, karaoke, generations or {}))
+    except InsufficientDisk as e:
+        print(f"Deferring restyle of project {project_id}: {e}")
+        raise self.retry(exc=e, countdown=settings.SCRATCH_RETRY_SECONDS)
+    except Exception as e:
+        print(f"Restyle of project {project_id} failed: {e}")
+
+async def prerender_styles() -> dict:
+    """
+    Idle-capacity job: renders the styles users most likely switch to next for recent
+    burned-caption clips (see services/prerender.py), one shared decode per clip, after
+    evicting old renders. Stops, killing its encode, as soon as real work is queued.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(Clip.s3_url).where(Clip.s3_url.like(f"%/{PRERENDER_PREFIX}%")))
+        referenced = {set_prefix_of(r2_service.get_key_from_url(url)) for url in result.scalars()}
+        loop = asyncio.get_running_loop()
+        stats = await loop.run_in_executor(None, tracing.bind(lambda: evict_prerenders(referenced)))
+        stats["rendered"] = 0
+        if not settings.ENABLE_PRERENDER or not queues_idle():
+            return stats
+
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.PRERENDER_RECENT_HOURS)
+        result = await db.execute(
+            select(Clip).options(selectinload(Clip.project))
+            .where(Clip.created_at >= cutoff, Clip.transcript.isnot(None), Clip.start_time.isnot(None), Clip.end_time.isnot(None))
+            .order_by(Clip.created_at.desc())
+        )
+        by_project = {}
+        for clip in result.scalars():
+            # Soft-caption clips restyle without an encode already
+            if not clip.captions and clip.project.status == ProjectStatus.COMPLETED.value:
+                by_project.setdefault(clip.project_id, []).append(clip)
+
+        alternates = {}
+        for clips in by_project.values():
+            project = clips[0].project
+            work = []
+            for clip in clips:
+                style = current_style(clip)
+                if not style:
+                    continue
+                if style["style_name"] not in alternates:
+                    alternates[style["style_name"]] = popular_alternates(style["style_name"], ffmpeg_processor.STYLES, settings.PRERENDER_STYLES_PER_CLIP)
+                signatures = {
+                    name: caption_signature(clip_transcript(clip), clip.start_time, clip.end_time, name, style["karaoke"])
+                    for name in alternates[style["style_name"]]
+                }
+                missing = {name: signature for name, signature in signatures.items() if not find_prerender(project.id, clip.id, signature)}
+                if missing:
+                    work.append((clip, style["karaoke"], missing))
+            if not work:
+                continue
+
+            source_size = r2_service.get_object_size(project.source_url) or 0
+            with workspace_manager.workspace("prerender", int(source_size * settings.SCRATCH_SIZE_FACTOR)) as workspace:
+                local_source_path = workspace.path(f"source_{project.id}.mp4")
+                await r2_service.download_file(project.source_url, local_source_path)
+                for clip, karaoke, missing in work:
+                    if stats["rendered"] >= settings.PRERENDER_MAX_CLIPS_PER_RUN or not queues_idle():
+                        print(f"Prerender run ends after {stats['rendered']} clips")
+                        return stats
+                    # Every missing style of the clip comes out of one decode
+                    segments = []
+                    for name in missing:
+                        output_path = workspace.path(f"clip_{clip.id}_{len(segments)}.mp4")
+                        segments.append({
+                            "start_time": clip.start_time, "end_time": clip.end_time,
+                            "srt_content": clip_transcript(clip), "style_name": name, "karaoke": karaoke,
+                            **rendition_paths(output_path), "captions_dir": None,
+                        })
+                    try:
+                        with tracing.span("prerender clip", **{"tandav.clip_id": str(clip.id), "prerender.styles": len(segments)}):
+                            results = await loop.run_in_executor(None, tracing.bind(lambda: ffmpeg_processor.process_segments(
+                                local_source_path, segments, has_audio=bool(project.audio_codec),
+                                should_cancel=lambda: not queues_idle()
+                            )))
+                        workspace.check_quota()
+                        for (name, signature), renditions in zip(missing.items(), results):
+                            prefix = prerender_prefix(project.id, clip.id, signature)
+                            rendition_urls = await upload_renditions(renditions, prefix + "clip")
+                            store_manifest(prefix, {
+                                "signature": signature, "style_name": name, "karaoke": karaoke,
+                                "start_time": clip.start_time, "end_time": clip.end_time, "renditions": rendition_urls,
+                            })
+                        stats["rendered"] += 1
+                        print(f"Prerendered {', '.join(missing)} for clip {clip.id}")
+                    except RenderCancelled:
+                        print(f"Prerender of clip {clip.id} stopped: work arrived in the render queue")
+                        return stats
+                    except Exception as e:
+                        print(f"Prerender of clip {clip.id} failed: {e}")
+                    finally:
+                        for segment in segments:
+                            remove_renditions(segment)
+        return stats
+
+@celery_app.task(name="services.processor.prerender_styles_task")
+def prerender_styles_task():
+    """
+    Periodic: speculative style renders on idle capacity, one run at a time.
+    """
+    if not acquire_run_lock():
+        return None
+    try:
+        stats = asyncio.run(prerender_styles())
+        print(f"Prerender run: {stats}")
+        return stats
+    except InsufficientDisk as e:
+        print(f"Skipping prerender run: {e}")
+    except Exception as e:
+        print(f"Prerender run failed: {e}")
+    finally:
+        release_run_lock()
@@ -0,0 +1,158 @@
+import collections
+import io
+import os
+import socket
+import sys
+import threading
+import time
+from config import settings
+from services.redis_client import get_async_redis, get_redis
+
+# A project's next worker task is profiled while this key exists (see arm_project)
+PROFILE_ARMED_KEY = "profile:armed:{project_id}"
+PROFILE_PREFIX = "profiles"
+
+class SamplingProfiler:
+    """
+    Wall-clock sampling profiler for the whole process: a background thread records
+    every other thread's Python stack each interval. The result is in folded-stack
+    format ("thread;outer;...;inner count" per line), which flamegraph.pl, speedscope
+    and inferno read directly. Waiting counts too (event loop idle, executor joins),
+    so the profile shows where wall time goes, not just CPU.
+    """
+    def __init__(self, interval: float = None):
+        self.interval = interval or settings.PROFILE_SAMPLE_INTERVAL_MS / 1000
+        self.counts = collections.Counter()
+        self.samples = 0
+        self.started_at = None
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration = time.monotonic() - self.started_at
+        return self.folded()
+
+    def _run(self):
+        own = threading.get_ident()
+        labels = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if frames.keys() - labels.keys():
+                labels = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(labels.get(ident, f"thread-{ident}"))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+def profile_key(scope: str, kind: str) -> str:
+    """
+    R2 key for a profile: profiles/<project id or "api">/<kind>_<UTC time>_<host>-<pid>.folded
+    """
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    return f"{PROFILE_PREFIX}/{scope}/{kind}_{stamp}_{socket.gethostname()}-{os.getpid()}.folded"
+
+def _header(profiler: SamplingProfiler, label: str) -> str:
+    # Comment lines are skipped by flamegraph.pl and speedscope
+    return f"# {label}: {profiler.samples} samples over {profiler.duration:.1f}s every {profiler.interval * 1000:.0f}ms\n"
+
+async def profile_api(seconds: float) -> tuple[str, str]:
+    """
+    Samples this API process for `seconds` while it keeps serving, uploads the
+    profile to R2 and returns (key, folded text). With several uvicorn workers only
+    the one handling this request is profiled.
+    """
+    import asyncio
+    from services.r2 import r2_service
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        folded = profiler.stop()
+    text = _header(profiler, "api") + folded
+    key = profile_key("api", "api")
+    await r2_service.upload_file(io.BytesIO(text.encode("utf-8")), key, "text/plain")
+    return key, text
+
+async def arm_project(project_id: str) -> bool:
+    """
+    Profiles the next process_video/burn task that runs for the project (one run).
+    """
+    try:
+        await get_async_redis().set(PROFILE_ARMED_KEY.format(project_id=project_id), 1, ex=settings.PROFILE_ARM_TTL_SECONDS)
+        return True
+    except Exception as e:
+        print(f"Could not arm profiling for project {project_id}: {e}")
+        return False
+
+def _take_armed(project_id: str) -> bool:
+    try:
+        return bool(get_redis().delete(PROFILE_ARMED_KEY.format(project_id=project_id)))
+    except Exception:
+        return False
+
+class TaskProfile:
+    """
+    Opt-in profile of one worker task run, stored next to the project in R2:
+
+        with TaskProfile("burn", force=profile) as task_profile:
+            ...
+            task_profile.attach(project.id)  # starts sampling if forced or armed
+
+    Sampling starts at attach(), once the task knows its project, and covers the
+    rest of the run including its executor threads.
+    """
+    def __init__(self, kind: str, force: bool = False):
+        self.kind = kind
+        self.force = force
+        self.project_id = None
+        self.profiler = None
+
+    def __enter__(self):
+        return self
+
+    def attach(self, project_id):
+        if self.profiler is not None:
+            return
+        self.project_id = str(project_id)
+        if self.force or _take_armed(self.project_id):
+            self.profiler = SamplingProfiler()
+            self.profiler.start()
+            print(f"Profiling {self.kind} task of project {self.project_id}")
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is None:
+            return False
+        folded = self.profiler.stop()
+        outcome = "failed" if exc_type else "ok"
+        text = _header(self.profiler, f"{self.kind} task of project {self.project_id} ({outcome})") + folded
+        try:
+            from services.r2 import r2_service
+            key = profile_key(self.project_id, self.kind)
+            r2_service.s3_client.put_object(
+                Bucket=r2_service.bucket_name, Key=key, Body=text.encode("utf-8"), ContentType="text/plain"
+            )
+            print(f"Stored {self.kind} profile of project {self.project_id} at {key}")
+        except Exception as e:
+            print(f"Could not store {self.kind} profile of project {self.project_id}: {e}")
+        return False
@@ -1,20 +1,39 @@
-import boto3
-from botocore.config import Config
 from config import settings
+from services import tracing
+import threading
 import uuid
 
 class R2Service:
     def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=f"https://{settings.R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
-            aws_access_key_id=settings.R2_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.R2_SECRET_ACCESS_KEY,
-            config=Config(signature_version='s3v4'),
-            region_name='auto' # R2 requires a region, 'auto' is usually fine or 'us-east-1'
-        )
+        # The boto3 client is built on first use: importing boto3 and creating a
+        # client costs hundreds of ms, which every API cold start would otherwise pay
+        self._s3_client = None
+        self._client_lock = threading.Lock()
         self.bucket_name = settings.R2_BUCKET_NAME
 
+    @property
+    def s3_client(self):
+        if self._s3_client is None:
+            with self._client_lock:
+                if self._s3_client is None:
+                    import boto3
+                    from botocore.config import Config
+                    self._s3_client = boto3.client(
+                        's3',
+                        endpoint_url=f"https://{settings.R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
+                        aws_access_key_id=settings.R2_ACCESS_KEY_ID,
+                        aws_secret_access_key=settings.R2_SECRET_ACCESS_KEY,
+                        config=Config(signature_version='s3v4'),
+                        region_name='auto' # R2 requires a region, 'auto' is usually fine or 'us-east-1'
+                    )
+                    tracing.instrument_boto_client(self._s3_client)
+        return self._s3_client
+
+    @s3_client.setter
+    def s3_client(self, client):
+        # Lets scripts and benchmarks swap in a stand-in client
+        self._s3_client = client
+
     def generate_presigned_url(self, filename: str, content_type: str) -> dict:
         """
         Generates a presigned URL for uploading a file to R2.
@@ -41,6 +60,90 @@ class R2Service:
             print(f"Error generating presigned URL: {e}")
             raise e
 
+    def create_multipart_upload(self, filename: str, content_type: str) -> dict:
+        """
+        Starts a multipart upload and returns its R2 upload id and object key.
+        """
+        object_name = f"{uuid.uuid4()}/{filename}"
+        response = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_name,
+            ContentType=content_type
+        )
+        return {"upload_id": response["UploadId"], "s3_key": object_name}
+
+    def presign_upload_parts(self, s3_key: str, upload_id: str, part_numbers: list[int], expiration: int = 3600) -> dict:
+        """
+        Returns a presigned PUT URL per part number.
+        """
+        return {
+            part_number: self.s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': self.bucket_name,
+                    'Key': s3_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number
+                },
+                ExpiresIn=expiration
+            )
+            for part_number in part_numbers
+        }
+
+    def list_uploaded_parts(self, s3_key: str, upload_id: str) -> list[dict]:
+        """
+        Returns the parts R2 has received so far ({PartNumber, ETag, Size}), in order.
+        """
+        parts = []
+        paginator = self.s3_client.get_paginator('list_parts')
+        for page in paginator.paginate(Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id):
+            parts.extend(
+                {"PartNumber": part["PartNumber"], "ETag": part["ETag"], "Size": part["Size"]}
+                for part in page.get('Parts', [])
+            )
+        return sorted(parts, key=lambda part: part["PartNumber"])
+
+    def complete_multipart_upload(self, s3_key: str, upload_id: str, parts: list[dict]):
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': [{"PartNumber": p["PartNumber"], "ETag": p["ETag"]} for p in parts]}
+        )
+
+    def upload_part(self, s3_key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+        """
+        Uploads one part server-side and returns it as {PartNumber, ETag} for completion.
+        """
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=body
+        )
+        return {"PartNumber": part_number, "ETag": response["ETag"]}
+
+    def abort_multipart_upload(self, s3_key: str, upload_id: str):
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=s3_key, UploadId=upload_id)
+        except Exception as e:
+            # Already completed/aborted uploads are gone; nothing left to free
+            print(f"Error aborting multipart upload {upload_id} for {s3_key}: {e}")
+
+    def list_multipart_uploads(self) -> list[dict]:
+        """
+        Lists every in-progress multipart upload in the bucket ({Key, UploadId, Initiated}).
+        """
+        uploads = []
+        paginator = self.s3_client.get_paginator('list_multipart_uploads')
+        for page in paginator.paginate(Bucket=self.bucket_name):
+            uploads.extend(
+                {"Key": upload["Key"], "UploadId": upload["UploadId"], "Initiated": upload["Initiated"]}
+                for upload in page.get('Uploads', [])
+            )
+        return uploads
+
     def generate_presigned_get_url(self, s3_key: str, expiration: int = 3600) -> str:
         """
         Generates a presigned URL for downloading/viewing a file.
@@ -73,6 +176,49 @@ class R2Service:
              # Fallback or internal use
              return f"https://{settings.R2_ACCOUNT_ID}.r2.cloudflarestorage.com/{self.bucket_name}/{s3_key}"
 
+    def get_object_size(self, s3_key: str) -> int:
+        """
+        Returns the size of an object in bytes (None if it cannot be determined).
+        """
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)["ContentLength"]
+        except Exception as e:
+            print(f"Error reading size of {s3_key}: {e}")
+            return None
+
+    def iter_object(self, s3_key: str, size: int, range_size: int = 8 * 1024 * 1024, chunk_size: int = 256 * 1024, retries: int = 3):
+        """
+        Yields an object's bytes through sequential ranged GETs, holding one chunk
+        in memory at a time. A dropped connection resumes from the last byte
+        received instead of restarting the object.
+        """
+        position = 0
+        failures = 0
+        while position < size:
+            end = min(position + range_size, size) - 1
+            try:
+                body = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key, Range=f"bytes={position}-{end}")["Body"]
+                for chunk in body.iter_chunks(chunk_size):
+                    position += len(chunk)
+                    yield chunk
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures > retries:
+                    raise
+                print(f"Ranged read of {s3_key} failed at byte {position} (attempt {failures}/{retries}): {e}")
+
+    def get_key_from_url(self, url: str) -> str:
+        """
+        Extracts the object key from a stored public URL.
+        Clip renditions are stored under "clips/", so everything from there on is the key.
+        """
+        parts = url.split('/')
+        if "clips" in parts:
+            index = parts.index("clips")
+            return "/".join(parts[index:])
+        return parts[-1]
+
     def cleanup_files(self, retention_hours: int = 24) -> int:
         """
         Deletes files older than the specified retention period.
@@ -123,6 +269,25 @@ class R2Service:
         except Exception as e:
             print(f"Error deleting file {s3_key}: {e}")
 
+    def delete_prefix(self, prefix: str) -> int:
+        """
+        Deletes every object under a key prefix (e.g. an HLS rendition directory).
+        Returns the number of objects deleted.
+        """
+        deleted_count = 0
+        try:
+            paginator = self.s3_client.get_paginator('list_objects_v2')
+            for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+                if 'Contents' not in page:
+                    continue
+                batch = [{'Key': obj['Key']} for obj in page['Contents']]
+                self.s3_client.delete_objects(Bucket=self.bucket_name, Delete={'Objects': batch})
+                deleted_count += len(batch)
+            print(f"Deleted {deleted_count} files under {prefix} from R2")
+        except Exception as e:
+            print(f"Error deleting prefix {prefix}: {e}")
+        return deleted_count
+
     async def upload_file(self, file_obj, s3_key: str, content_type: str = "video/mp4"):
         """
         Uploads a file-like object to R2.
@@ -130,12 +295,13 @@ class R2Service:
         try:
             import asyncio
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, lambda: self.s3_client.upload_fileobj(
-                file_obj, 
-                self.bucket_name, 
-                s3_key,
-                ExtraArgs={'ContentType': content_type}
-            ))
+            with tracing.span("r2 upload", **{"r2.key": s3_key}):
+                await loop.run_in_executor(None, tracing.bind(lambda: self.s3_client.upload_fileobj(
+                    file_obj, 
+                    self.bucket_name, 
+                    s3_key,
+                    ExtraArgs={'ContentType': content_type}
+                )))
             print(f"Uploaded {s3_key} to R2")
         except Exception as e:
             print(f"Error uploading file {s3_key}: {e}")
@@ -173,7 +339,8 @@ class R2Service:
             # Run blocking download in threadpool
             import asyncio
             loop = asyncio.get_event_loop()
-            await loop.run_in_executor(None, lambda: self.s3_client.download_file(self.bucket_name, key, local_path))
+            with tracing.span("r2 download", **{"r2.key": key}):
+                await loop.run_in_executor(None, tracing.bind(lambda: self.s3_client.download_file(self.bucket_name, key, local_path)))
             print(f"Downloaded {key} to {local_path}")
         except Exception as e:
             print(f"Error downloading file {s3_key}: {e}")
@@ -0,0 +1,53 @@
+# Token bucket kept in a Redis hash, refilled lazily on every call.
+# Uses the Redis server clock so every API/worker process agrees on time.
+TOKEN_BUCKET_LUA = """
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', key, 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', key, math.ceil(capacity / rate) + 60)
+return {allowed, tostring(retry_after)}
+"""
+
+class TokenBucket:
+    """
+    A Redis-backed token bucket shared by every process.
+    capacity is the burst size, refill_per_second the sustained rate.
+    """
+    def __init__(self, name: str, capacity: float, refill_per_second: float):
+        self.name = name
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+
+    def key(self, subject: str) -> str:
+        return f"ratelimit:{self.name}:{subject}"
+
+    def consume(self, client, subject: str, cost: float = 1) -> tuple[bool, float]:
+        """
+        Takes cost tokens using a synchronous client.
+        Returns (allowed, seconds until enough tokens are available).
+        """
+        allowed, retry_after = client.eval(TOKEN_BUCKET_LUA, 1, self.key(subject), self.capacity, self.refill_per_second, cost)
+        return bool(int(allowed)), float(retry_after)
+
+    async def consume_async(self, client, subject: str, cost: float = 1) -> tuple[bool, float]:
+        """
+        Same as consume, for redis.asyncio clients.
+        """
+        allowed, retry_after = await client.eval(TOKEN_BUCKET_LUA, 1, self.key(subject), self.capacity, self.refill_per_second, cost)
+        return bool(int(allowed)), float(retry_after)
@@ -0,0 +1,90 @@
+import gzip
+import brotli
+import orjson
+from config import settings
+from services.redis_client import get_async_redis, get_redis
+
+# Per-user dashboard read model: the serialized /projects response, pre-compressed.
+# Every write that changes a user's dashboard bumps their version; a cached body is
+# only served if it was built at the current version, so a build racing with a write
+# can never resurrect stale data.
+DASHBOARD_KEY = "dashboard:{user_id}"
+DASHBOARD_VERSION_KEY = "dashboard:version:{user_id}"
+
+# Encodings in order of preference when the client accepts several
+ENCODINGS = ("br", "gzip")
+
+def preferred_encoding(accept_encoding: str) -> str:
+    accepted = {part.split(";")[0].strip().lower() for part in (accept_encoding or "").split(",")}
+    return next((encoding for encoding in ENCODINGS if encoding in accepted), None)
+
+def serialize(payload) -> dict:
+    """
+    Encodes a JSON-ready payload once and returns it in every supported encoding.
+    """
+    body = orjson.dumps(payload)
+    return {
+        "identity": body,
+        "gzip": gzip.compress(body, compresslevel=6),
+        "br": brotli.compress(body, quality=5),
+    }
+
+async def get_dashboard_version(user_id: str) -> int:
+    client = get_async_redis()
+    return int(await client.get(DASHBOARD_VERSION_KEY.format(user_id=user_id)) or 0)
+
+async def get_cached_dashboard(user_id: str, accept_encoding: str = None) -> tuple:
+    """
+    Returns (body, content_encoding) for the user's cached dashboard, or None on a miss.
+    content_encoding is None for an uncompressed body.
+    """
+    if not settings.ENABLE_DASHBOARD_CACHE:
+        return None
+    try:
+        client = get_async_redis()
+        encoding = preferred_encoding(accept_encoding)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.hmget(DASHBOARD_KEY.format(user_id=user_id), "version", encoding or "identity")
+            pipe.get(DASHBOARD_VERSION_KEY.format(user_id=user_id))
+            (version, body), current = await pipe.execute()
+        if body is None or int(version or -1) != int(current or 0):
+            return None
+        return body, encoding
+    except Exception as e:
+        print(f"Dashboard cache unavailable: {e}")
+        return None
+
+async def store_dashboard(user_id: str, version: int, bodies: dict):
+    """
+    Caches a freshly built dashboard, tagged with the version it was built at.
+    """
+    if not settings.ENABLE_DASHBOARD_CACHE:
+        return
+    try:
+        client = get_async_redis()
+        key = DASHBOARD_KEY.format(user_id=user_id)
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"version": version, **bodies})
+            # Presigned URLs are baked in, so the entry must expire well before they do
+            pipe.expire(key, settings.DASHBOARD_CACHE_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Could not cache dashboard for {user_id}: {e}")
+
+def invalidate_dashboard(user_id: str):
+    """
+    Marks a user's dashboard as stale (sync, for Celery tasks).
+    """
+    try:
+        get_redis().incr(DASHBOARD_VERSION_KEY.format(user_id=user_id))
+    except Exception as e:
+        print(f"Could not invalidate dashboard for {user_id}: {e}")
+
+async def invalidate_dashboard_async(user_id: str):
+    """
+    Marks a user's dashboard as stale (async, for API endpoints).
+    """
+    try:
+        await get_async_redis().incr(DASHBOARD_VERSION_KEY.format(user_id=user_id))
+    except Exception as e:
+        print(f"Could not invalidate dashboard for {user_id}: {e}")
@@ -0,0 +1,26 @@
+import redis
+import redis.asyncio as aioredis
+from config import settings
+
+_redis = None
+_async_redis = None
+
+def get_redis() -> redis.Redis:
+    """
+    Returns the shared synchronous Redis client (Celery workers, scripts).
+    Created on first use.
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=5)
+    return _redis
+
+def get_async_redis() -> aioredis.Redis:
+    """
+    Returns the shared asyncio Redis client for the API process.
+    Created on first use, inside the running event loop.
+    """
+    global _async_redis
+    if _async_redis is None:
+        _async_redis = aioredis.Redis.from_url(settings.REDIS_URL, socket_timeout=5)
+    return _async_redis
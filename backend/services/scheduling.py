@@ -0,0 +1,254 @@
+import json
+import time
+from config import settings
+from services.redis_client import get_redis
+from services import tracing
+
+# Fair, cost-aware dispatch of process_video jobs in front of Celery.
+#
+# Policy (start-time fair queuing with a shortest-job window):
+# - each job gets an expected cost in worker-seconds from CostModel
+# - a user's jobs get virtual start/finish tags: start = max(V, user's last finish),
+#   finish = start + cost / weight, so a user with 40 queued videos is charged for
+#   all of them and a newcomer's first job lands near the front
+# - dispatch considers every job whose finish tag is within FAIRNESS_SLACK of the
+#   smallest one and picks the cheapest: shortest-expected-job-first, but never
+#   overtaking more than the slack allows
+# - Celery only ever holds MAX_IN_FLIGHT dispatched jobs, so ordering decisions are
+#   made here rather than in the broker's FIFO list
+FAIR_QUEUE_KEY = "sched:queue"
+FAIR_JOBS_KEY = "sched:jobs"
+FAIR_USER_FINISH_KEY = "sched:user_finish"
+FAIR_VIRTUAL_TIME_KEY = "sched:virtual_time"
+FAIR_IN_FLIGHT_KEY = "sched:in_flight"
+TIMINGS_KEY = "sched:timings"
+COST_MODEL_KEY = "sched:cost_model"
+
+MAX_TIMING_SAMPLES = 1000
+MIN_FIT_SAMPLES = 10
+DISPATCH_WINDOW = 50
+
+class CostModel:
+    """
+    Expected worker seconds for a job: a + b * duration + c * duration * megapixels,
+    fitted by least squares on recorded job timings (see record_job_timing).
+    """
+    DEFAULT_COEFFICIENTS = (20.0, 1.5, 0.5)
+
+    def __init__(self, coefficients: tuple = None, samples: int = 0):
+        self.coefficients = tuple(coefficients or self.DEFAULT_COEFFICIENTS)
+        self.samples = samples
+
+    @staticmethod
+    def features(duration: float, width: int = None, height: int = None) -> list[float]:
+        megapixels = (width or 1920) * (height or 1080) / 1e6
+        duration = duration or 60.0
+        return [1.0, duration, duration * megapixels]
+
+    def predict(self, duration: float, width: int = None, height: int = None) -> float:
+        x = self.features(duration, width, height)
+        return max(1.0, sum(c * v for c, v in zip(self.coefficients, x)))
+
+    @classmethod
+    def fit(cls, samples: list[dict], ridge: float = 1e-3) -> "CostModel":
+        """
+        Ordinary least squares (with a tiny ridge for stability) over samples of
+        {"duration", "width", "height", "seconds"}. Falls back to the defaults
+        until there is enough history.
+        """
+        if len(samples) < MIN_FIT_SAMPLES:
+            return cls(samples=len(samples))
+
+        n = len(cls.DEFAULT_COEFFICIENTS)
+        xtx = [[ridge if i == j else 0.0 for j in range(n)] for i in range(n)]
+        xty = [0.0] * n
+        for sample in samples:
+            x = cls.features(sample.get("duration"), sample.get("width"), sample.get("height"))
+            for i in range(n):
+                xty[i] += x[i] * sample["seconds"]
+                for j in range(n):
+                    xtx[i][j] += x[i] * x[j]
+
+        # Gauss-Jordan elimination on the 3x3 normal equations
+        matrix = [row + [value] for row, value in zip(xtx, xty)]
+        for col in range(n):
+            pivot = max(range(col, n), key=lambda r: abs(matrix[r][col]))
+            if abs(matrix[pivot][col]) < 1e-12:
+                return cls(samples=len(samples))
+            matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+            for r in range(n):
+                if r != col:
+                    factor = matrix[r][col] / matrix[col][col]
+                    matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+        return cls(tuple(matrix[i][n] / matrix[i][i] for i in range(n)), samples=len(samples))
+
+    def to_dict(self) -> dict:
+        return {"coefficients": list(self.coefficients), "samples": self.samples}
+
+class FairQueue:
+    """
+    In-memory implementation of the scheduling policy above. RedisFairQueue runs
+    the same rules atomically in Redis; this one backs the simulation benchmark.
+    """
+    def __init__(self, fairness_slack: float):
+        self.fairness_slack = fairness_slack
+        self.virtual_time = 0.0
+        self.user_finish = {}
+        self.jobs = {}
+
+    def enqueue(self, job_id: str, user_id: str, cost: float, weight: float = 1.0, payload: dict = None):
+        start = max(self.virtual_time, self.user_finish.get(user_id, 0.0))
+        finish = start + cost / weight
+        self.user_finish[user_id] = finish
+        self.jobs[job_id] = {"id": job_id, "user": user_id, "cost": cost, "start": start, "finish": finish, "payload": payload}
+
+    def dispatch(self) -> dict:
+        if not self.jobs:
+            return None
+        ordered = sorted(self.jobs.values(), key=lambda job: job["finish"])[:DISPATCH_WINDOW]
+        limit = ordered[0]["finish"] + self.fairness_slack
+        job = min((job for job in ordered if job["finish"] <= limit), key=lambda job: job["cost"])
+        del self.jobs[job["id"]]
+        self.virtual_time = max(self.virtual_time, job["start"])
+        return job
+
+    def __len__(self):
+        return len(self.jobs)
+
+FAIR_ENQUEUE_LUA = """
+local virtual_time = tonumber(redis.call('GET', KEYS[4]) or '0')
+local last_finish = tonumber(redis.call('HGET', KEYS[3], ARGV[2]) or '0')
+local cost = tonumber(ARGV[3])
+local start = math.max(virtual_time, last_finish)
+local finish = start + cost / tonumber(ARGV[4])
+redis.call('HSET', KEYS[3], ARGV[2], tostring(finish))
+redis.call('HSET', KEYS[2], ARGV[1], cjson.encode({
+    id = ARGV[1], user = ARGV[2], cost = cost, start = start, finish = finish, payload = cjson.decode(ARGV[5])
+}))
+redis.call('ZADD', KEYS[1], finish, ARGV[1])
+return tostring(finish)
+"""
+
+FAIR_DISPATCH_LUA = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[4], '-inf', now - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[4]) >= tonumber(ARGV[1]) then
+    return nil
+end
+local head = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #head == 0 then
+    return nil
+end
+local limit = tonumber(head[2]) + tonumber(ARGV[3])
+local candidates = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', limit, 'LIMIT', 0, tonumber(ARGV[4]))
+local best, best_raw, best_cost = nil, nil, nil
+for _, id in ipairs(candidates) do
+    local raw = redis.call('HGET', KEYS[2], id)
+    if raw then
+        local job = cjson.decode(raw)
+        if best_cost == nil or job.cost < best_cost then
+            best, best_raw, best_cost = job, raw, job.cost
+        end
+    else
+        redis.call('ZREM', KEYS[1], id)
+    end
+end
+if best == nil then
+    return nil
+end
+redis.call('ZREM', KEYS[1], best.id)
+redis.call('HDEL', KEYS[2], best.id)
+local virtual_time = tonumber(redis.call('GET', KEYS[3]) or '0')
+redis.call('SET', KEYS[3], tostring(math.max(virtual_time, best.start)))
+redis.call('ZADD', KEYS[4], now, best.id)
+return best_raw
+"""
+
+class RedisFairQueue:
+    """
+    The FairQueue policy with its state in Redis, shared by API and workers.
+    """
+    def enqueue(self, job_id: str, user_id: str, cost: float, weight: float = 1.0, payload: dict = None) -> float:
+        finish = get_redis().eval(
+            FAIR_ENQUEUE_LUA, 4,
+            FAIR_QUEUE_KEY, FAIR_JOBS_KEY, FAIR_USER_FINISH_KEY, FAIR_VIRTUAL_TIME_KEY,
+            job_id, user_id, cost, weight, json.dumps(payload or {})
+        )
+        return float(finish)
+
+    def dispatch(self) -> dict:
+        """
+        Pops the next job if fewer than SCHEDULER_MAX_IN_FLIGHT are running,
+        and marks it in flight. Returns None if nothing can be dispatched.
+        """
+        raw = get_redis().eval(
+            FAIR_DISPATCH_LUA, 4,
+            FAIR_QUEUE_KEY, FAIR_JOBS_KEY, FAIR_VIRTUAL_TIME_KEY, FAIR_IN_FLIGHT_KEY,
+            settings.SCHEDULER_MAX_IN_FLIGHT, settings.SCHEDULER_STALE_SECONDS,
+            settings.SCHEDULER_FAIRNESS_SLACK_SECONDS, DISPATCH_WINDOW
+        )
+        return json.loads(raw) if raw else None
+
+    def release(self, job_id: str):
+        get_redis().zrem(FAIR_IN_FLIGHT_KEY, job_id)
+
+fair_queue = RedisFairQueue()
+
+def dispatch_jobs() -> int:
+    """
+    Sends as many queued jobs to Celery as there are free in-flight slots.
+    Called after enqueueing, when a job finishes, and periodically by beat.
+    """
+    from celery_app import celery_app
+
+    dispatched = 0
+    try:
+        while True:
+            job = fair_queue.dispatch()
+            if not job:
+                break
+            # The job's trace continues from the request that scheduled it
+            with tracing.resume(job["payload"].get("trace"), "fair queue wait"):
+                celery_app.send_task("services.processor.process_video_task", args=[job["payload"]["project_id"]])
+            dispatched += 1
+            print(f"Dispatched project {job['payload']['project_id']} (user {job['user']}, expected {job['cost']:.0f}s)")
+    except Exception as e:
+        print(f"Job dispatch failed: {e}")
+    return dispatched
+
+_cost_model_cache = {"model": None, "loaded_at": 0.0}
+
+def load_cost_model(max_age: float = 60.0) -> CostModel:
+    """
+    Returns the most recently fitted cost model (cached in-process for max_age seconds).
+    """
+    if _cost_model_cache["model"] and time.monotonic() - _cost_model_cache["loaded_at"] < max_age:
+        return _cost_model_cache["model"]
+    model = CostModel()
+    try:
+        raw = get_redis().get(COST_MODEL_KEY)
+        if raw:
+            data = json.loads(raw)
+            model = CostModel(tuple(data["coefficients"]), samples=data.get("samples", 0))
+    except Exception as e:
+        print(f"Could not load cost model, using defaults: {e}")
+    _cost_model_cache.update(model=model, loaded_at=time.monotonic())
+    return model
+
+def record_job_timing(sample: dict):
+    """
+    Stores a finished job's timings ({"duration", "width", "height", "seconds", "stages"})
+    and refits the cost model on the recent history.
+    """
+    try:
+        client = get_redis()
+        with client.pipeline(transaction=False) as pipe:
+            pipe.lpush(TIMINGS_KEY, json.dumps(sample))
+            pipe.ltrim(TIMINGS_KEY, 0, MAX_TIMING_SAMPLES - 1)
+            pipe.lrange(TIMINGS_KEY, 0, -1)
+            _, _, raw_samples = pipe.execute()
+        model = CostModel.fit([json.loads(raw) for raw in raw_samples])
+        client.set(COST_MODEL_KEY, json.dumps(model.to_dict()))
+    except Exception as e:
+        print(f"Could not record job timing: {e}")
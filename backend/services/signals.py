@@ -0,0 +1,184 @@
+import bisect
+import os
+import tempfile
+import ffmpeg
+import numpy as np
+
+# Decode targets: tiny grey frames for shot detection, low-rate mono audio for level analysis
+LUMA_FPS = 5
+LUMA_WIDTH = 64
+LUMA_HEIGHT = 36
+AUDIO_RATE = 8000
+
+# Scene cuts: mean absolute luma change between frames, relative to the source's own variance
+SCENE_MIN_DIFF = 12.0
+SCENE_STD_FACTOR = 3.0
+SCENE_MIN_GAP = 0.5
+
+# Silence: 50ms windows below SILENCE_DB for at least SILENCE_MIN_SECONDS
+LEVEL_WINDOW = 0.05
+SILENCE_DB = -40.0
+SILENCE_MIN_SECONDS = 0.3
+
+# Loudness envelope persisted on Project, one value per ENVELOPE_WINDOW
+ENVELOPE_WINDOW = 0.5
+
+# Boundary snapping: how far a Gemini timestamp may move, and how much of a pause to keep
+SNAP_MAX_SHIFT = 1.5
+SNAP_SILENCE_PAD = 0.1
+
+def _decode(path: str, work_dir: str) -> tuple[str, str]:
+    """
+    Decodes luma and audio in a single ffmpeg pass into two raw files.
+    """
+    luma_path = os.path.join(work_dir, "luma.raw")
+    audio_path = os.path.join(work_dir, "audio.raw")
+    source = ffmpeg.input(path)
+    luma = (
+        source.video
+        .filter('fps', LUMA_FPS)
+        .filter('scale', LUMA_WIDTH, LUMA_HEIGHT)
+        .filter('format', 'gray')
+        .output(luma_path, f='rawvideo')
+    )
+    audio = source['a?'].output(audio_path, f='s16le', ac=1, ar=AUDIO_RATE)
+    ffmpeg.merge_outputs(luma, audio).overwrite_output().run(quiet=True)
+    return luma_path, audio_path
+
+def detect_scene_cuts(frames: np.ndarray, fps: float = LUMA_FPS) -> list[float]:
+    """
+    Returns shot-change timestamps from (n, pixels) luma frames.
+    """
+    if len(frames) < 2:
+        return []
+    diff = np.abs(np.diff(frames.astype(np.int16), axis=0)).mean(axis=1)
+    threshold = max(SCENE_MIN_DIFF, float(diff.mean() + SCENE_STD_FACTOR * diff.std()))
+    times = (np.nonzero(diff > threshold)[0] + 1) / fps
+
+    cuts = []
+    for t in times:
+        # Flashes and fast pans trigger several frames in a row; keep the first
+        if not cuts or t - cuts[-1] >= SCENE_MIN_GAP:
+            cuts.append(round(float(t), 2))
+    return cuts
+
+def level_db(samples: np.ndarray, rate: int = AUDIO_RATE, window: float = LEVEL_WINDOW) -> np.ndarray:
+    """
+    RMS level in dBFS per window of float samples in [-1, 1].
+    """
+    size = int(rate * window)
+    count = len(samples) // size
+    if not count:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:count * size].reshape(count, size)
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-5))
+
+def detect_silences(levels: np.ndarray, window: float = LEVEL_WINDOW) -> list[list[float]]:
+    """
+    Returns [start, end] ranges where the level stays below SILENCE_DB.
+    """
+    quiet = np.concatenate(([0], (levels < SILENCE_DB).astype(np.int8), [0]))
+    edges = np.diff(quiet)
+    starts = np.nonzero(edges == 1)[0]
+    ends = np.nonzero(edges == -1)[0]
+    min_windows = SILENCE_MIN_SECONDS / window
+    return [
+        [round(float(s * window), 2), round(float(e * window), 2)]
+        for s, e in zip(starts, ends) if e - s >= min_windows
+    ]
+
+def loudness_envelope(levels: np.ndarray, window: float = LEVEL_WINDOW) -> list[float]:
+    """
+    Downsamples window levels to ENVELOPE_WINDOW by averaging power, in dB.
+    """
+    group = max(1, int(round(ENVELOPE_WINDOW / window)))
+    count = len(levels) // group
+    if not count:
+        return []
+    power = 10 ** (levels[:count * group].reshape(count, group) / 10)
+    return np.round(10 * np.log10(power.mean(axis=1)), 1).tolist()
+
+def analyze_signals(path: str, work_dir: str = None) -> dict:
+    """
+    Computes scene cuts, a silence map and a loudness envelope for a source in
+    one decode pass. The result is stored on Project.signals.
+    The raw decodes are written to work_dir (a temporary directory if not given).
+    """
+    with tempfile.TemporaryDirectory(prefix="tandav_signals_", dir=work_dir) as decode_dir:
+        luma_path, audio_path = _decode(path, decode_dir)
+
+        pixels = LUMA_WIDTH * LUMA_HEIGHT
+        luma = np.fromfile(luma_path, dtype=np.uint8)
+        frames = luma[:len(luma) // pixels * pixels].reshape(-1, pixels)
+
+        if os.path.exists(audio_path):
+            samples = np.fromfile(audio_path, dtype='<i2').astype(np.float32) / 32768.0
+        else:
+            samples = np.zeros(0, dtype=np.float32)
+
+    levels = level_db(samples)
+    return {
+        "scene_cuts": detect_scene_cuts(frames),
+        "silences": detect_silences(levels),
+        "envelope_window": ENVELOPE_WINDOW,
+        "loudness": loudness_envelope(levels),
+    }
+
+def snap_boundary(t: float, signals: dict, edge: str, max_shift: float = SNAP_MAX_SHIFT) -> float:
+    """
+    Moves a segment boundary to the nearest natural cut within max_shift seconds:
+    a scene cut, or the edge of a pause (a start lands just before speech resumes,
+    an end just after it stops). Returns t unchanged if nothing is close enough.
+    """
+    if not signals:
+        return t
+    candidates = list(signals.get("scene_cuts") or [])
+    for start, end in signals.get("silences") or []:
+        if edge == "start":
+            candidates.append(max(start, end - SNAP_SILENCE_PAD))
+        else:
+            candidates.append(min(end, start + SNAP_SILENCE_PAD))
+
+    nearby = [c for c in candidates if abs(c - t) <= max_shift]
+    return min(nearby, key=lambda c: abs(c - t)) if nearby else t
+
+def candidate_windows(signals: dict, duration: float, min_length: float = 15.0, max_length: float = 60.0, limit: int = 12) -> list[tuple[float, float]]:
+    """
+    Proposes non-overlapping windows that start and end on natural cuts, ranked by
+    speech energy (mean loudness, penalised for silence). Used as a compact hint
+    list for Gemini so it does not have to search the whole timeline.
+    """
+    if not signals or not signals.get("loudness"):
+        return []
+
+    points = sorted({0.0, round(duration, 2), *signals.get("scene_cuts", []),
+                     *((s + e) / 2 for s, e in signals.get("silences", []))})
+    window = signals.get("envelope_window", ENVELOPE_WINDOW)
+    power = 10 ** (np.asarray(signals["loudness"], dtype=np.float64) / 10)
+    cumulative = np.concatenate(([0.0], np.cumsum(power)))
+
+    def score(start: float, end: float) -> float:
+        a, b = int(start / window), max(int(start / window) + 1, int(end / window))
+        b = min(b, len(power))
+        if b <= a:
+            return float("-inf")
+        mean_db = 10 * np.log10((cumulative[b] - cumulative[a]) / (b - a))
+        silent = sum(max(0.0, min(e, end) - max(s, start)) for s, e in signals.get("silences", []))
+        return float(mean_db) - 20 * silent / (end - start)
+
+    ranked = []
+    for i, start in enumerate(points):
+        lo = bisect.bisect_left(points, start + min_length, i + 1)
+        hi = bisect.bisect_right(points, start + max_length, lo)
+        best = max(((score(start, end), end) for end in points[lo:hi]), default=None)
+        if best:
+            ranked.append((best[0], start, best[1]))
+
+    chosen = []
+    for _, start, end in sorted(ranked, reverse=True):
+        if all(end <= s or start >= e for s, e in chosen):
+            chosen.append((start, end))
+            if len(chosen) >= limit:
+                break
+    return sorted(chosen)
@@ -0,0 +1,355 @@
+import hashlib
+import os
+import re
+import shutil
+from dataclasses import dataclass
+from functools import lru_cache
+from services.timecode import format_ass_time, format_srt_time, format_vtt_time
+from services.workspace import workspace_manager
+
+# Matches "HH:MM:SS,mmm" as well as the "MM:SS,mmm" / "." variants Gemini sometimes emits
+TIMESTAMP_RE = re.compile(r"^(?:(\d{1,2}):)?(\d{1,2}):(\d{2})(?:[,.](\d{1,3}))?$")
+TIMING_LINE_RE = re.compile(r"^\s*(\S+)\s*-->\s*(\S+)")
+TAG_RE = re.compile(r"<[^>]+>|\{[^}]*\}")
+
+# Style of a clip's first render; later changes come from the editor
+DEFAULT_CAPTION_STYLE = "Hormozi"
+
+# libass renders SRT on a 384x288 canvas, which is what the force_style sizes were tuned for
+PLAY_RES_X = 384
+PLAY_RES_Y = 288
+
+ASS_STYLE_FIELDS = [
+    "Name", "Fontname", "Fontsize", "PrimaryColour", "SecondaryColour", "OutlineColour", "BackColour",
+    "Bold", "Italic", "Underline", "StrikeOut", "ScaleX", "ScaleY", "Spacing", "Angle",
+    "BorderStyle", "Outline", "Shadow", "Alignment", "MarginL", "MarginR", "MarginV", "Encoding",
+]
+
+ASS_STYLE_DEFAULTS = {
+    "Name": "Default", "Fontname": "Arial", "Fontsize": "16",
+    "PrimaryColour": "&H00FFFFFF", "SecondaryColour": "&H00FFFFFF",
+    "OutlineColour": "&H00000000", "BackColour": "&H80000000",
+    "Bold": "0", "Italic": "0", "Underline": "0", "StrikeOut": "0",
+    "ScaleX": "100", "ScaleY": "100", "Spacing": "0", "Angle": "0",
+    "BorderStyle": "1", "Outline": "1", "Shadow": "0", "Alignment": "2",
+    "MarginL": "10", "MarginR": "10", "MarginV": "10", "Encoding": "0",
+}
+
+# Unhighlighted word colour for karaoke captions (highlighted words use PrimaryColour)
+KARAOKE_SECONDARY_COLOUR = "&H00FFFFFF"
+KARAOKE_SECONDARY_COLOUR_ON_WHITE = "&H00A0A0A0"
+
+class SubtitleError(ValueError):
+    """
+    Raised when a transcript cannot be turned into valid subtitle cues.
+    """
+
+@dataclass(frozen=True)
+class Word:
+    start_ms: int
+    end_ms: int
+    text: str
+
+@dataclass(frozen=True)
+class Cue:
+    start_ms: int
+    end_ms: int
+    text: str
+    words: tuple
+
+def _parse_timestamp(value: str, cue_number: int) -> int:
+    match = TIMESTAMP_RE.match(value.strip())
+    if not match:
+        raise SubtitleError(f"Cue {cue_number}: invalid timestamp '{value}'")
+    hours, minutes, seconds, millis = match.groups()
+    if int(minutes) >= 60 or int(seconds) >= 60:
+        raise SubtitleError(f"Cue {cue_number}: timestamp out of range '{value}'")
+    millis = (millis or "0").ljust(3, "0")
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+
+def _clean_text(lines: list[str]) -> str:
+    text = " \n".join(line.strip() for line in lines if line.strip())
+    return TAG_RE.sub("", text).strip()
+
+def split_words(start_ms: int, end_ms: int, text: str) -> tuple:
+    """
+    Estimates word-level timing by spreading the cue duration over its words,
+    weighted by word length (longer words take longer to say).
+    """
+    tokens = text.split()
+    if not tokens:
+        return ()
+    weights = [len(token) + 1 for token in tokens]
+    total = sum(weights)
+    duration = end_ms - start_ms
+    words = []
+    cursor = start_ms
+    for i, (token, weight) in enumerate(zip(tokens, weights)):
+        word_end = end_ms if i == len(tokens) - 1 else cursor + duration * weight // total
+        words.append(Word(cursor, word_end, token))
+        cursor = word_end
+    return tuple(words)
+
+@lru_cache(maxsize=256)
+def _parse_srt_cached(content: str) -> tuple:
+    content = content.lstrip("\ufeff").replace("\r\n", "\n").replace("\r", "\n")
+    blocks = [block for block in re.split(r"\n\s*\n", content.strip()) if block.strip()]
+
+    cues = []
+    for number, block in enumerate(blocks, start=1):
+        lines = block.split("\n")
+        # The numeric index line is optional; Gemini occasionally drops it
+        if lines and lines[0].strip().isdigit():
+            lines = lines[1:]
+        if not lines:
+            raise SubtitleError(f"Cue {number}: missing timing line")
+        timing = TIMING_LINE_RE.match(lines[0])
+        if not timing:
+            raise SubtitleError(f"Cue {number}: expected 'start --> end', got '{lines[0].strip()}'")
+
+        start_ms = _parse_timestamp(timing.group(1), number)
+        end_ms = _parse_timestamp(timing.group(2), number)
+        if end_ms <= start_ms:
+            raise SubtitleError(f"Cue {number}: end time is not after start time")
+
+        text = _clean_text(lines[1:])
+        if not text:
+            # Empty cues are harmless, just skip them
+            continue
+        cues.append(Cue(start_ms, end_ms, text, split_words(start_ms, end_ms, text)))
+
+    if not cues:
+        raise SubtitleError("No subtitle cues found")
+    return tuple(sorted(cues, key=lambda cue: cue.start_ms))
+
+def parse_srt(content: str, duration: float = None) -> list[Cue]:
+    """
+    Parses and validates SRT content into cues.
+    Plain text without any timing lines (e.g. a caption typed in the editor) becomes a
+    single cue spanning the whole clip. Cues past the clip duration are dropped/clamped.
+    Raises SubtitleError on malformed SRT.
+    """
+    if not content or not content.strip():
+        raise SubtitleError("Transcript is empty")
+
+    if "-->" not in content:
+        if not duration:
+            raise SubtitleError("Plain-text captions need a clip duration")
+        end_ms = int(duration * 1000)
+        text = _clean_text(content.split("\n"))
+        return [Cue(0, end_ms, text, split_words(0, end_ms, text))]
+
+    cues = list(_parse_srt_cached(content))
+    if duration:
+        limit_ms = int(duration * 1000)
+        clamped = []
+        for cue in cues:
+            if cue.start_ms >= limit_ms:
+                continue
+            if cue.end_ms > limit_ms:
+                cue = Cue(cue.start_ms, limit_ms, cue.text, split_words(cue.start_ms, limit_ms, cue.text))
+            clamped.append(cue)
+        if not clamped:
+            raise SubtitleError("All subtitle cues start after the end of the clip")
+        cues = clamped
+    return cues
+
+def shift_srt(content: str, offset_ms: int) -> str:
+    """
+    Shifts every cue by offset_ms (used when a segment start moves), dropping cues
+    that end before zero ("" if none is left). Plain-text captions have no timing
+    and are returned as-is.
+    """
+    if not offset_ms or "-->" not in content:
+        return content
+    blocks = []
+    for cue in _parse_srt_cached(content):
+        start_ms, end_ms = max(0, cue.start_ms + offset_ms), cue.end_ms + offset_ms
+        if end_ms <= start_ms:
+            continue
+        blocks.append(f"{len(blocks) + 1}\n{format_srt_time(start_ms)} --> {format_srt_time(end_ms)}\n{cue.text}")
+    return "\n\n".join(blocks) + "\n" if blocks else ""
+
+def retime_transcript(transcript: str, old_start: float, new_start: float) -> str:
+    """
+    A clip's transcript after its start moves from old_start to new_start (source
+    seconds): cues are relative to the clip start, so they shift by the difference.
+    """
+    if not transcript or old_start is None or new_start is None:
+        return transcript
+    return shift_srt(transcript, int(round((old_start - new_start) * 1000)))
+
+def clip_transcript(clip, start_time: float = None) -> str:
+    """
+    A clip's captions relative to start_time (default: its current start). The stored
+    transcript stays relative to Clip.transcript_start, so trims never drop cues from
+    it; "" when no cue falls after start_time.
+    """
+    anchor = clip.transcript_start if clip.transcript_start is not None else clip.start_time
+    return retime_transcript(clip.transcript, anchor, clip.start_time if start_time is None else start_time)
+
+def parse_force_style(style_string: str) -> dict:
+    """
+    Parses an FFmpeg force_style string ("Key=Value,...") into ASS style fields.
+    """
+    canonical = {field.lower(): field for field in ASS_STYLE_FIELDS}
+    style = {}
+    for item in style_string.split(","):
+        if "=" not in item:
+            continue
+        key, value = item.split("=", 1)
+        field = canonical.get(key.strip().lower())
+        if field:
+            style[field] = value.strip()
+    return style
+
+def _escape_ass_text(text: str) -> str:
+    # Backslashes would start override codes in ASS, so drop them
+    return text.replace("\\", "").replace("\n", "\\N")
+
+def build_ass(cues: list[Cue], style_string: str, karaoke: bool = False) -> str:
+    """
+    Renders cues into a complete ASS document using the given force_style string.
+    With karaoke=True each word gets a \\k tag so libass highlights it as it is spoken.
+    """
+    style = {**ASS_STYLE_DEFAULTS, **parse_force_style(style_string)}
+    if karaoke:
+        primary = style["PrimaryColour"].upper()
+        style["SecondaryColour"] = KARAOKE_SECONDARY_COLOUR_ON_WHITE if primary.endswith("FFFFFF") else KARAOKE_SECONDARY_COLOUR
+
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {PLAY_RES_X}",
+        f"PlayResY: {PLAY_RES_Y}",
+        "WrapStyle: 0",
+        "ScaledBorderAndShadow: yes",
+        "",
+        "[V4+ Styles]",
+        "Format: " + ", ".join(ASS_STYLE_FIELDS),
+        "Style: " + ",".join(style[field] for field in ASS_STYLE_FIELDS),
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for cue in cues:
+        if karaoke and cue.words:
+            text = " ".join(
+                f"{{\\k{max(1, (word.end_ms - word.start_ms) // 10)}}}{_escape_ass_text(word.text)}"
+                for word in cue.words
+            )
+        else:
+            text = _escape_ass_text(cue.text)
+        lines.append(f"Dialogue: 0,{format_ass_time(cue.start_ms)},{format_ass_time(cue.end_ms)},Default,,0,0,0,,{text}")
+    return "\n".join(lines) + "\n"
+
+def build_srt(cues: list[Cue]) -> str:
+    """
+    Renders cues as a normalized SRT document (what ffmpeg muxes as a mov_text track).
+    """
+    blocks = [
+        f"{number}\n{format_srt_time(cue.start_ms)} --> {format_srt_time(cue.end_ms)}\n{cue.text}"
+        for number, cue in enumerate(cues, start=1)
+    ]
+    return "\n\n".join(blocks) + "\n"
+
+def _escape_vtt_text(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def build_vtt(cues: list[Cue]) -> str:
+    """
+    Renders cues as WebVTT for in-browser captions. Each word after the first carries
+    an inline timestamp, so players (and the editor preview) can highlight karaoke-style.
+    """
+    lines = ["WEBVTT", ""]
+    for cue in cues:
+        if len(cue.words) > 1:
+            text = _escape_vtt_text(cue.words[0].text) + "".join(
+                f" <{format_vtt_time(word.start_ms)}>{_escape_vtt_text(word.text)}" for word in cue.words[1:]
+            )
+        else:
+            text = _escape_vtt_text(cue.text)
+        lines += [f"{format_vtt_time(cue.start_ms)} --> {format_vtt_time(cue.end_ms)}", text, ""]
+    return "\n".join(lines)
+
+def caption_signature(transcript: str, start_time: float, end_time: float, style_name: str, karaoke: bool) -> str:
+    """
+    Identifies one burned-in render of a clip's captions: a stored burned export is
+    current only while the transcript, trim and style it was made from are unchanged.
+    """
+    digest = hashlib.sha256()
+    for part in (transcript or "", f"{start_time:.3f}", f"{end_time:.3f}", style_name, str(bool(karaoke))):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+class SubtitleEngine:
+    """
+    Turns transcripts into styled ASS files once and caches them on disk by
+    (transcript hash, style), so repeated renders skip parsing and style generation.
+    """
+    def __init__(self, cache_dir: str, max_entries: int = 500):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def cache_key(self, srt_content: str, style_name: str, style_string: str, karaoke: bool = False, duration: float = None) -> str:
+        digest = hashlib.sha256()
+        for part in (srt_content, style_string, str(karaoke), str(duration)):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        safe_style = re.sub(r"[^A-Za-z0-9_-]", "", style_name) or "style"
+        return f"{digest.hexdigest()[:24]}_{safe_style}"
+
+    def prepare(self, srt_content: str, style_name: str, style_string: str, karaoke: bool = False, duration: float = None) -> str:
+        """
+        Validates the transcript and returns the path of a ready-to-burn ASS file.
+        Raises SubtitleError before any encoding work happens if the transcript is invalid.
+        """
+        key = self.cache_key(srt_content, style_name, style_string, karaoke, duration)
+        ass_path = os.path.join(self.cache_dir, f"{key}.ass")
+        if os.path.exists(ass_path):
+            os.utime(ass_path)  # Keep recently used entries from being pruned
+            return ass_path
+
+        cues = parse_srt(srt_content, duration=duration)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temp_path = f"{ass_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(build_ass(cues, style_string, karaoke=karaoke))
+        os.replace(temp_path, ass_path)
+
+        self.prune()
+        return ass_path
+
+    def write_sidecars(self, captions_dir: str, srt_content: str, style_name: str, style_string: str, karaoke: bool = False, duration: float = None) -> dict:
+        """
+        Soft-caption mode: writes the captions as files next to an unburned video instead
+        of rendering them into it. Returns kind -> filename:
+        srt (muxed as the MP4's mov_text track), vtt (browser playback) and ass (styled).
+        """
+        ass_path = self.prepare(srt_content, style_name, style_string, karaoke=karaoke, duration=duration)
+        cues = parse_srt(srt_content, duration=duration)
+        os.makedirs(captions_dir, exist_ok=True)
+        files = {"srt": "captions.srt", "vtt": "captions.vtt", "ass": "captions.ass"}
+        with open(os.path.join(captions_dir, files["srt"]), "w", encoding="utf-8") as f:
+            f.write(build_srt(cues))
+        with open(os.path.join(captions_dir, files["vtt"]), "w", encoding="utf-8") as f:
+            f.write(build_vtt(cues))
+        shutil.copyfile(ass_path, os.path.join(captions_dir, files["ass"]))
+        return files
+
+    def prune(self):
+        """
+        Keeps the on-disk cache bounded by removing the least recently used files.
+        """
+        try:
+            entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".ass")]
+            if len(entries) <= self.max_entries:
+                return
+            entries.sort(key=os.path.getmtime)
+            for path in entries[:len(entries) - self.max_entries]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Error pruning subtitle cache: {e}")
+
+subtitle_engine = SubtitleEngine(cache_dir=workspace_manager.cache_dir("subtitles"))
@@ -0,0 +1,51 @@
+def parse_time(value) -> float:
+    """
+    Converts a timestamp to seconds.
+    Accepts numbers, "SS(.ms)", "MM:SS(.ms)" and "HH:MM:SS(.ms)" (as returned by Gemini).
+    Returns 0.0 for values that cannot be parsed.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        parts = str(value).strip().replace(',', '.').split(':')
+        if len(parts) == 1:
+            return float(parts[0])
+        elif len(parts) == 2:
+            return float(parts[0]) * 60 + float(parts[1])
+        elif len(parts) == 3:
+            return float(parts[0]) * 3600 + float(parts[1]) * 60 + float(parts[2])
+        return 0.0
+    except:
+        return 0.0
+
+def format_mmss(seconds: float) -> str:
+    """
+    Formats seconds as "MM:SS", the format Gemini uses for segment times.
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    return f"{minutes:02d}:{seconds:02d}"
+
+def format_srt_time(ms: int) -> str:
+    """
+    Formats milliseconds as an SRT timestamp (HH:MM:SS,mmm).
+    """
+    hours, ms = divmod(int(ms), 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+def format_ass_time(ms: int) -> str:
+    """
+    Formats milliseconds as an ASS timestamp (H:MM:SS.cc).
+    """
+    centis = int(round(ms / 10))
+    hours, centis = divmod(centis, 360000)
+    minutes, centis = divmod(centis, 6000)
+    seconds, centis = divmod(centis, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centis:02d}"
+
+def format_vtt_time(ms: int) -> str:
+    """
+    Formats milliseconds as a WebVTT timestamp (HH:MM:SS.mmm).
+    """
+    return format_srt_time(ms).replace(',', '.')
@@ -0,0 +1,343 @@
+from config import settings
+import contextlib
+import contextvars
+import functools
+import inspect
+import threading
+import time
+
+# Celery message headers carrying the trace context and the enqueue time (ns since epoch)
+ENQUEUED_AT_HEADER = "tandav_enqueued_at"
+STATEMENT_MAX_CHARS = 500
+
+_tracer = None
+_setup_lock = threading.Lock()
+_task_spans = {}
+
+class _NoSpan:
+    """
+    Stand-in returned while tracing is off, so callers never need to check.
+    """
+    def set_attribute(self, key, value):
+        pass
+
+    def record_exception(self, exception):
+        pass
+
+    def end(self, end_time=None):
+        pass
+
+NO_SPAN = _NoSpan()
+
+def _exporter():
+    if settings.OTEL_EXPORTER_ENDPOINT:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.OTEL_EXPORTER_ENDPOINT)
+
+    from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+    class JsonLinesSpanExporter(SpanExporter):
+        """
+        One JSON span per line; API and worker processes can append to the same file.
+        """
+        def __init__(self, path: str):
+            self.path = path
+
+        def export(self, spans):
+            lines = "".join(span.to_json(indent=None) + "\n" for span in spans)
+            with open(self.path, "a") as f:
+                f.write(lines)
+            return SpanExportResult.SUCCESS
+
+        def shutdown(self):
+            pass
+
+    return JsonLinesSpanExporter(settings.TRACE_FILE)
+
+def setup_tracing(service_name: str) -> bool:
+    """
+    Installs the tracer provider for this process. Call it after forking (the span
+    processor exports from a background thread). Returns False, leaving every helper
+    here a no-op, if tracing is disabled or opentelemetry-sdk is not installed.
+    """
+    global _tracer
+    if not settings.ENABLE_TRACING:
+        return False
+    with _setup_lock:
+        if _tracer is not None:
+            return True
+        try:
+            from opentelemetry import trace
+            from opentelemetry.sdk.resources import Resource
+            from opentelemetry.sdk.trace import TracerProvider
+            from opentelemetry.sdk.trace.export import BatchSpanProcessor
+            from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+            exporter = _exporter()
+        except ImportError as e:
+            print(f"Tracing disabled, OpenTelemetry packages missing: {e}")
+            return False
+
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": service_name, "deployment.environment": settings.ENVIRONMENT}),
+            sampler=ParentBased(TraceIdRatioBased(settings.TRACE_SAMPLE_RATIO))
+        )
+        provider.add_span_processor(BatchSpanProcessor(exporter))
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("tandavai")
+        print(f"Tracing enabled for {service_name} -> {settings.OTEL_EXPORTER_ENDPOINT or settings.TRACE_FILE}")
+        return True
+
+def enabled() -> bool:
+    return _tracer is not None
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Runs the block in a child span of the current one. Exceptions are recorded on
+    the span and re-raised.
+    """
+    if _tracer is None:
+        yield NO_SPAN
+        return
+    with _tracer.start_as_current_span(name, attributes=_clean(attributes)) as current:
+        yield current
+
+def start_span(name: str, **attributes):
+    """
+    A child span of the current one that is not made current, for work that
+    outlives the caller's block (e.g. a stream read on another thread). End it yourself.
+    """
+    if _tracer is None:
+        return NO_SPAN
+    return _tracer.start_span(name, attributes=_clean(attributes))
+
+def traced(name: str):
+    """
+    Decorator form of span() for sync and async functions.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def annotate(**attributes):
+    """
+    Sets attributes (e.g. the project id) on the current span.
+    """
+    if _tracer is None:
+        return
+    from opentelemetry import trace
+    current = trace.get_current_span()
+    for key, value in _clean(attributes).items():
+        current.set_attribute(key, value)
+
+def bind(fn, parent=None):
+    """
+    Wraps fn to run in a copy of the caller's context (with parent as the current
+    span, if given). run_in_executor and bare threads start from an empty context,
+    so spans opened there would otherwise start new traces.
+    """
+    context = contextvars.copy_context()
+    if _tracer is not None and parent is not None and parent is not NO_SPAN:
+        context.run(_make_current, parent)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        # A context can only be entered by one thread at a time
+        return context.copy().run(fn, *args, **kwargs)
+    return wrapper
+
+def _make_current(parent):
+    from opentelemetry import context as otel_context, trace
+    otel_context.attach(trace.set_span_in_context(parent))
+
+def _clean(attributes: dict) -> dict:
+    # OpenTelemetry accepts only primitives; None means "not known", so it is dropped
+    cleaned = {}
+    for key, value in attributes.items():
+        if value is None:
+            continue
+        cleaned[key] = value if isinstance(value, (str, bool, int, float)) else str(value)
+    return cleaned
+
+def carrier() -> dict:
+    """
+    The current trace context and time as a JSON-able dict, for work parked outside
+    Celery (e.g. the fair queue) and resumed later with resume().
+    """
+    if _tracer is None:
+        return {}
+    from opentelemetry.propagate import inject
+    headers = {ENQUEUED_AT_HEADER: time.time_ns()}
+    inject(headers)
+    return headers
+
+@contextlib.contextmanager
+def resume(headers: dict, wait_name: str):
+    """
+    Continues the trace saved by carrier(): records the time since as a `wait_name`
+    span and runs the block in that trace.
+    """
+    if _tracer is None or not headers:
+        yield
+        return
+    from opentelemetry import context as otel_context
+    from opentelemetry.propagate import extract
+    parent = extract(headers)
+    if headers.get(ENQUEUED_AT_HEADER):
+        _tracer.start_span(wait_name, context=parent, start_time=int(headers[ENQUEUED_AT_HEADER])).end()
+    token = otel_context.attach(parent)
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+# --- SQL ---
+
+def instrument_engine(engine):
+    """
+    Spans for every statement run on a SQLAlchemy engine (pass sync_engine for
+    an async one).
+    """
+    if not settings.ENABLE_TRACING:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if _tracer is None or context is None:
+            return
+        context._tandav_span = _tracer.start_span(
+            "db " + (statement.split(None, 1) or ["query"])[0].upper(),
+            attributes={"db.system": engine.dialect.name, "db.statement": statement[:STATEMENT_MAX_CHARS]}
+        )
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        current = getattr(context, "_tandav_span", None)
+        if current is not None:
+            current.set_attribute("db.rowcount", cursor.rowcount)
+            current.end()
+            context._tandav_span = None
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        current = getattr(exception_context.execution_context, "_tandav_span", None)
+        if current is not None:
+            current.record_exception(exception_context.original_exception)
+            current.end()
+            exception_context.execution_context._tandav_span = None
+
+# --- R2 (boto3) ---
+
+def instrument_boto_client(client):
+    """
+    Spans for S3 API calls made inside a trace. Calls without a parent span (e.g.
+    the part uploads s3transfer runs on its own threads) are covered by the caller's
+    span instead of opening traces of their own.
+    """
+    if not settings.ENABLE_TRACING:
+        return
+
+    def before_call(model=None, params=None, context=None, **kwargs):
+        if _tracer is None or context is None:
+            return
+        from opentelemetry import trace
+        if not trace.get_current_span().get_span_context().is_valid:
+            return
+        context["tandav_span"] = _tracer.start_span(f"r2 {model.name}", attributes=_clean({
+            "rpc.system": "aws-api", "rpc.method": model.name, "r2.key": (params or {}).get("Key"),
+        }))
+
+    def after_call(http_response=None, context=None, **kwargs):
+        current = (context or {}).pop("tandav_span", None)
+        if current is not None:
+            current.set_attribute("http.status_code", http_response.status_code if http_response is not None else 0)
+            current.end()
+
+    def after_call_error(exception=None, context=None, **kwargs):
+        current = (context or {}).pop("tandav_span", None)
+        if current is not None:
+            current.record_exception(exception)
+            current.end()
+
+    client.meta.events.register("before-call.s3", before_call)
+    client.meta.events.register("after-call.s3", after_call)
+    client.meta.events.register("after-call-error.s3", after_call_error)
+
+# --- Celery ---
+
+def instrument_celery():
+    """
+    Propagates the trace context through Celery message headers. Each task run gets
+    a span under the request (or task) that enqueued it, preceded by a queue-wait
+    span from enqueue to start.
+    """
+    if not settings.ENABLE_TRACING:
+        return
+    from celery import signals
+
+    @signals.before_task_publish.connect(weak=False)
+    def inject_trace_context(sender=None, headers=None, **kwargs):
+        if _tracer is None or headers is None:
+            return
+        from opentelemetry.propagate import inject
+        with span(f"enqueue {sender}", **{"messaging.system": "celery", "celery.task_name": sender}):
+            inject(headers)
+        headers[ENQUEUED_AT_HEADER] = time.time_ns()
+
+    @signals.task_prerun.connect(weak=False)
+    def start_task_span(task_id=None, task=None, args=None, **kwargs):
+        if _tracer is None or task is None:
+            return
+        from opentelemetry import context as otel_context, trace
+        from opentelemetry.propagate import extract
+
+        request = task.request
+        carrier = {key: getattr(request, key, None) for key in ("traceparent", "tracestate")}
+        parent = extract({key: value for key, value in carrier.items() if value})
+        attributes = _clean({
+            "messaging.system": "celery", "celery.task_name": task.name, "celery.task_id": task_id,
+            "celery.retries": request.retries, "celery.queue": (request.delivery_info or {}).get("routing_key"),
+            "celery.subject_id": args[0] if args else None,
+        })
+
+        enqueued_at = getattr(request, ENQUEUED_AT_HEADER, None)
+        now = time.time_ns()
+        if enqueued_at:
+            wait = _tracer.start_span("queue wait", context=parent, start_time=int(enqueued_at), attributes=attributes)
+            wait.end(end_time=now)
+            attributes["celery.queue_wait_ms"] = (now - int(enqueued_at)) / 1e6
+
+        run = _tracer.start_span(f"run {task.name}", context=parent, start_time=now, kind=trace.SpanKind.CONSUMER, attributes=attributes)
+        token = otel_context.attach(trace.set_span_in_context(run, parent))
+        _task_spans[task_id] = (run, token)
+
+    @signals.task_failure.connect(weak=False)
+    def record_task_failure(task_id=None, exception=None, **kwargs):
+        entry = _task_spans.get(task_id)
+        if entry is not None:
+            from opentelemetry.trace import Status, StatusCode
+            entry[0].record_exception(exception)
+            entry[0].set_status(Status(StatusCode.ERROR, str(exception)))
+
+    @signals.task_postrun.connect(weak=False)
+    def end_task_span(task_id=None, state=None, **kwargs):
+        entry = _task_spans.pop(task_id, None)
+        if entry is None:
+            return
+        from opentelemetry import context as otel_context
+        run, token = entry
+        run.set_attribute("celery.state", state or "")
+        otel_context.detach(token)
+        run.end()
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from config import settings
+from database import AsyncSessionLocal
+from models import MultipartUpload, UploadStatus
+from services.r2 import r2_service
+
+async def reap_stale_uploads() -> dict:
+    """
+    Aborts multipart uploads that were started but never completed within
+    MULTIPART_UPLOAD_TTL_HOURS, so their stored parts stop costing storage.
+    Covers both tracked uploads and ones R2 knows about but the DB does not
+    (e.g. the row insert failed after the upload was created).
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.MULTIPART_UPLOAD_TTL_HOURS)
+    tracked_aborted = 0
+    untracked_aborted = 0
+
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(MultipartUpload).where(
+                MultipartUpload.status == UploadStatus.ACTIVE.value,
+                MultipartUpload.created_at < cutoff
+            )
+        )
+        for upload in result.scalars().all():
+            r2_service.abort_multipart_upload(upload.s3_key, upload.upload_id)
+            upload.status = UploadStatus.ABORTED.value
+            tracked_aborted += 1
+        await db.commit()
+
+        result = await db.execute(
+            select(MultipartUpload.upload_id).where(MultipartUpload.status == UploadStatus.ACTIVE.value)
+        )
+        active_ids = {row[0] for row in result}
+
+    for upload in r2_service.list_multipart_uploads():
+        if upload["UploadId"] not in active_ids and upload["Initiated"] < cutoff:
+            r2_service.abort_multipart_upload(upload["Key"], upload["UploadId"])
+            untracked_aborted += 1
+
+    return {"tracked_aborted": tracked_aborted, "untracked_aborted": untracked_aborted}
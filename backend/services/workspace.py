@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from config import settings
+
+OWNER_FILE = ".owner"
+MB = 1024 * 1024
+
+class InsufficientDisk(Exception):
+    """
+    Raised before a task starts when the scratch volume cannot fit its expected output.
+    """
+
+class QuotaExceeded(Exception):
+    """
+    Raised when a task's workspace grows past its disk quota.
+    """
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+class Workspace:
+    """
+    Scratch directory owned by one task. Large files (sources, renders) go on the
+    scratch root; small intermediates can use fast_path(), which lives on tmpfs
+    when SCRATCH_TMPFS_ROOT is configured.
+    """
+    def __init__(self, root: str, fast_root: str, quota_bytes: int):
+        self.root = root
+        self.fast_root = fast_root
+        self.quota_bytes = quota_bytes
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def fast_path(self, name: str) -> str:
+        return os.path.join(self.fast_root, name)
+
+    def usage(self) -> int:
+        usage = _dir_size(self.root)
+        if self.fast_root != self.root:
+            usage += _dir_size(self.fast_root)
+        return usage
+
+    def check_quota(self):
+        """
+        Raises QuotaExceeded if the workspace is over its quota.
+        Called between pipeline steps, so a runaway job stops before the next one.
+        """
+        usage = self.usage()
+        if self.quota_bytes and usage > self.quota_bytes:
+            raise QuotaExceeded(
+                f"Workspace {os.path.basename(self.root)} uses {usage // MB}MB, over its {self.quota_bytes // MB}MB quota"
+            )
+
+class WorkspaceManager:
+    """
+    Creates per-task scratch workspaces with guaranteed cleanup, and reaps the
+    ones left behind by crashed or killed workers.
+    """
+    def __init__(self, root: str, tmpfs_root: str = None, quota_mb: int = 0, min_free_mb: int = 0):
+        self.root = root
+        self.tmpfs_root = tmpfs_root or None
+        self.quota_bytes = quota_mb * MB
+        self.min_free_bytes = min_free_mb * MB
+
+    def cache_dir(self, name: str) -> str:
+        """
+        Shared (not per-task) cache directory, e.g. for rendered subtitle files.
+        Never reaped, since it has no owner file.
+        """
+        return os.path.join(self.tmpfs_root or self.root, "_cache", name)
+
+    def spool_dir(self, name: str) -> str:
+        """
+        Shared directory on the scratch root (never tmpfs) for large files handed
+        from one task to another, e.g. prefetched sources.
+        """
+        return os.path.join(self.root, "_spool", name)
+
+    def free_bytes(self) -> int:
+        os.makedirs(self.root, exist_ok=True)
+        return shutil.disk_usage(self.root).free
+
+    def admit(self, expected_bytes: int = 0):
+        """
+        Raises InsufficientDisk if starting a job of expected_bytes would leave
+        less than the configured free-space reserve on the scratch volume.
+        """
+        free = self.free_bytes()
+        if free - expected_bytes < self.min_free_bytes:
+            raise InsufficientDisk(
+                f"Scratch volume has {free // MB}MB free; job needs ~{expected_bytes // MB}MB plus a {self.min_free_bytes // MB}MB reserve"
+            )
+
+    @contextmanager
+    def workspace(self, task_name: str, expected_bytes: int = 0):
+        """
+        Context manager yielding a fresh Workspace; the directory is always
+        removed on exit, including on errors and soft time limits.
+        """
+        self.admit(expected_bytes)
+
+        name = f"{task_name}-{uuid.uuid4().hex[:12]}"
+        roots = [os.path.join(self.root, name)]
+        if self.tmpfs_root:
+            roots.append(os.path.join(self.tmpfs_root, name))
+        owner = json.dumps({"pid": os.getpid(), "task": task_name, "started_at": time.time()})
+        for root in roots:
+            os.makedirs(root)
+            with open(os.path.join(root, OWNER_FILE), "w") as f:
+                f.write(owner)
+
+        try:
+            yield Workspace(roots[0], roots[-1], self.quota_bytes)
+        finally:
+            for root in roots:
+                shutil.rmtree(root, ignore_errors=True)
+
+    def reap_orphans(self, max_age_seconds: float = None) -> int:
+        """
+        Removes workspaces whose owning process is gone, or that are older than
+        max_age_seconds (longer than any task time limit). Returns the count removed.
+        """
+        reaped = 0
+        for base in filter(None, {self.root, self.tmpfs_root}):
+            if not os.path.isdir(base):
+                continue
+            for name in os.listdir(base):
+                path = os.path.join(base, name)
+                try:
+                    with open(os.path.join(path, OWNER_FILE)) as f:
+                        owner = json.load(f)
+                except (OSError, ValueError):
+                    continue  # Not a workspace (e.g. the shared cache)
+
+                too_old = max_age_seconds and time.time() - owner.get("started_at", 0) > max_age_seconds
+                if owner.get("pid") == os.getpid() and not too_old:
+                    continue
+                if too_old or not _pid_alive(owner.get("pid", 0)):
+                    size = _dir_size(path)
+                    shutil.rmtree(path, ignore_errors=True)
+                    reaped += 1
+                    print(f"Reaped orphaned workspace {name} ({size // MB}MB, task {owner.get('task')})")
+        return reaped
+
+workspace_manager = WorkspaceManager(
+    root=settings.SCRATCH_ROOT,
+    tmpfs_root=settings.SCRATCH_TMPFS_ROOT,
+    quota_mb=settings.SCRATCH_TASK_QUOTA_MB,
+    min_free_mb=settings.SCRATCH_MIN_FREE_MB
+)
@@ -0,0 +1,149 @@
+import struct
+import time
+import zlib
+from datetime import datetime
+
+# ZIP format constants (APPNOTE.TXT). Entries are STORED (no recompression: the
+# clips are already H.264) and written with data descriptors, so the CRC is
+# computed while streaming and nothing is buffered or spooled to disk.
+LOCAL_HEADER_SIG = 0x04034b50
+DATA_DESCRIPTOR_SIG = 0x08074b50
+CENTRAL_HEADER_SIG = 0x02014b50
+ZIP64_END_SIG = 0x06064b50
+ZIP64_LOCATOR_SIG = 0x07064b50
+END_SIG = 0x06054b50
+ZIP64_EXTRA_ID = 0x0001
+
+FLAG_DATA_DESCRIPTOR = 0x0008
+FLAG_UTF8 = 0x0800
+METHOD_STORED = 0
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_MARKER = 0xFFFFFFFF # Field value meaning "see the ZIP64 record"
+ZIP64_COUNT_LIMIT = 0xFFFF
+FILE_ATTRIBUTES = 0o100644 << 16
+
+class ZipMember:
+    """
+    One file of a streamed archive. The size must be known up front (from a
+    HEAD request for R2 objects), which gives the archive an exact Content-Length.
+    chunks() returns an iterable of bytes that must add up to size.
+    """
+    def __init__(self, name: str, size: int, chunks, modified: datetime = None):
+        self.name = name
+        self.size = size
+        self.chunks = chunks
+        self.modified = modified
+
+    @classmethod
+    def from_bytes(cls, name: str, data: bytes, modified: datetime = None) -> "ZipMember":
+        return cls(name, len(data), lambda: [data], modified)
+
+def _dos_datetime(modified: datetime = None) -> tuple[int, int]:
+    t = modified.timetuple() if modified else time.localtime()
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = (max(t.tm_year, 1980) - 1980) << 9 | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+class _Entry:
+    def __init__(self, member: ZipMember, offset: int):
+        self.member = member
+        self.name = member.name.encode("utf-8")
+        self.offset = offset
+        self.zip64 = member.size >= ZIP64_LIMIT or offset >= ZIP64_LIMIT
+        self.dos_time, self.dos_date = _dos_datetime(member.modified)
+        self.crc = 0
+
+    def local_header(self) -> bytes:
+        # Sizes and CRC follow in the data descriptor; a ZIP64 entry announces
+        # 8-byte descriptor sizes with a zeroed ZIP64 extra field
+        extra = struct.pack("<HHQQ", ZIP64_EXTRA_ID, 16, 0, 0) if self.zip64 else b""
+        placeholder = ZIP64_MARKER if self.zip64 else 0
+        return struct.pack(
+            "<IHHHHHIIIHH", LOCAL_HEADER_SIG,
+            VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, METHOD_STORED,
+            self.dos_time, self.dos_date, 0, placeholder, placeholder, len(self.name), len(extra)
+        ) + self.name + extra
+
+    def data_descriptor(self) -> bytes:
+        if self.zip64:
+            return struct.pack("<IIQQ", DATA_DESCRIPTOR_SIG, self.crc, self.member.size, self.member.size)
+        return struct.pack("<IIII", DATA_DESCRIPTOR_SIG, self.crc, self.member.size, self.member.size)
+
+    def central_header(self) -> bytes:
+        fields = []
+        size = self.member.size
+        offset = self.offset
+        if size >= ZIP64_LIMIT:
+            fields += [size, size]
+            size = ZIP64_MARKER
+        if offset >= ZIP64_LIMIT:
+            fields.append(offset)
+            offset = ZIP64_MARKER
+        extra = struct.pack(f"<HH{len(fields)}Q", ZIP64_EXTRA_ID, 8 * len(fields), *fields) if fields else b""
+        version = VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", CENTRAL_HEADER_SIG,
+            version, version, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, METHOD_STORED,
+            self.dos_time, self.dos_date, self.crc, size, size,
+            len(self.name), len(extra), 0, 0, 0, FILE_ATTRIBUTES, offset
+        ) + self.name + extra
+
+class ZipStream:
+    """
+    Store-mode ZIP assembled on the fly: iterate it to get the archive bytes.
+    Memory use is one member chunk at a time, whatever the archive size;
+    ZIP64 records are used only where sizes or offsets need them.
+    """
+    def __init__(self, members: list[ZipMember]):
+        self.entries = []
+        offset = 0
+        for member in members:
+            entry = _Entry(member, offset)
+            self.entries.append(entry)
+            offset += len(entry.local_header()) + member.size + len(entry.data_descriptor())
+        self.central_offset = offset
+        self.central_size = sum(len(entry.central_header()) for entry in self.entries)
+
+    def _end_records(self) -> bytes:
+        count = len(self.entries)
+        records = b""
+        if count >= ZIP64_COUNT_LIMIT or self.central_size >= ZIP64_LIMIT or self.central_offset >= ZIP64_LIMIT:
+            zip64_end_offset = self.central_offset + self.central_size
+            records += struct.pack(
+                "<IQHHIIQQQQ", ZIP64_END_SIG, 44, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, self.central_size, self.central_offset
+            )
+            records += struct.pack("<IIQI", ZIP64_LOCATOR_SIG, 0, zip64_end_offset, 1)
+        records += struct.pack(
+            "<IHHHHIIH", END_SIG, 0, 0,
+            min(count, ZIP64_COUNT_LIMIT), min(count, ZIP64_COUNT_LIMIT),
+            ZIP64_MARKER if self.central_size >= ZIP64_LIMIT else self.central_size,
+            ZIP64_MARKER if self.central_offset >= ZIP64_LIMIT else self.central_offset, 0
+        )
+        return records
+
+    def size(self) -> int:
+        """
+        Exact archive size in bytes, known before any member is read.
+        """
+        return self.central_offset + self.central_size + len(self._end_records())
+
+    def __iter__(self):
+        for entry in self.entries:
+            yield entry.local_header()
+            crc = 0
+            written = 0
+            for chunk in entry.member.chunks():
+                crc = zlib.crc32(chunk, crc)
+                written += len(chunk)
+                yield chunk
+            if written != entry.member.size:
+                # The headers already promised a size; a short or long member corrupts the archive
+                raise IOError(f"{entry.member.name}: expected {entry.member.size} bytes, read {written}")
+            entry.crc = crc
+            yield entry.data_descriptor()
+        for entry in self.entries:
+            yield entry.central_header()
+        yield self._end_records()
@@ -0,0 +1,20 @@
+import os
+import sys
+
+# Tests import the backend modules the way the app does (from the backend directory)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+import pytest
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """
+    Points the shared sync and async Redis clients at one in-memory fakeredis server.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    from services import redis_client
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_client, "_redis", fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(redis_client, "_async_redis", fakeredis.FakeAsyncRedis(server=server))
+    return redis_client._redis
@@ -0,0 +1,46 @@
+import time
+import pytest
+from fastapi import HTTPException
+
+jose = pytest.importorskip("jose")
+pytest.importorskip("cryptography")
+
+import auth
+from config import settings
+
+ISSUER = "https://clerk.test.local"
+
+@pytest.fixture
+def signer(monkeypatch):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from jose import jwk, jwt
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    monkeypatch.setattr(settings, "CLERK_ISSUER", ISSUER)
+    monkeypatch.setattr(settings, "CLERK_AUTHORIZED_PARTIES", None)
+    monkeypatch.setattr(auth.jwks_cache, "keys", {"test": jwk.construct(public_pem, "RS256")})
+    auth.claims_cache.entries.clear()
+
+    def sign(algorithm="RS256", key=pem) -> str:
+        now = int(time.time())
+        claims = {"sub": "user_1", "iss": ISSUER, "iat": now, "nbf": now, "exp": now + 300}
+        return jwt.encode(claims, key, algorithm=algorithm, headers={"kid": "test"})
+
+    return sign
+
+def test_accepts_a_clerk_token(signer):
+    assert auth.verify_token(signer())["sub"] == "user_1"
+
+def test_rejects_a_token_that_picks_another_algorithm(signer):
+    token = signer(algorithm="HS256", key="shared-secret")
+    with pytest.raises(HTTPException) as error:
+        auth.verify_token(token)
+    assert error.value.status_code == 401
+    assert "alg" in error.value.detail
@@ -0,0 +1,59 @@
+import asyncio
+from services.burn_jobs import coalesce_burn, next_burn_generation, take_burn_params, is_superseded, mark_burn_running, end_burn, pending_burn_params
+
+def request_burns(clip_id: str, count: int, committed_generation: int = 0) -> list:
+    """
+    Simulates `count` rapid edits of one clip the way POST /clips/{id}/burn handles them.
+    """
+    async def run():
+        enqueued = []
+        for i in range(count):
+            generation = await next_burn_generation(clip_id, committed_generation)
+            params = {"start_time": float(i), "end_time": 30.0 + i, "style_name": "Neon", "karaoke": False, "generation": generation}
+            if await coalesce_burn(clip_id, params):
+                enqueued.append(generation)
+        return enqueued
+    return asyncio.run(run())
+
+def test_rapid_edits_enqueue_one_task(fake_redis):
+    enqueued = request_burns("clip-1", 10)
+    assert enqueued == [1]
+
+    # The queued task renders the latest edit; every earlier generation is superseded
+    params = take_burn_params("clip-1")
+    assert params["generation"] == 10 and params["start_time"] == 9.0
+    assert all(is_superseded("clip-1", generation) for generation in range(1, 10))
+    assert not is_superseded("clip-1", 10)
+
+def test_edit_after_the_task_started_enqueues_again(fake_redis):
+    request_burns("clip-1", 3)
+    take_burn_params("clip-1")
+    assert request_burns("clip-1", 2) == [4]
+    assert is_superseded("clip-1", 3)
+
+def test_generations_stay_above_the_committed_one(fake_redis):
+    # Redis lost its counter but the DB already committed generation 7
+    assert request_burns("clip-2", 1, committed_generation=7) == [8]
+
+def test_clips_are_independent(fake_redis):
+    request_burns("clip-a", 5)
+    assert request_burns("clip-b", 1) == [1]
+    assert not is_superseded("clip-b", 1)
+
+def test_pending_burn_covers_queued_and_running(fake_redis):
+    assert asyncio.run(pending_burn_params("clip-1")) is None
+    request_burns("clip-1", 2)
+    assert asyncio.run(pending_burn_params("clip-1"))["generation"] == 2
+
+    # Started: the params leave the queue but the burn is still pending until it ends
+    params = take_burn_params("clip-1")
+    mark_burn_running("clip-1", params)
+    assert asyncio.run(pending_burn_params("clip-1")) == params
+    end_burn("clip-1", params["generation"])
+    assert asyncio.run(pending_burn_params("clip-1")) is None
+
+def test_newest_pending_burn_wins(fake_redis):
+    request_burns("clip-1", 1)
+    mark_burn_running("clip-1", take_burn_params("clip-1"))
+    request_burns("clip-1", 1)
+    assert asyncio.run(pending_burn_params("clip-1"))["generation"] == 2
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+import pytest
+from services import processor
+from services.workspace import InsufficientDisk
+
+class Retry(Exception):
+    pass
+
+class FakeTask:
+    max_retries = 10
+
+    def __init__(self, retries):
+        self.request = SimpleNamespace(retries=retries)
+
+    def retry(self, exc, countdown):
+        return Retry(countdown)
+
+@pytest.fixture
+def failed(monkeypatch):
+    calls = []
+    async def fail_deferred_project(project_id, reason):
+        calls.append(project_id)
+    monkeypatch.setattr(processor, "fail_deferred_project", fail_deferred_project)
+    return calls
+
+def test_deferral_retries_while_attempts_remain(failed):
+    with pytest.raises(Retry):
+        processor.defer_project(FakeTask(3), "p1", InsufficientDisk("full"), 60)
+    assert failed == []
+
+def test_exhausted_deferral_fails_the_project(failed):
+    processor.defer_project(FakeTask(10), "p1", InsufficientDisk("full"), 60)
+    assert failed == ["p1"]
@@ -0,0 +1,58 @@
+import ffmpeg
+import pytest
+from services.ffmpeg_processor import ffmpeg_processor
+
+@pytest.fixture
+def compiled(monkeypatch):
+    """
+    Captures the ffmpeg command instead of running it (no ffmpeg binary needed).
+    """
+    commands = []
+    monkeypatch.setattr(ffmpeg_processor, "_run", lambda stream, should_cancel=None: commands.append(ffmpeg.compile(stream)))
+    monkeypatch.setattr(ffmpeg_processor, "write_timeline", lambda timeline_dir, timeline: None)
+    return commands
+
+def test_timeline_window_with_preview_compiles(tmp_path, compiled):
+    # Trimmed audio feeds both the full and the preview encode: it must be asplit
+    renditions = ffmpeg_processor.process_segment(
+        input_path="source.mp4",
+        output_path=str(tmp_path / "clip.mp4"),
+        start_time="40",
+        end_time="70",
+        preview_path=str(tmp_path / "clip_preview.mp4"),
+        poster_path=str(tmp_path / "clip_poster.jpg"),
+        timeline_dir=str(tmp_path / "clip_timeline"),
+        timeline_window=(25.0, 85.0),
+        has_audio=True,
+    )
+    assert len(compiled) == 1
+    assert "asplit" in " ".join(compiled[0])
+    assert {"full", "preview", "poster", "timeline"} <= renditions.keys()
+
+def test_timeline_window_without_audio_compiles(tmp_path, compiled):
+    ffmpeg_processor.process_segment(
+        input_path="source.mp4",
+        output_path=str(tmp_path / "clip.mp4"),
+        start_time="40",
+        end_time="70",
+        preview_path=str(tmp_path / "clip_preview.mp4"),
+        timeline_dir=str(tmp_path / "clip_timeline"),
+        timeline_window=(25.0, 85.0),
+        has_audio=False,
+    )
+    assert len(compiled) == 1
+
+def test_shared_decode_compiles(tmp_path, compiled):
+    segments = [
+        {"start_time": 10.0, "end_time": 30.0, "output_path": str(tmp_path / "a.mp4"), "preview_path": str(tmp_path / "a_preview.mp4")},
+        {"start_time": 35.0, "end_time": 60.0, "output_path": str(tmp_path / "b.mp4"), "preview_path": str(tmp_path / "b_preview.mp4")},
+    ]
+    results = ffmpeg_processor.process_segments("source.mp4", segments, has_audio=True)
+    assert len(compiled) == 1
+    assert [result["full"] for result in results] == [segment["output_path"] for segment in segments]
+
+def test_replace_caption_track_copies_streams(tmp_path, compiled):
+    ffmpeg_processor.replace_caption_track("clip.mp4", "captions.srt", str(tmp_path / "out.mp4"))
+    command = compiled[0]
+    assert command[command.index("-scodec") + 1] == "mov_text"
+    assert command[command.index("-vcodec") + 1] == "copy"
@@ -0,0 +1,30 @@
+import time
+import pytest
+from services.gemini_quota import GeminiQuota, GeminiQuotaDeferred
+
+@pytest.fixture(autouse=True)
+def lua(fake_redis):
+    pytest.importorskip("lupa")
+
+class TooManyRequests(Exception):
+    pass
+
+def test_empty_bucket_defers_at_the_deadline(fake_redis):
+    quota = GeminiQuota(requests_per_minute=1, tokens_per_minute=1_000_000, uploads_per_minute=60, burst_fraction=0.25)
+    quota.acquire("generate")
+    started = time.monotonic()
+    with pytest.raises(GeminiQuotaDeferred):
+        # The next request refills in 60s, past a deadline 0.5s away
+        quota.acquire("generate", deadline=started + 0.5)
+    assert time.monotonic() - started < 0.5
+
+def test_backoff_past_the_deadline_defers(fake_redis, monkeypatch):
+    quota = GeminiQuota(requests_per_minute=60, tokens_per_minute=1_000_000, uploads_per_minute=60, burst_fraction=0.25)
+    monkeypatch.setattr(quota, "backoff", lambda attempt: 30.0)
+    calls = []
+    def rate_limited():
+        calls.append(1)
+        raise TooManyRequests("429")
+    with pytest.raises(GeminiQuotaDeferred):
+        quota.call(rate_limited, "generate", deadline=time.monotonic() + 5)
+    assert calls == [1]
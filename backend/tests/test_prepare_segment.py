@@ -0,0 +1,17 @@
+from services.processor import prepare_segment
+from services.subtitles import parse_srt
+
+SIGNALS = {"scene_cuts": [9.5], "silences": []}
+SRT = "1\n00:00:01,000 --> 00:00:03,000\nHello there\n"
+
+def test_snapped_start_moves_the_captions():
+    segment = {"start_time": "10", "end_time": "40", "srt_content": SRT}
+    prepare_segment(segment, duration=120.0, signals=SIGNALS)
+    assert segment["start_time"] == "9.5"
+    assert [(cue.start_ms, cue.end_ms) for cue in parse_srt(segment["srt_content"])] == [(1500, 3500)]
+
+def test_malformed_srt_only_drops_the_captions():
+    segment = {"start_time": "10", "end_time": "40", "srt_content": "1\n00:00:05,000 --> 00:00:02,000\nBackwards\n"}
+    prepare_segment(segment, duration=120.0, signals=SIGNALS)
+    assert segment["srt_content"] is None
+    assert (segment["start_time"], segment["end_time"]) == ("9.5", "40.0")
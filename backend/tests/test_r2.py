@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+from services.r2 import R2Service
+
+def test_client_is_built_on_first_use():
+    service = R2Service()
+    assert service._s3_client is None
+    stand_in = object()
+    service.s3_client = stand_in
+    assert service.s3_client is stand_in
+
+def test_import_does_not_load_boto3():
+    # Run in a fresh interpreter: other tests may already have imported boto3
+    code = "import sys; import services.r2; print('boto3' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)), capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
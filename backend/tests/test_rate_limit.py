@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from services.rate_limit import TokenBucket
+
+@pytest.fixture(autouse=True)
+def lua(fake_redis):
+    pytest.importorskip("lupa")
+
+def test_burst_then_reject_with_retry_after(fake_redis):
+    bucket = TokenBucket("test", capacity=3, refill_per_second=0.5)
+    results = [bucket.consume(fake_redis, "user-1") for _ in range(4)]
+    assert [allowed for allowed, _ in results] == [True, True, True, False]
+    # One token at 0.5/s: about two seconds away
+    assert results[-1][1] == pytest.approx(2.0, abs=0.1)
+
+def test_subjects_have_separate_buckets(fake_redis):
+    bucket = TokenBucket("test", capacity=1, refill_per_second=0.1)
+    assert bucket.consume(fake_redis, "user-1")[0]
+    assert not bucket.consume(fake_redis, "user-1")[0]
+    assert bucket.consume(fake_redis, "user-2")[0]
+
+def test_cost_larger_than_the_bucket_is_rejected(fake_redis):
+    bucket = TokenBucket("test", capacity=5, refill_per_second=1.0)
+    allowed, retry_after = bucket.consume(fake_redis, "user-1", cost=8)
+    assert not allowed and retry_after == pytest.approx(3.0, abs=0.1)
+    assert bucket.consume(fake_redis, "user-1", cost=5)[0]
+
+def test_async_client_shares_the_bucket(fake_redis):
+    from services.redis_client import get_async_redis
+    bucket = TokenBucket("test", capacity=2, refill_per_second=0.1)
+    assert bucket.consume(fake_redis, "user-1")[0]
+    assert asyncio.run(bucket.consume_async(get_async_redis(), "user-1"))[0]
+    assert not bucket.consume(fake_redis, "user-1")[0]
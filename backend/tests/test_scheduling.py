@@ -0,0 +1,76 @@
+import pytest
+from services.scheduling import FairQueue, CostModel, RedisFairQueue, MIN_FIT_SAMPLES
+
+def drain(queue) -> list:
+    order = []
+    while True:
+        job = queue.dispatch()
+        if not job:
+            return order
+        order.append(job["id"])
+
+def test_newcomer_is_not_stuck_behind_a_backlog():
+    queue = FairQueue(fairness_slack=300.0)
+    for i in range(40):
+        queue.enqueue(f"heavy-{i}", "heavy-user", cost=60.0)
+    queue.enqueue("newcomer", "new-user", cost=60.0)
+    assert drain(queue).index("newcomer") <= 1
+
+def test_backlog_keeps_its_own_order():
+    queue = FairQueue(fairness_slack=0.0)
+    for i in range(5):
+        queue.enqueue(f"job-{i}", "user", cost=30.0)
+    assert drain(queue) == [f"job-{i}" for i in range(5)]
+
+def test_short_job_overtakes_only_within_the_slack():
+    queue = FairQueue(fairness_slack=100.0)
+    queue.enqueue("long", "a", cost=500.0)
+    queue.enqueue("short", "b", cost=50.0)
+    assert drain(queue) == ["short", "long"]
+
+    queue = FairQueue(fairness_slack=0.0)
+    queue.enqueue("first", "a", cost=50.0)
+    queue.enqueue("cheap-but-later", "a", cost=10.0)
+    assert drain(queue) == ["first", "cheap-but-later"]
+
+def test_weight_scales_the_charge():
+    queue = FairQueue(fairness_slack=0.0)
+    queue.enqueue("a1", "a", cost=100.0, weight=2.0)
+    queue.enqueue("b1", "b", cost=100.0)
+    assert queue.jobs["a1"]["finish"] == 50.0 and queue.jobs["b1"]["finish"] == 100.0
+
+def test_cost_model_fit_recovers_coefficients():
+    truth = (12.0, 0.8, 0.3)
+    resolutions = [(1280, 720), (1920, 1080), (3840, 2160), (720, 1280)]
+    samples = []
+    for i in range(60):
+        duration = 20.0 + 17.0 * i
+        width, height = resolutions[i % len(resolutions)]
+        x = CostModel.features(duration, width, height)
+        samples.append({"duration": duration, "width": width, "height": height, "seconds": sum(c * v for c, v in zip(truth, x))})
+
+    model = CostModel.fit(samples)
+    assert model.samples == 60
+    assert model.coefficients == pytest.approx(truth, rel=1e-3)
+    assert model.predict(600, 1920, 1080) == pytest.approx(12.0 + 0.8 * 600 + 0.3 * 600 * 1920 * 1080 / 1e6, rel=1e-3)
+
+def test_cost_model_keeps_defaults_without_history():
+    samples = [{"duration": 60.0, "seconds": 100.0}] * (MIN_FIT_SAMPLES - 1)
+    assert CostModel.fit(samples).coefficients == CostModel.DEFAULT_COEFFICIENTS
+
+def test_cost_model_round_trips_through_its_dict():
+    model = CostModel((1.0, 2.0, 3.0), samples=42)
+    data = model.to_dict()
+    assert CostModel(tuple(data["coefficients"]), samples=data["samples"]).predict(100) == model.predict(100)
+
+def test_redis_fair_queue_matches_the_policy(fake_redis, monkeypatch):
+    pytest.importorskip("lupa")
+    from config import settings
+    monkeypatch.setattr(settings, "SCHEDULER_MAX_IN_FLIGHT", 100)
+    queue = RedisFairQueue()
+    for i in range(40):
+        queue.enqueue(f"heavy-{i}", "heavy-user", cost=60.0, payload={"project_id": f"heavy-{i}"})
+    queue.enqueue("newcomer", "new-user", cost=60.0, payload={"project_id": "newcomer"})
+    order = [queue.dispatch()["id"] for _ in range(41)]
+    assert order.index("newcomer") <= 1
+    assert queue.dispatch() is None
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "check_startup_budget.py")
+
+def load_budget_check():
+    spec = importlib.util.spec_from_file_location("check_startup_budget", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_api_starts_within_budget():
+    budget = load_budget_check()
+    result = budget.measure(runs=3)
+    assert result["eager"] == []
+    assert result["import_s"] <= budget.IMPORT_BUDGET
+    assert result["startup_s"] <= budget.STARTUP_BUDGET
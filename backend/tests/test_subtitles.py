@@ -0,0 +1,105 @@
+import uuid
+from datetime import datetime, timezone
+import pytest
+from services.subtitles import SubtitleError, build_ass, clip_transcript, parse_srt, retime_transcript, shift_srt
+
+SRT = "1\n00:00:01,000 --> 00:00:03,000\nHello there\n\n2\n00:00:04,000 --> 00:00:06,500\nGeneral Kenobi\n"
+
+def test_retime_transcript_follows_a_later_start():
+    # Start moves 2s later: cues move 2s earlier, the first one is clipped at zero
+    cues = parse_srt(retime_transcript(SRT, 10.0, 12.0))
+    assert [(cue.start_ms, cue.end_ms) for cue in cues] == [(0, 1000), (2000, 4500)]
+
+def test_retime_transcript_follows_an_earlier_start():
+    cues = parse_srt(retime_transcript(SRT, 10.0, 8.5))
+    assert [(cue.start_ms, cue.end_ms) for cue in cues] == [(2500, 4500), (5500, 8000)]
+
+def test_repeated_trims_do_not_drift():
+    transcript = SRT
+    for old_start, new_start in ((10.0, 11.0), (11.0, 9.0), (9.0, 10.0)):
+        transcript = retime_transcript(transcript, old_start, new_start)
+    assert [(cue.start_ms, cue.end_ms) for cue in parse_srt(transcript)] == [(1000, 3000), (4000, 6500)]
+
+def test_retime_transcript_keeps_untimed_text():
+    assert retime_transcript("just words", 10.0, 12.0) == "just words"
+    assert retime_transcript(None, 10.0, 12.0) is None
+
+def test_parse_srt_reads_cues_and_word_timing():
+    cues = parse_srt(SRT)
+    assert [(cue.start_ms, cue.end_ms, cue.text) for cue in cues] == [(1000, 3000, "Hello there"), (4000, 6500, "General Kenobi")]
+    words = cues[0].words
+    assert [word.text for word in words] == ["Hello", "there"]
+    assert words[0].start_ms == 1000 and words[-1].end_ms == 3000
+
+def test_parse_srt_accepts_missing_index_lines_and_tags():
+    cues = parse_srt("00:00:01.5 --> 00:00:02,000\n<i>Hi</i>\n")
+    assert [(cue.start_ms, cue.end_ms, cue.text) for cue in cues] == [(1500, 2000, "Hi")]
+
+@pytest.mark.parametrize("content", [
+    "",
+    "1\n00:00:02,000 --> 00:00:01,000\nBackwards\n",
+    "1\n00:00:01,000 -> 00:00:02,000\nNo arrow --> here\n",
+    "1\n00:75:01,000 --> 00:75:02,000\nOut of range\n",
+])
+def test_parse_srt_rejects_malformed_transcripts(content):
+    with pytest.raises(SubtitleError):
+        parse_srt(content, duration=30.0)
+
+def test_parse_srt_turns_plain_text_into_one_cue():
+    cues = parse_srt("Just a caption", duration=12.5)
+    assert [(cue.start_ms, cue.end_ms, cue.text) for cue in cues] == [(0, 12500, "Just a caption")]
+    with pytest.raises(SubtitleError):
+        parse_srt("Just a caption")
+
+def test_parse_srt_clamps_to_the_clip_duration():
+    cues = parse_srt(SRT, duration=5.0)
+    assert [(cue.start_ms, cue.end_ms) for cue in cues] == [(1000, 3000), (4000, 5000)]
+    with pytest.raises(SubtitleError):
+        parse_srt(SRT, duration=0.5)
+
+def test_shift_srt_drops_cues_before_zero():
+    shifted = shift_srt(SRT, -3500)
+    assert [(cue.start_ms, cue.end_ms) for cue in parse_srt(shifted)] == [(500, 3000)]
+    assert shift_srt(SRT, 0) == SRT
+
+def test_build_ass_applies_the_style():
+    ass = build_ass(parse_srt(SRT), "FontName=Impact,FontSize=32,PrimaryColour=&H0000FFFF")
+    style = next(line for line in ass.splitlines() if line.startswith("Style: "))
+    assert "Impact,32,&H0000FFFF" in style
+    assert "Dialogue: 0,0:00:01.00,0:00:03.00,Default,,0,0,0,,Hello there" in ass
+    assert "\\k" not in ass
+
+def test_build_ass_karaoke_tags_every_word():
+    ass = build_ass(parse_srt(SRT), "FontName=Impact", karaoke=True)
+    dialogue = [line for line in ass.splitlines() if line.startswith("Dialogue: ")]
+    assert dialogue[0].endswith("{\\k100}Hello {\\k100}there")
+    assert all(line.count("{\\k") == 2 for line in dialogue)
+
+class StoredClip:
+    def __init__(self, transcript, transcript_start, start_time):
+        self.transcript = transcript
+        self.transcript_start = transcript_start
+        self.start_time = start_time
+
+def test_trimming_back_restores_dropped_cues():
+    clip = StoredClip(SRT, 10.0, 14.0)
+    assert [cue.text for cue in parse_srt(clip_transcript(clip))] == ["General Kenobi"]
+    clip.start_time = 10.0
+    assert clip_transcript(clip) == SRT
+
+def test_trim_past_every_cue_has_no_captions():
+    assert clip_transcript(StoredClip(SRT, 10.0, 30.0)) == ""
+
+def test_clip_transcript_renders_at_a_requested_start():
+    clip = StoredClip(SRT, 10.0, 10.0)
+    assert [(cue.start_ms, cue.end_ms) for cue in parse_srt(clip_transcript(clip, 9.0))] == [(2000, 4000), (5000, 7500)]
+    # Rows from before the anchor existed are relative to the clip start
+    assert clip_transcript(StoredClip(SRT, None, 12.0)) == SRT
+
+def test_clip_response_shows_the_current_trim():
+    from models import Clip
+    from schemas import ClipResponse
+    clip = Clip(id=uuid.uuid4(), project_id=uuid.uuid4(), s3_url="clip.mp4", transcript=SRT, transcript_start=10.0, start_time=12.0, end_time=20.0, created_at=datetime.now(timezone.utc))
+    response = ClipResponse.model_validate(clip)
+    assert response.transcript == retime_transcript(SRT, 10.0, 12.0)
+    assert ClipResponse.model_validate(response.model_dump()).transcript == response.transcript
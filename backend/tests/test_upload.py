@@ -0,0 +1,26 @@
+import asyncio
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+import models
+from models import User
+from routers import upload
+from schemas import MultipartUploadCreate
+
+async def start_first_upload():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    # Enforce the users.clerk_id foreign key like Postgres does
+    event.listen(engine.sync_engine, "connect", lambda conn, _: conn.execute("PRAGMA foreign_keys=ON"))
+    async with engine.begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        request = MultipartUploadCreate(filename="talk.mp4", content_type="video/mp4", size=200 * 1024 * 1024)
+        created = await upload.create_multipart_upload(request, db=db, user_id="user_new")
+        user = (await db.execute(select(User).where(User.clerk_id == "user_new"))).scalar_one()
+    await engine.dispose()
+    return created, user
+
+def test_first_upload_creates_the_user(monkeypatch):
+    monkeypatch.setattr(upload.r2_service, "create_multipart_upload", lambda filename, content_type: {"upload_id": "r2-upload", "s3_key": f"uploads/{filename}"})
+    created, user = asyncio.run(start_first_upload())
+    assert created.user_id == user.clerk_id == "user_new"
+    assert created.part_count >= 1
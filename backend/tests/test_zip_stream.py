@@ -0,0 +1,37 @@
+import io
+import zipfile
+from datetime import datetime
+from services.zip_stream import ZipMember, ZipStream
+
+def archive_bytes(stream: ZipStream) -> bytes:
+    return b"".join(stream)
+
+def test_archive_reads_back_with_zipfile():
+    payloads = {"clip_1.mp4": b"\x00\x01" * 5000, "captions/clip_1.srt": "Ünïcode ✓\n".encode("utf-8"), "empty.txt": b""}
+    modified = datetime(2024, 5, 17, 13, 45, 30)
+    stream = ZipStream([ZipMember.from_bytes(name, data, modified) for name, data in payloads.items()])
+    data = archive_bytes(stream)
+
+    assert len(data) == stream.size()
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == list(payloads)
+        for name, payload in payloads.items():
+            assert archive.read(name) == payload
+            assert archive.getinfo(name).date_time == (2024, 5, 17, 13, 45, 30)
+
+def test_members_are_streamed_in_chunks():
+    chunks = [b"a" * 1000, b"b" * 10, b"c" * 4096]
+    member = ZipMember("chunked.bin", sum(len(chunk) for chunk in chunks), lambda: iter(chunks))
+    stream = ZipStream([member])
+    data = archive_bytes(stream)
+    assert len(data) == stream.size()
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.read("chunked.bin") == b"".join(chunks)
+
+def test_empty_archive():
+    stream = ZipStream([])
+    data = archive_bytes(stream)
+    assert len(data) == stream.size() == 22
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == []
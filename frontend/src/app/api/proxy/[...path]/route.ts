@@ -1,4 +1,5 @@
 import { NextRequest, NextResponse } from "next/server";
+import { auth } from "@clerk/nextjs/server";
 
 async function proxyRequest(request: NextRequest, { params }: { params: Promise<{ path: string[] }> }) {
     const { path } = await params;
@@ -27,6 +28,13 @@ async function proxyRequest(request: NextRequest, { params }: { params: Promise<
         const headers = new Headers(request.headers);
         headers.delete("host"); // Let fetch set the host
         headers.delete("connection");
+        // Plain links (e.g. the ZIP export) carry no Authorization header; use the session cookie's token
+        if (!headers.has("authorization")) {
+            const token = await (await auth()).getToken();
+            if (token) {
+                headers.set("authorization", `Bearer ${token}`);
+            }
+        }
 
         // Prepare body
         let body = null;
@@ -54,10 +62,23 @@ async function proxyRequest(request: NextRequest, { params }: { params: Promise<
             cache: "no-store",
         });
 
+        // Binary downloads (project ZIP exports) are piped through unbuffered, keeping
+        // their Content-Length so the browser can show progress
+        if (response.headers.get("content-type")?.startsWith("application/zip")) {
+            return new NextResponse(response.body, {
+                status: response.status,
+                statusText: response.statusText,
+                headers: new Headers(response.headers),
+            });
+        }
+
         // Forward response
         const responseBody = await response.arrayBuffer();
 
         const responseHeaders = new Headers(response.headers);
+        // fetch() already decoded a gzip/br body, so these no longer describe responseBody
+        responseHeaders.delete("content-encoding");
+        responseHeaders.delete("content-length");
         // Clean up CORS headers from backend since we are the origin now (mostly)
         // Actually, we should just pass them or let Next.js handle it.
 
@@ -1,4 +1,5 @@
 import { NextRequest, NextResponse } from "next/server";
+import { auth } from "@clerk/nextjs/server";
 
 export async function POST(
     request: NextRequest,
@@ -21,10 +22,12 @@ export async function POST(
     console.log(`[PROXY] Forwarding archive request for ${id} to ${targetUrl}`);
 
     try {
+        const token = await (await auth()).getToken();
         const response = await fetch(targetUrl, {
             method: "POST",
             headers: {
                 "Content-Type": "application/json",
+                ...(token ? { Authorization: `Bearer ${token}` } : {}),
             },
             body: JSON.stringify({}),
         });
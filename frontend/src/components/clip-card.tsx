@@ -4,16 +4,21 @@ import React, { useState, useRef } from "react";
 import { Play, Pause, Download, Copy, Check, Wand2, Share2, MoreVertical, Clock } from "lucide-react";
 import { cn } from "@/lib/utils";
 import { EditModal } from "./edit-modal";
-import { updateClip } from "@/lib/api";
+import { updateClip, type ClipCaptions } from "@/lib/api";
 
 interface ClipCardProps {
     clip: {
         id: string;
+        project_id?: string;
         s3_url: string;
+        preview_url?: string | null;
+        poster_url?: string | null;
+        hls_url?: string | null;
         virality_score: number | null;
         transcript: string | null;
         start_time: number | null;
         end_time: number | null;
+        captions?: ClipCaptions | null;
         created_at: string;
     };
     index: number;
@@ -58,6 +63,12 @@ export const ClipCard = ({ clip, index }: ClipCardProps) => {
 
             const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000'}/clips/${clip.id}/download`);
 
+            if (response.status === 202) {
+                // Soft-caption clip: the captioned export of the current edit is being rendered
+                alert("Preparing your captioned download. Please try again in a minute.");
+                return;
+            }
+
             if (!response.ok) {
                 throw new Error("Failed to get download link");
             }
@@ -103,15 +114,25 @@ export const ClipCard = ({ clip, index }: ClipCardProps) => {
             >
                 {/* Video Player Area - 9:16 Aspect Ratio */}
                 <div className="relative aspect-[9/16] bg-black cursor-pointer overflow-hidden" onClick={togglePlay}>
+                    {/* Grid plays the low-bitrate preview; the full-quality MP4 is only fetched on download */}
                     <video
                         ref={videoRef}
-                        src={clip.s3_url}
+                        src={clip.preview_url || clip.s3_url}
+                        poster={clip.poster_url || undefined}
+                        preload={clip.poster_url ? "none" : "metadata"}
                         className="w-full h-full object-cover transition-transform duration-700 group-hover:scale-105"
                         loop
                         playsInline
                         onPlay={() => setIsPlaying(true)}
                         onPause={() => setIsPlaying(false)}
-                    />
+                        // Cross-origin caption tracks only load in CORS mode
+                        crossOrigin={clip.captions?.vtt_url ? "anonymous" : undefined}
+                    >
+                        {/* Soft-caption clips are stored clean; the WebVTT sidecar is overlaid by the player */}
+                        {clip.captions?.vtt_url && (
+                            <track kind="captions" src={clip.captions.vtt_url} srcLang="en" label="Captions" default />
+                        )}
+                    </video>
 
                     {/* Gradient Overlays */}
                     <div className="absolute inset-0 bg-gradient-to-b from-black/40 via-transparent to-black/80 pointer-events-none" />
@@ -1,17 +1,20 @@
 "use client";
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { X, Type, Scissors, Check, Wand2, Play, Pause, Sparkles } from "lucide-react";
 import { cn } from "@/lib/utils";
-import { burnClip, updateClip } from "@/lib/api";
+import { burnClip, getClipTimeline, restyleProject, updateCaptionStyle, updateClip, type ClipCaptions, type ClipTimeline } from "@/lib/api";
+import { TimelineScrubber } from "./timeline-scrubber";
 
 interface EditModalProps {
     isOpen: boolean;
     onClose: () => void;
     clip: {
         id: string;
+        project_id?: string;
         transcript: string | null;
         start_time?: number | null;
         end_time?: number | null;
+        captions?: ClipCaptions | null;
     };
 }
 
@@ -25,28 +28,75 @@ const STYLES = [
 
 export const EditModal = ({ isOpen, onClose, clip }: EditModalProps) => {
     const [caption, setCaption] = useState(clip.transcript || "");
-    const [selectedStyle, setSelectedStyle] = useState("Hormozi");
+    const [selectedStyle, setSelectedStyle] = useState(clip.captions?.style_name || "Hormozi");
+    const [karaoke, setKaraoke] = useState(clip.captions?.karaoke || false);
     const [startTime, setStartTime] = useState(clip.start_time || 0);
     const [endTime, setEndTime] = useState(clip.end_time || 30);
     const [isSaving, setIsSaving] = useState(false);
+    const [applyToProject, setApplyToProject] = useState(false);
+    const [timeline, setTimeline] = useState<ClipTimeline | null>(null);
+
+    useEffect(() => {
+        if (!isOpen) return;
+        let cancelled = false;
+        // Older clips have no timeline (404): the numeric inputs still work
+        getClipTimeline(clip.id)
+            .then((data) => !cancelled && setTimeline(data))
+            .catch(() => !cancelled && setTimeline(null));
+        return () => {
+            cancelled = true;
+        };
+    }, [isOpen, clip.id]);
 
     const handleSave = async () => {
         try {
             setIsSaving(true);
+            const trimmed = startTime !== (clip.start_time || 0) || endTime !== (clip.end_time || 30);
+            if (applyToProject && clip.project_id && !trimmed) {
+                // One job re-renders every clip of the project in the new style
+                if (caption !== clip.transcript) {
+                    await updateClip(clip.id, { transcript: caption });
+                }
+                await restyleProject(clip.project_id, { style_name: selectedStyle, karaoke });
+                alert("Restyling every clip in this project. They update as the job finishes.");
+                onClose();
+                window.location.reload();
+                return;
+            }
+            if (clip.captions && !trimmed) {
+                // Soft captions: text and style are metadata, nothing is re-encoded
+                if (caption !== clip.transcript) {
+                    await updateClip(clip.id, { transcript: caption });
+                }
+                await updateCaptionStyle(clip.id, { style_name: selectedStyle, karaoke });
+                onClose();
+                window.location.reload();
+                return;
+            }
             if (caption !== clip.transcript) {
                 await updateClip(clip.id, { transcript: caption });
             }
-            await burnClip(clip.id, {
+            const result = await burnClip(clip.id, {
                 start_time: startTime,
                 end_time: endTime,
-                style_name: selectedStyle
+                style_name: selectedStyle,
+                karaoke
             });
-            alert("Processing started! Your video is being updated in the background.");
+            // A matching render was prepared ahead of time: the clip is already updated
+            if (!result?.prerendered) {
+                alert("Processing started! Your video is being updated in the background.");
+            }
             onClose();
             window.location.reload();
-        } catch (error) {
+        } catch (error: any) {
             console.error("Failed to save clip:", error);
-            alert("Failed to save changes. Please try again.");
+            const status = error?.response?.status;
+            if (status === 429 || status === 503) {
+                const retryAfter = error.response.headers?.["retry-after"];
+                alert(`The editor is busy. Please try again${retryAfter ? ` in ${retryAfter}s` : " shortly"}.`);
+            } else {
+                alert("Failed to save changes. Please try again.");
+            }
         } finally {
             setIsSaving(false);
         }
@@ -144,6 +194,26 @@ export const EditModal = ({ isOpen, onClose, clip }: EditModalProps) => {
                                     </button>
                                 ))}
                             </div>
+                            <label className="flex items-center gap-2 text-xs text-neutral-400 cursor-pointer select-none">
+                                <input
+                                    type="checkbox"
+                                    checked={karaoke}
+                                    onChange={(e) => setKaraoke(e.target.checked)}
+                                    className="accent-purple-500"
+                                />
+                                Highlight words as they are spoken (karaoke)
+                            </label>
+                            {clip.project_id && (
+                                <label className="flex items-center gap-2 text-xs text-neutral-400 cursor-pointer select-none">
+                                    <input
+                                        type="checkbox"
+                                        checked={applyToProject}
+                                        onChange={(e) => setApplyToProject(e.target.checked)}
+                                        className="accent-purple-500"
+                                    />
+                                    Apply this style to every clip in the project
+                                </label>
+                            )}
                         </div>
 
                         {/* Section 3: Trim */}
@@ -152,6 +222,17 @@ export const EditModal = ({ isOpen, onClose, clip }: EditModalProps) => {
                                 <Scissors className="w-4 h-4 text-yellow-400" />
                                 Trim Segment
                             </label>
+                            {timeline && (
+                                <TimelineScrubber
+                                    timeline={timeline}
+                                    start={startTime}
+                                    end={endTime}
+                                    onChange={(start, end) => {
+                                        setStartTime(Number(start.toFixed(1)));
+                                        setEndTime(Number(end.toFixed(1)));
+                                    }}
+                                />
+                            )}
                             <div className="bg-black/20 rounded-xl p-4 border border-white/5 flex items-center gap-4">
                                 <div className="flex-1">
                                     <span className="text-[10px] uppercase tracking-wider text-neutral-500 mb-1 block">Start Time</span>
@@ -179,7 +260,7 @@ export const EditModal = ({ isOpen, onClose, clip }: EditModalProps) => {
                     {/* Footer */}
                     <div className="p-6 border-t border-white/5 bg-black/20 flex justify-between items-center">
                         <span className="text-xs text-neutral-500">
-                            Changes will re-process the video.
+                            {clip.captions ? "Caption edits apply instantly; trims re-process the video." : "Changes will re-process the video."}
                         </span>
                         <div className="flex gap-3">
                             <button
@@ -202,7 +283,7 @@ export const EditModal = ({ isOpen, onClose, clip }: EditModalProps) => {
                                 ) : (
                                     <>
                                         <Wand2 className="w-4 h-4" />
-                                        Burn & Save
+                                        {clip.captions ? "Save" : "Burn & Save"}
                                     </>
                                 )}
                             </button>
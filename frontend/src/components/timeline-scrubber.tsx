@@ -0,0 +1,143 @@
+"use client";
+import React, { useEffect, useRef, useState } from "react";
+import type { ClipTimeline } from "@/lib/api";
+
+interface TimelineScrubberProps {
+    timeline: ClipTimeline;
+    start: number;
+    end: number;
+    onChange: (start: number, end: number) => void;
+}
+
+// Thumbnails shown across the strip; the hover preview can show any of the sprite's frames
+const STRIP_THUMBS = 10;
+const MIN_LENGTH = 1;
+
+const formatTime = (seconds: number) => {
+    const m = Math.floor(seconds / 60);
+    const s = (seconds % 60).toFixed(1).padStart(4, "0");
+    return `${m}:${s}`;
+};
+
+// CSS for one sprite cell, scaled to fill its box
+const spriteCell = (timeline: ClipTimeline, time: number): React.CSSProperties => {
+    const index = Math.min(timeline.count - 1, Math.max(0, Math.floor((time - timeline.start) / timeline.interval)));
+    const col = index % timeline.columns;
+    const row = Math.floor(index / timeline.columns);
+    return {
+        backgroundImage: `url(${timeline.sprite_url})`,
+        backgroundSize: `${timeline.columns * 100}% ${timeline.rows * 100}%`,
+        backgroundPosition: `${timeline.columns > 1 ? (col / (timeline.columns - 1)) * 100 : 0}% ${timeline.rows > 1 ? (row / (timeline.rows - 1)) * 100 : 0}%`,
+    };
+};
+
+/**
+ * Trim selector over the precomputed sprite sheet and waveform of the clip's
+ * neighbourhood: scrubbing and trimming load two small static files, no video.
+ */
+export const TimelineScrubber = ({ timeline, start, end, onChange }: TimelineScrubberProps) => {
+    const canvasRef = useRef<HTMLCanvasElement>(null);
+    const [peaks, setPeaks] = useState<Uint8Array | null>(null);
+    const [hover, setHover] = useState<number | null>(null);
+    const span = timeline.end - timeline.start;
+    const toPercent = (time: number) => ((time - timeline.start) / span) * 100;
+
+    useEffect(() => {
+        if (!timeline.waveform_url) return;
+        let cancelled = false;
+        fetch(timeline.waveform_url)
+            .then((response) => response.arrayBuffer())
+            .then((buffer) => !cancelled && setPeaks(new Uint8Array(buffer)))
+            .catch((error) => console.error("Failed to load waveform:", error));
+        return () => {
+            cancelled = true;
+        };
+    }, [timeline.waveform_url]);
+
+    useEffect(() => {
+        const canvas = canvasRef.current;
+        if (!canvas || !peaks) return;
+        const context = canvas.getContext("2d");
+        if (!context) return;
+        const { width, height } = canvas;
+        context.clearRect(0, 0, width, height);
+        context.fillStyle = "rgba(168, 85, 247, 0.8)";
+        // One bar per pixel column, the loudest peak it covers
+        const perColumn = peaks.length / width;
+        for (let x = 0; x < width; x++) {
+            let peak = 0;
+            for (let i = Math.floor(x * perColumn); i < Math.floor((x + 1) * perColumn); i++) {
+                peak = Math.max(peak, peaks[i]);
+            }
+            const bar = Math.max(1, (peak / 255) * height);
+            context.fillRect(x, (height - bar) / 2, 1, bar);
+        }
+    }, [peaks]);
+
+    const handleMove = (e: React.MouseEvent<HTMLDivElement>) => {
+        const rect = e.currentTarget.getBoundingClientRect();
+        setHover(timeline.start + ((e.clientX - rect.left) / rect.width) * span);
+    };
+
+    return (
+        <div className="space-y-2">
+            <div className="relative select-none" onMouseMove={handleMove} onMouseLeave={() => setHover(null)}>
+                {/* Filmstrip */}
+                <div className="flex h-12 rounded-lg overflow-hidden border border-white/10">
+                    {Array.from({ length: STRIP_THUMBS }, (_, i) => (
+                        <div
+                            key={i}
+                            className="flex-1 bg-neutral-900"
+                            style={spriteCell(timeline, timeline.start + ((i + 0.5) / STRIP_THUMBS) * span)}
+                        />
+                    ))}
+                </div>
+                {/* Waveform */}
+                {timeline.waveform_url && <canvas ref={canvasRef} width={600} height={40} className="w-full h-10 mt-1" />}
+
+                {/* Selection */}
+                <div
+                    className="absolute inset-y-0 border-2 border-purple-500 bg-purple-500/10 rounded-lg pointer-events-none"
+                    style={{ left: `${toPercent(start)}%`, width: `${toPercent(end) - toPercent(start)}%` }}
+                />
+
+                {/* Hover preview */}
+                {hover !== null && (
+                    <div
+                        className="absolute -top-24 -translate-x-1/2 pointer-events-none z-10"
+                        style={{ left: `${toPercent(hover)}%` }}
+                    >
+                        <div
+                            className="rounded-md border border-white/20 shadow-lg"
+                            style={{ ...spriteCell(timeline, hover), width: timeline.thumb_width, height: timeline.thumb_height }}
+                        />
+                        <span className="block text-center text-[10px] font-mono text-neutral-300 mt-1">{formatTime(hover)}</span>
+                    </div>
+                )}
+            </div>
+
+            <div className="grid grid-cols-2 gap-3">
+                <input
+                    type="range"
+                    min={timeline.start}
+                    max={timeline.end}
+                    step={0.1}
+                    value={start}
+                    onChange={(e) => onChange(Math.min(Number(e.target.value), end - MIN_LENGTH), end)}
+                    className="accent-purple-500"
+                    aria-label="Trim start"
+                />
+                <input
+                    type="range"
+                    min={timeline.start}
+                    max={timeline.end}
+                    step={0.1}
+                    value={end}
+                    onChange={(e) => onChange(start, Math.max(Number(e.target.value), start + MIN_LENGTH))}
+                    className="accent-purple-500"
+                    aria-label="Trim end"
+                />
+            </div>
+        </div>
+    );
+};
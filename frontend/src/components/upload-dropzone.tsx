@@ -5,11 +5,13 @@ import { UploadCloud, Loader2 } from "lucide-react";
 import { cn } from "@/lib/utils";
 import { ThunderLoader } from "@/components/ui/thunder-loader";
 import { api, createProject } from "@/lib/api";
+import { uploadMultipart, MULTIPART_THRESHOLD } from "@/lib/multipart-upload";
 import { useQueryClient } from "@tanstack/react-query";
 import { useRouter } from "next/navigation";
 
 export const UploadDropzone = () => {
     const [uploading, setUploading] = useState(false);
+    const [progress, setProgress] = useState<number | null>(null);
     const [clipDuration, setClipDuration] = useState("auto");
     const queryClient = useQueryClient();
     const router = useRouter();
@@ -21,25 +23,33 @@ export const UploadDropzone = () => {
         setUploading(true);
 
         try {
-            // 1. Get Presigned URL
-            const { data: presignedData } = await api.get("/upload-url", {
-                params: {
-                    filename: file.name,
-                    content_type: file.type,
-                },
-            });
-
-            // 2. Upload to R2
-            await fetch(presignedData.upload_url, {
-                method: "PUT",
-                body: file,
-                headers: {
-                    "Content-Type": file.type,
-                },
-            });
+            let s3Key: string;
+            if (file.size >= MULTIPART_THRESHOLD) {
+                // 1-2. Parallel, resumable multipart upload straight to R2
+                setProgress(0);
+                s3Key = await uploadMultipart(file, { onProgress: setProgress });
+            } else {
+                // 1. Get Presigned URL
+                const { data: presignedData } = await api.get("/upload-url", {
+                    params: {
+                        filename: file.name,
+                        content_type: file.type,
+                    },
+                });
+
+                // 2. Upload to R2
+                await fetch(presignedData.upload_url, {
+                    method: "PUT",
+                    body: file,
+                    headers: {
+                        "Content-Type": file.type,
+                    },
+                });
+                s3Key = presignedData.s3_key;
+            }
 
             // 3. Create Project & Trigger Processing
-            await createProject(presignedData.s3_key, clipDuration);
+            await createProject(s3Key, clipDuration);
 
             // 4. Optimistic Update
             queryClient.invalidateQueries({ queryKey: ["projects"] });
@@ -47,10 +57,15 @@ export const UploadDropzone = () => {
 
         } catch (error: any) {
             console.error("Upload failed:", error);
+            if (error.response?.status === 402) {
+                alert("You have no credits remaining.");
+                return;
+            }
             const attemptedUrl = error.config ? `${error.config.baseURL || ''}${error.config.url}` : 'unknown';
             alert(`Upload failed: ${error.message}\nAttempted: ${attemptedUrl}`);
         } finally {
             setUploading(false);
+            setProgress(null);
         }
     }, [queryClient, router, clipDuration]);
 
@@ -130,7 +145,9 @@ export const UploadDropzone = () => {
                             {uploading ? "Summoning Tandav Thunder..." : "Upload Your Video"}
                         </h3>
                         <p className="text-neutral-400 text-base max-w-[280px] mx-auto leading-relaxed">
-                            {uploading
+                            {uploading && progress !== null
+                                ? `Uploading... ${Math.round(progress * 100)}%`
+                                : uploading
                                 ? "Harnessing cosmic energy to process your clip."
                                 : "Drag & drop or click to browse. Supports MP4, MOV, AVI."}
                         </p>
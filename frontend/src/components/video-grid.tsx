@@ -1,8 +1,8 @@
 "use client";
 import React from "react";
 import { useQuery, useQueryClient } from "@tanstack/react-query";
-import { api, deleteProject, deleteOldProjects } from "@/lib/api";
-import { Loader2, Sparkles, Trash2, AlertCircle } from "lucide-react";
+import { api, deleteProject, deleteOldProjects, reanalyzeProject, type ClipCaptions } from "@/lib/api";
+import { Loader2, Sparkles, Trash2, AlertCircle, Download } from "lucide-react";
 import { ClipCard } from "./clip-card";
 import { ThunderLoader } from "@/components/ui/thunder-loader";
 import { BentoGrid, BentoGridItem } from "@/components/ui/bento-grid";
@@ -12,10 +12,14 @@ interface Clip {
     id: string;
     project_id: string;
     s3_url: string;
+    preview_url?: string | null;
+    poster_url?: string | null;
+    hls_url?: string | null;
     virality_score: number | null;
     transcript: string | null;
     start_time: number | null;
     end_time: number | null;
+    captions?: ClipCaptions | null;
     created_at: string;
 }
 
@@ -109,6 +113,16 @@ const ProjectSection = ({ project }: { project: Project }) => {
         }
     };
 
+    const handleFindMore = async () => {
+        try {
+            await reanalyzeProject(project.id);
+            queryClient.invalidateQueries({ queryKey: ["projects"] });
+        } catch (error: any) {
+            console.error("Failed to re-analyze project:", error);
+            alert(error.response?.data?.detail || "Failed to find more clips. Please try again.");
+        }
+    };
+
     return (
         <div className="bg-[#0A0A0A] border border-white/5 rounded-[2rem] p-6 md:p-8 relative overflow-hidden group">
             <div className="absolute top-0 right-0 w-64 h-64 bg-purple-500/5 blur-[100px] rounded-full pointer-events-none" />
@@ -127,13 +141,34 @@ const ProjectSection = ({ project }: { project: Project }) => {
                     </div>
                 </div>
 
-                <button
-                    onClick={handleDelete}
-                    className="p-2 rounded-full bg-white/5 hover:bg-red-500/10 text-neutral-400 hover:text-red-400 transition-colors"
-                    title="Delete Project"
-                >
-                    <Trash2 className="w-4 h-4" />
-                </button>
+                <div className="flex items-center gap-2">
+                    {project.status === "COMPLETED" && (
+                        <button
+                            onClick={handleFindMore}
+                            className="p-2 rounded-full bg-white/5 hover:bg-purple-500/10 text-neutral-400 hover:text-purple-400 transition-colors"
+                            title="Find more clips"
+                        >
+                            <Sparkles className="w-4 h-4" />
+                        </button>
+                    )}
+                    {project.status === "COMPLETED" && project.clips && project.clips.length > 0 && (
+                        // Plain navigation: the browser streams the ZIP straight to disk
+                        <a
+                            href={`/api/proxy/projects/${project.id}/export`}
+                            className="p-2 rounded-full bg-white/5 hover:bg-purple-500/10 text-neutral-400 hover:text-purple-400 transition-colors"
+                            title="Download all clips (ZIP)"
+                        >
+                            <Download className="w-4 h-4" />
+                        </a>
+                    )}
+                    <button
+                        onClick={handleDelete}
+                        className="p-2 rounded-full bg-white/5 hover:bg-red-500/10 text-neutral-400 hover:text-red-400 transition-colors"
+                        title="Delete Project"
+                    >
+                        <Trash2 className="w-4 h-4" />
+                    </button>
+                </div>
             </div>
 
             {/* Content */}
@@ -13,12 +13,18 @@ export const api = axios.create({
     },
 });
 
-// Add interceptors for auth if needed
-api.interceptors.request.use((config) => {
-    // const token = await window.Clerk.session.getToken();
-    // if (token) {
-    //     config.headers.Authorization = `Bearer ${token}`;
-    // }
+// The Clerk browser SDK (loaded by ClerkProvider) exposes the signed-in session on window.Clerk
+type ClerkWindow = Window & { Clerk?: { session?: { getToken: () => Promise<string | null> } | null } };
+
+// Every API call carries the Clerk session token; getToken() serves a cached
+// short-lived JWT and refreshes it before it expires
+api.interceptors.request.use(async (config) => {
+    if (typeof window !== "undefined") {
+        const token = await (window as ClerkWindow).Clerk?.session?.getToken();
+        if (token) {
+            config.headers.Authorization = `Bearer ${token}`;
+        }
+    }
     return config;
 });
 
@@ -30,16 +36,44 @@ export const createProject = async (sourceUrl: string, clipDuration: string = "a
     return response.data;
 };
 
+// Finds more clips in a finished project, reusing its Gemini upload; existing clips are kept
+export const reanalyzeProject = async (projectId: string, clipDuration?: "auto" | "30s" | "60s") => {
+    const response = await api.post(`/projects/${projectId}/reanalyze`, {
+        clip_duration: clipDuration ?? null
+    });
+    return response.data;
+};
+
 export const updateClip = async (clipId: string, data: { transcript?: string | null }) => {
     const response = await api.patch(`/clips/${clipId}`, data);
     return response.data;
 };
 
-export const burnClip = async (clipId: string, data: { start_time?: number | null; end_time?: number | null; style_name?: string }) => {
+export const burnClip = async (clipId: string, data: { start_time?: number | null; end_time?: number | null; style_name?: string; karaoke?: boolean }) => {
     const response = await api.post(`/clips/${clipId}/burn`, data);
     return response.data;
 };
 
+export type ClipCaptions = {
+    mode: "soft";
+    style_name: string;
+    karaoke: boolean;
+    vtt_url: string | null;
+    ass_url: string | null;
+    burned_url: string | null;
+};
+
+// Soft-caption clips only: restyles without re-encoding (the burned render happens on download)
+export const updateCaptionStyle = async (clipId: string, data: { style_name: string; karaoke: boolean }) => {
+    const response = await api.patch(`/clips/${clipId}/captions`, data);
+    return response.data;
+};
+
+export const restyleProject = async (projectId: string, data: { style_name: string; karaoke: boolean }) => {
+    const response = await api.post(`/projects/${projectId}/restyle`, data);
+    return response.data;
+};
+
 export const deleteProject = async (projectId: string) => {
     // Now going through the generic proxy automatically
     const response = await api.post(`/projects/${projectId}/archive`, {});
@@ -52,3 +86,23 @@ export const deleteOldProjects = async (days: number) => {
     });
     return response.data;
 };
+
+export type ClipTimeline = {
+    start: number;
+    end: number;
+    interval: number;
+    count: number;
+    columns: number;
+    rows: number;
+    thumb_width: number;
+    thumb_height: number;
+    sprite_url: string;
+    vtt_url: string;
+    waveform_url: string | null;
+    peaks_per_second: number | null;
+};
+
+export const getClipTimeline = async (clipId: string): Promise<ClipTimeline> => {
+    const response = await api.get<ClipTimeline>(`/clips/${clipId}/timeline`);
+    return response.data;
+};
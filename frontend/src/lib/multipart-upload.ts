@@ -0,0 +1,124 @@
+import { api } from "@/lib/api";
+
+// Files at or above this size use resumable multipart uploads; smaller ones a single PUT
+export const MULTIPART_THRESHOLD = 32 * 1024 * 1024;
+
+const CONCURRENCY = 4;
+const PRESIGN_BATCH = 20;
+const MAX_ATTEMPTS = 5;
+const RESUME_KEY_PREFIX = "tandav-upload:";
+
+type MultipartUpload = {
+    id: string;
+    s3_key: string;
+    filename: string;
+    size: number;
+    part_size: number;
+    part_count: number;
+    status: string;
+};
+
+type UploadOptions = {
+    onProgress?: (fraction: number) => void;
+    signal?: AbortSignal;
+};
+
+// Same file (name, size, mtime) dropped again resumes the unfinished upload
+const resumeKey = (file: File) => `${RESUME_KEY_PREFIX}${file.name}:${file.size}:${file.lastModified}`;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function findResumableUpload(file: File): Promise<MultipartUpload | null> {
+    const storedId = localStorage.getItem(resumeKey(file));
+    if (!storedId) return null;
+    try {
+        const { data } = await api.get<MultipartUpload>(`/uploads/multipart/${storedId}`);
+        return data.size === file.size ? data : null;
+    } catch {
+        // Completed, aborted or reaped: start over
+        localStorage.removeItem(resumeKey(file));
+        return null;
+    }
+}
+
+async function putPart(url: string, body: Blob, signal?: AbortSignal) {
+    for (let attempt = 1; ; attempt++) {
+        try {
+            const response = await fetch(url, { method: "PUT", body, signal });
+            if (response.ok) return;
+            throw new Error(`Part upload failed with ${response.status}`);
+        } catch (error) {
+            if (signal?.aborted || attempt >= MAX_ATTEMPTS) throw error;
+            // Exponential backoff with jitter: 1s, 2s, 4s, 8s
+            await sleep(2 ** (attempt - 1) * 1000 + Math.random() * 250);
+        }
+    }
+}
+
+/**
+ * Uploads a file to R2 as parallel multipart parts and returns its object key.
+ * Interrupted uploads resume from the parts R2 already has; failed parts are retried.
+ */
+export async function uploadMultipart(file: File, { onProgress, signal }: UploadOptions = {}): Promise<string> {
+    let upload = await findResumableUpload(file);
+    if (!upload) {
+        const { data } = await api.post<MultipartUpload>("/uploads/multipart", {
+            filename: file.name,
+            content_type: file.type,
+            size: file.size,
+        });
+        upload = data;
+        localStorage.setItem(resumeKey(file), upload.id);
+    }
+    const { id, part_size: partSize, part_count: partCount } = upload;
+
+    const { data: uploaded } = await api.get<{ part_number: number; size: number }[]>(`/uploads/multipart/${id}/parts`);
+    const done = new Set(uploaded.map((part) => part.part_number));
+    let bytesDone = uploaded.reduce((sum, part) => sum + part.size, 0);
+    onProgress?.(bytesDone / file.size);
+
+    const pending: number[] = [];
+    for (let n = 1; n <= partCount; n++) {
+        if (!done.has(n)) pending.push(n);
+    }
+
+    // Presign lazily in batches so URLs don't expire while earlier parts upload
+    const urls = new Map<number, string>();
+    let presigning: Promise<void> | null = null;
+    const urlFor = async (partNumber: number) => {
+        while (!urls.has(partNumber)) {
+            if (!presigning) {
+                const batch = pending.filter((n) => n >= partNumber && !urls.has(n)).slice(0, PRESIGN_BATCH);
+                presigning = api
+                    .post<{ urls: Record<string, string> }>(`/uploads/multipart/${id}/parts`, { part_numbers: batch })
+                    .then(({ data }) => {
+                        Object.entries(data.urls).forEach(([n, url]) => urls.set(Number(n), url));
+                    })
+                    .finally(() => {
+                        presigning = null;
+                    });
+            }
+            await presigning;
+        }
+        const url = urls.get(partNumber)!;
+        urls.delete(partNumber);
+        return url;
+    };
+
+    let next = 0;
+    const worker = async () => {
+        while (next < pending.length) {
+            const partNumber = pending[next++];
+            const start = (partNumber - 1) * partSize;
+            const blob = file.slice(start, Math.min(start + partSize, file.size));
+            await putPart(await urlFor(partNumber), blob, signal);
+            bytesDone += blob.size;
+            onProgress?.(bytesDone / file.size);
+        }
+    };
+    await Promise.all(Array.from({ length: Math.min(CONCURRENCY, pending.length) }, worker));
+
+    const { data: completed } = await api.post<{ s3_key: string }>(`/uploads/multipart/${id}/complete`);
+    localStorage.removeItem(resumeKey(file));
+    return completed.s3_key;
+}